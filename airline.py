@@ -1,5 +1,6 @@
-from typing import List
+from typing import Iterator, List
 from flight import Flight
+from views import ListView
 
 
 class AirLine:
@@ -17,6 +18,17 @@ class AirLine:
         # Returns a copy of the list of flights to prevent external modifications
         return self._flights.copy()
 
+    def flights_view(self) -> ListView:
+        # Returns a read-only view of the flights without copying them
+        return ListView(self._flights)
+
+    def iter_flights(self) -> Iterator[Flight]:
+        # Iterates over the flights without copying them
+        return iter(self._flights)
+
+    def flight_count(self) -> int:
+        return len(self._flights)
+
     def add_flight(self, flight: Flight):
         # Adds a new flight to the list of flights
         self._flights.append(flight)
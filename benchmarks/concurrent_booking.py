@@ -0,0 +1,109 @@
+# Stress benchmark for concurrent bookings.
+# Run from the repository root:  python -m benchmarks.concurrent_booking --help
+#
+# Every worker thread books seats on random flights. A listener that sleeps for --io-ms
+# stands in for a synchronous write (journal fsync, remote replica...) done while the
+# flight is locked, so the numbers show how much per-flight locking lets bookings on
+# different flights overlap. --global-lock runs the same load behind one lock for comparison.
+# With --io-ms 0 the bookings are pure Python work and stay bound by the interpreter lock.
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from airline import AirLine
+from flight_factory import FlightFactory
+from mutation_listener import MutationListener
+from seat_inventory import SeatInventory
+from ticket_manager import TicketManager
+
+
+# Simulates a slow synchronous sink that is called for every booking
+class SlowSink(MutationListener):
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def ticket_added(self, airline, ticket):
+        time.sleep(self.seconds)
+
+
+# Replaces the manager's state with airlines x flights, each flight having rows x 6 seats
+def build_schedule(manager: TicketManager, airlines: int, flights: int, rows: int):
+    manager.replace_state([], [])
+    factory = FlightFactory()
+    for a in range(airlines):
+        airline = AirLine(f"Airline{a}")
+        manager.add_airline(airline)
+        for f in range(flights):
+            flight = factory.create_flight("domestic" if f % 2 else "international", f"A{a}F{f}",
+                                           f"City{f % 50}", 100.0 + f, seats=SeatInventory.single_cabin(rows))
+            manager.add_flight(airline, flight)
+    return [flight for _, flight in manager.iter_flights()]
+
+
+# Books `bookings` seats with `workers` threads and returns the achieved bookings per second
+def run(manager: TicketManager, flights, workers: int, bookings: int, global_lock: bool) -> float:
+    lock = threading.Lock() if global_lock else None
+    per_worker = bookings // workers
+
+    def worker(seed: int):
+        rnd = random.Random(seed)
+        for i in range(per_worker):
+            flight = rnd.choice(flights)
+            if lock is not None:
+                with lock:
+                    manager.create_reservation(f"P{seed}-{i}", flight)
+            else:
+                manager.create_reservation(f"P{seed}-{i}", flight)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(worker, seed) for seed in range(workers)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+    return per_worker * workers / elapsed
+
+
+# Checks that no seat was sold twice and the seat counters match the tickets
+def check_consistency(manager: TicketManager, flights):
+    for flight in flights:
+        tickets = manager.get_tickets_for_flight(flight)
+        seats = [ticket.seat for ticket in tickets]
+        if len(seats) != len(set(seats)):
+            raise AssertionError(f"Double-booked seat on {flight.flight_number}")
+        if flight.seats.capacity - flight.seats.available() != len(tickets):
+            raise AssertionError(f"Seat counter out of sync on {flight.flight_number}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent booking stress benchmark")
+    parser.add_argument("--airlines", type=int, default=4)
+    parser.add_argument("--flights", type=int, default=50, help="flights per airline")
+    parser.add_argument("--rows", type=int, default=60, help="seat rows per flight (6 seats each)")
+    parser.add_argument("--bookings", type=int, default=4000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--io-ms", type=float, default=1.0, help="simulated write latency per booking")
+    parser.add_argument("--global-lock", action="store_true", help="serialise all bookings behind one lock")
+    args = parser.parse_args()
+
+    manager = TicketManager()
+    sink = SlowSink(args.io_ms / 1000.0) if args.io_ms > 0 else None
+    if sink is not None:
+        manager.add_listener(sink)
+    try:
+        print(f"{'workers':>8} {'bookings/s':>12} {'speedup':>8}")
+        baseline = None
+        for workers in args.workers:
+            flights = build_schedule(manager, args.airlines, args.flights, args.rows)
+            rate = run(manager, flights, workers, args.bookings, args.global_lock)
+            check_consistency(manager, flights)
+            baseline = baseline or rate
+            print(f"{workers:>8} {rate:>12.0f} {rate / baseline:>7.2f}x")
+    finally:
+        if sink is not None:
+            manager.remove_listener(sink)
+
+
+if __name__ == "__main__":
+    main()
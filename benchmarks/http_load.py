@@ -0,0 +1,114 @@
+# Load generator for booking_server.py.
+# Run from the repository root:  python -m benchmarks.http_load --help
+#
+# Without --port an in-process server is started on a free port. Every worker keeps one
+# HTTP/1.1 connection open and books either one ticket per request or --batch tickets per
+# POST /batch request, so the effect of keep-alive and batching can be compared.
+import argparse
+import http.client
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from booking_server import make_server
+
+
+class Client:
+    def __init__(self, host: str, port: int):
+        self.connection = http.client.HTTPConnection(host, port)
+
+    def request(self, method: str, path: str, body=None):
+        payload = json.dumps(body) if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+        self.connection.request(method, path, payload, headers)
+        response = self.connection.getresponse()
+        data = json.loads(response.read())
+        if response.status != 200:
+            raise RuntimeError(f"{method} {path} -> {response.status}: {data}")
+        return data
+
+    def close(self):
+        self.connection.close()
+
+
+# Creates one airline with `flights` large flights and returns their numbers
+def setup(client: Client, flights: int) -> tuple:
+    airline = f"Load{time.time_ns()}"
+    client.request("POST", "/airlines", {"name": airline})
+    numbers = []
+    for i in range(flights):
+        number = f"LD{i}"
+        client.request("POST", "/flights", {"airline": airline, "kind": "domestic", "flight_number": number,
+                                            "destination": f"City{i}", "distance": 300, "rows": 5000})
+        numbers.append(number)
+    return airline, numbers
+
+
+def worker(host, port, airline, numbers, requests, batch, latencies, seed):
+    client = Client(host, port)
+    try:
+        for i in range(requests):
+            start = time.perf_counter()
+            if batch > 1:
+                operations = [{"op": "book", "airline": airline, "name": f"P{seed}-{i}-{j}",
+                               "flight_number": numbers[(seed + i + j) % len(numbers)]} for j in range(batch)]
+                client.request("POST", "/batch", {"operations": operations})
+            else:
+                client.request("POST", "/reservations", {"airline": airline, "name": f"P{seed}-{i}",
+                                                         "flight_number": numbers[(seed + i) % len(numbers)]})
+            latencies.append(time.perf_counter() - start)
+    finally:
+        client.close()
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load generator for the booking server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="port of a running server; omitted: start one in-process")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=500, help="requests per worker")
+    parser.add_argument("--batch", type=int, default=1, help="bookings per request (uses POST /batch if > 1)")
+    parser.add_argument("--flights", type=int, default=20)
+    args = parser.parse_args()
+
+    server = None
+    host, port = args.host, args.port
+    if port is None:
+        server = make_server(host, 0)
+        port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        setup_client = Client(host, port)
+        airline, numbers = setup(setup_client, args.flights)
+        setup_client.close()
+
+        latencies = []
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            futures = [pool.submit(worker, host, port, airline, numbers, args.requests, args.batch, latencies, seed)
+                       for seed in range(args.workers)]
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - start
+
+        requests = len(latencies)
+        print(f"requests: {requests}  bookings: {requests * args.batch}  time: {elapsed:.2f}s")
+        print(f"requests/s: {requests / elapsed:.0f}  bookings/s: {requests * args.batch / elapsed:.0f}")
+        print(f"latency ms  mean: {statistics.mean(latencies) * 1000:.2f}  "
+              f"p50: {percentile(latencies, 0.5) * 1000:.2f}  p95: {percentile(latencies, 0.95) * 1000:.2f}  "
+              f"p99: {percentile(latencies, 0.99) * 1000:.2f}")
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
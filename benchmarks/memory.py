@@ -0,0 +1,77 @@
+# Memory benchmark for the reservation stores.
+# Run from the repository root:  python -m benchmarks.memory --help
+#
+# Books --tickets reservations spread over --flights flights and --passengers distinct
+# passenger names, once into a ReservationStore (one TicketReservation object per ticket)
+# and once into a CompactReservationStore (columns), and reports the memory each takes
+# (measured with tracemalloc) together with the time of adding and looking up tickets.
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from compact_store import CompactReservationStore
+from flight_factory import FlightFactory
+from reservation_store import ReservationStore
+from seat_inventory import SeatInventory
+from ticket_reservation import TicketReservation
+
+
+def build_flights(count: int, rows: int):
+    factory = FlightFactory()
+    return [factory.create_flight("domestic" if f % 2 else "international", f"F{f}", f"City{f % 50}",
+                                  100.0 + f, seats=SeatInventory.single_cabin(rows)) for f in range(count)]
+
+
+# Fills a new store and returns (store, bytes used, seconds taken)
+def fill(store_type, flights, passengers, tickets: int, rows: int):
+    rng = random.Random(42)
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    store = store_type()
+    for i in range(tickets):
+        flight = flights[rng.randrange(len(flights))]
+        seat = f"{1 + (i // 6) % rows}{'ABCDEF'[i % 6]}"
+        store.add(TicketReservation(passengers[rng.randrange(len(passengers))], flight, flight.price, seat))
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return store, used, elapsed
+
+
+def lookups(store, tickets: int, count: int) -> float:
+    rng = random.Random(7)
+    ids = [rng.randrange(1, tickets + 1) for _ in range(count)]
+    start = time.perf_counter()
+    for ticket_id in ids:
+        store.get(ticket_id).price
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory use of the reservation stores")
+    parser.add_argument("--tickets", type=int, default=500000)
+    parser.add_argument("--flights", type=int, default=2000)
+    parser.add_argument("--passengers", type=int, default=100000, help="distinct passenger names")
+    parser.add_argument("--rows", type=int, default=40, help="seat rows per flight (6 seats each)")
+    parser.add_argument("--lookups", type=int, default=100000)
+    args = parser.parse_args()
+
+    flights = build_flights(args.flights, args.rows)
+    # Names come from input at run time, so they are built here rather than being constants
+    passengers = ["".join(("Passenger", str(p))) for p in range(args.passengers)]
+    print(f"{args.tickets} tickets, {args.flights} flights, {args.passengers} passengers")
+    print(f"{'store':>26} {'MiB':>9} {'bytes/ticket':>13} {'add/s':>10} {'get/s':>10}")
+    for store_type in (ReservationStore, CompactReservationStore):
+        store, used, elapsed = fill(store_type, flights, passengers, args.tickets, args.rows)
+        get_time = lookups(store, args.tickets, args.lookups)
+        print(f"{store_type.__name__:>26} {used / 2 ** 20:>9.1f} {used / args.tickets:>13.0f} "
+              f"{args.tickets / elapsed:>10.0f} {args.lookups / get_time:>10.0f}")
+        del store
+
+
+if __name__ == "__main__":
+    main()
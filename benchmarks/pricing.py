@@ -0,0 +1,72 @@
+# Benchmark of repricing a whole network.
+# Run from the repository root:  python -m benchmarks.pricing --help
+#
+# Compares the per-object path (calculate_price and change_flight_price for every flight,
+# as the console does it) with the PricingEngine, which computes all prices in one pass
+# (vectorised if NumPy is installed) and applies them with one change_flight_prices call.
+import argparse
+import time
+
+from airline import AirLine
+from flight_factory import FlightFactory
+from pricing import Multiplier, PerKmRate, PricingEngine, Surcharge, np
+from ticket_manager import TicketManager
+
+
+def build_schedule(manager: TicketManager, airlines: int, flights: int):
+    manager.replace_state([], [])
+    factory = FlightFactory()
+    for a in range(airlines):
+        airline = AirLine(f"Airline{a}")
+        manager.add_airline(airline)
+        for f in range(flights):
+            manager.add_flight(airline, factory.create_flight("domestic" if f % 2 else "international",
+                                                              f"A{a}F{f}", f"City{f % 50}", 100.0 + f))
+
+
+def per_object(manager: TicketManager, factor: float):
+    for airline, flight in list(manager.iter_flights()):
+        manager.change_flight_price(airline, flight, flight.calculate_price(flight.distance) * factor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk repricing benchmark")
+    parser.add_argument("--airlines", type=int, default=10)
+    parser.add_argument("--flights", type=int, default=10000, help="flights per airline")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    manager = TicketManager()
+    build_schedule(manager, args.airlines, args.flights)
+    flights = [flight for _, flight in manager.iter_flights()]
+    print(f"{len(flights)} flights, NumPy {'available' if np is not None else 'not installed'}")
+
+    # Every round changes all prices, so every flight is really updated each time
+    simple = [PricingEngine([PerKmRate(), Multiplier(1.0 + r / 100)]) for r in range(1, args.repeat + 1)]
+    rules = [PricingEngine([PerKmRate(), Multiplier(1.1, kind="international"), Surcharge(500, min_distance=5000),
+                            Multiplier(1.0 + r / 100)]) for r in range(1, args.repeat + 1)]
+    results = []
+    start = time.perf_counter()
+    for r in range(1, args.repeat + 1):
+        per_object(manager, 1.0 + r / 100)
+    results.append(("per object", time.perf_counter() - start))
+    start = time.perf_counter()
+    for engine in simple:
+        engine.price(flights)
+    results.append(("engine, compute only", time.perf_counter() - start))
+    start = time.perf_counter()
+    for engine in simple:
+        engine.reprice(manager)
+    results.append(("engine, compute + apply", time.perf_counter() - start))
+    start = time.perf_counter()
+    for engine in rules:
+        engine.reprice(manager)
+    results.append(("engine, 4 rules + apply", time.perf_counter() - start))
+
+    print(f"{'path':>26} {'flights/s':>12}")
+    for name, elapsed in results:
+        print(f"{name:>26} {len(flights) * args.repeat / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
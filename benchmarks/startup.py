@@ -0,0 +1,102 @@
+# Startup benchmark: loading a pickle state file against a memory-mapped snapshot.
+# Run from the repository root:  python -m benchmarks.startup --help
+#
+# Writes the same generated state (--flights flights with seat maps, --tickets tickets) as
+# a pickle file and as a snapshot, then loads each in a fresh interpreter and reports the
+# time of load_state, the time of the first ticket lookup after it, and the peak memory.
+import argparse
+import json
+import os
+import pickle
+import random
+import subprocess
+import sys
+import tempfile
+
+from airline import AirLine
+from flight_factory import FlightFactory
+from reservation_store import ReservationStore
+from seat_inventory import SeatInventory
+from snapshot import write_snapshot
+from ticket_reservation import TicketReservation
+
+# Runs in the child process: argv[1] is the state file, argv[2] a ticket id to look up
+_CHILD = """
+import json, sys, time
+from ticket_manager import TicketManager
+
+def peak_rss_mib():
+    # ru_maxrss would include the parent's peak, as it survives exec
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+manager = TicketManager()
+start = time.perf_counter()
+manager.load_state(sys.argv[1])
+loaded = time.perf_counter()
+ticket = manager.get_ticket(int(sys.argv[2]))
+assert ticket is not None and ticket.flight.seats.is_taken(ticket.seat)
+first = time.perf_counter()
+print(json.dumps({"load": loaded - start, "first_lookup": first - loaded,
+                  "max_rss_mib": peak_rss_mib()}))
+"""
+
+
+def build_state(airlines: int, flights: int, tickets: int, rows: int):
+    rng = random.Random(1)
+    factory = FlightFactory()
+    all_airlines = [AirLine(f"Airline{a}") for a in range(airlines)]
+    all_flights = []
+    for f in range(flights):
+        flight = factory.create_flight("domestic" if f % 2 else "international", f"F{f}", f"City{f % 100}",
+                                       100.0 + f % 5000, seats=SeatInventory.single_cabin(rows))
+        all_airlines[f % airlines].add_flight(flight)
+        all_flights.append(flight)
+    store = ReservationStore()
+    for t in range(tickets):
+        flight = all_flights[rng.randrange(flights)]
+        if not flight.seats.has_seat():
+            continue
+        ticket = TicketReservation(f"Passenger{rng.randrange(tickets // 3 + 1)}", flight, flight.price)
+        ticket.seat = flight.seats.hold()
+        store.add(ticket)
+    return all_airlines, store
+
+
+# The child imports the project, so it runs in the repository root
+def measure(file_name: str, ticket_id: int) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", _CHILD, file_name, str(ticket_id)],
+                            check=True, capture_output=True, text=True, cwd=root).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time of pickle and snapshot state files")
+    parser.add_argument("--airlines", type=int, default=20)
+    parser.add_argument("--flights", type=int, default=5000)
+    parser.add_argument("--rows", type=int, default=30, help="seat rows per flight (6 seats each)")
+    parser.add_argument("--tickets", type=int, nargs="+", default=[10000, 100000, 500000])
+    args = parser.parse_args()
+
+    print(f"{'tickets':>8} {'format':>9} {'MiB':>7} {'load s':>8} {'first ms':>9} {'max RSS MiB':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for tickets in args.tickets:
+            airlines, store = build_state(args.airlines, args.flights, tickets, args.rows)
+            pickle_file = os.path.join(directory, "state.pickle")
+            snapshot_file = os.path.join(directory, "state.snap")
+            with open(pickle_file, "wb") as f:
+                pickle.dump({"airlines": airlines, "tickets": list(store)}, f)
+            write_snapshot(snapshot_file, airlines, store)
+            ticket_id = random.Random(2).randrange(1, len(store) + 1)
+            for name, file_name in (("pickle", pickle_file), ("snapshot", snapshot_file)):
+                result = measure(file_name, ticket_id)
+                print(f"{len(store):>8} {name:>9} {os.path.getsize(file_name) / 2 ** 20:>7.1f} "
+                      f"{result['load']:>8.3f} {result['first_lookup'] * 1000:>9.2f} {result['max_rss_mib']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# Benchmark suite of the core booking operations, with machine-readable results.
+# Run from the repository root:  python -m benchmarks.suite --help
+#
+#   python -m benchmarks.suite --json before.json
+#   ... change something ...
+#   python -m benchmarks.suite --json after.json --compare before.json
+#
+# Every scenario runs in a fresh interpreter on the same generated data set (--airlines
+# airlines x --flights flights each x --tickets reservations, from a fixed --seed), so one
+# scenario's garbage or peak memory does not affect the next. For each scenario the
+# operations per second, latency percentiles of single operations, the resident memory
+# before the timed part and the peak during it are reported.
+#
+# Scenarios:
+#   create          create_reservation on random flights
+#   cancel          remove_ticket_by_id of random tickets
+#   remove_flight   remove_flight_cascade: a flight with its reservations, as the consoles do
+#   list_tickets    get_all_tickets
+#   page_tickets    one page (--page tickets) at a random offset
+#   list_flights    get_all_flights
+#   search          search_flights by destination and maximum price
+#   save            save_state to a state file
+#   load            load_state of that file
+#   startup         a new interpreter importing the manager and loading the state file
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, List, Optional
+
+SCENARIOS = ["create", "cancel", "remove_flight", "list_tickets", "page_tickets", "list_flights", "search",
+             "save", "load", "startup"]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the interpreter of the startup scenario: argv[1] is the state file
+_STARTUP = """
+import sys, time
+start = time.perf_counter()
+from ticket_manager import BaseTicketManager
+manager = BaseTicketManager()
+manager.load_state(sys.argv[1])
+print(time.perf_counter() - start)
+"""
+
+
+def _status_mib(field: str) -> float:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(field):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+# Resets the peak resident memory (VmHWM) to the current one, where Linux allows it
+def _reset_peak():
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+# The data set: airlines x flights, each flight with enough seats for its share of the
+# tickets plus the bookings of the create scenario, and the given number of tickets
+def build(args):
+    from airline import AirLine
+    from flight_factory import FlightFactory
+    from seat_inventory import SeatInventory
+    from ticket_manager import BaseTicketManager
+
+    rng = random.Random(args.seed)
+    manager = BaseTicketManager()
+    factory = FlightFactory()
+    flight_count = args.airlines * args.flights
+    rows = (2 * (args.tickets + args.ops) // flight_count) // 6 + 2
+    pairs = []
+    for a in range(args.airlines):
+        airline = AirLine(f"Airline{a}")
+        manager.add_airline(airline)
+        for f in range(args.flights):
+            flight = factory.create_flight("domestic" if f % 2 else "international", f"A{a}F{f}",
+                                           f"City{f % 100}", 100.0 + rng.randrange(5000),
+                                           seats=SeatInventory.single_cabin(rows))
+            pairs.append((airline, flight))
+    manager.add_flights(pairs)
+    flights = [flight for _, flight in pairs]
+    for t in range(args.tickets):
+        manager.create_reservation(f"Passenger{rng.randrange(args.tickets // 3 + 1)}", rng.choice(flights))
+    return manager, pairs
+
+
+# Times op(i) for i in range(count) one by one and returns the result entry
+def measure(name: str, count: int, op: Callable[[int], object], rss_before: float) -> dict:
+    latencies: List[int] = []
+    clock = time.perf_counter_ns
+    _reset_peak()
+    start = clock()
+    for i in range(count):
+        begin = clock()
+        op(i)
+        latencies.append(clock() - begin)
+    elapsed = (clock() - start) / 1e9
+    return result(name, count, elapsed, [latency / 1e3 for latency in latencies], rss_before)
+
+
+def result(name: str, count: int, elapsed: float, latencies_us: List[float], rss_before: float) -> dict:
+    if len(latencies_us) > 1:
+        cuts = statistics.quantiles(latencies_us, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies_us[0]
+    return {"scenario": name, "ops": count, "seconds": elapsed, "ops_per_sec": count / elapsed if elapsed else None,
+            "p50_us": p50, "p95_us": p95, "p99_us": p99, "max_us": max(latencies_us),
+            "rss_before_mib": rss_before, "peak_rss_mib": _status_mib("VmHWM:")}
+
+
+# Runs one scenario in this interpreter and returns its result entry
+def run_scenario(name: str, args) -> dict:
+    from storage import FileStorage
+
+    manager, pairs = build(args)
+    rng = random.Random(args.seed + 1)
+    rss = _status_mib("VmRSS:")
+    if name == "create":
+        flights = [flight for _, flight in pairs]
+        return measure(name, args.ops, lambda i: manager.create_reservation(f"New{i}", rng.choice(flights)), rss)
+    if name == "cancel":
+        ids = rng.sample([ticket.ticket_id for ticket in manager.iter_tickets()], min(args.ops, args.tickets))
+        return measure(name, len(ids), lambda i: manager.remove_ticket_by_id(ids[i]), rss)
+    if name == "remove_flight":
+        victims = rng.sample(pairs, min(args.ops, len(pairs)))
+
+        return measure(name, len(victims), lambda i: manager.remove_flight_cascade(*victims[i]), rss)
+    if name == "list_tickets":
+        return measure(name, args.repeat, lambda i: manager.get_all_tickets(), rss)
+    if name == "page_tickets":
+        offsets = [rng.randrange(max(1, args.tickets - args.page)) for _ in range(args.ops)]
+        return measure(name, args.ops, lambda i: manager.page_tickets(offsets[i], args.page), rss)
+    if name == "list_flights":
+        return measure(name, args.repeat, lambda i: manager.get_all_flights(), rss)
+    if name == "search":
+        queries = [(f"City{rng.randrange(100)}", 100.0 + rng.randrange(5000)) for _ in range(args.ops)]
+        return measure(name, args.ops, lambda i: manager.search_flights(queries[i][0], max_price=queries[i][1]), rss)
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "bench.state")
+        manager.use_storage(FileStorage(file_name))
+        if name == "save":
+            return measure(name, args.repeat, lambda i: manager.save_state(), rss)
+        manager.save_state()
+        if name == "load":
+            return measure(name, args.repeat, lambda i: manager.load_state(file_name), rss)
+        if name == "startup":
+            del manager, pairs
+            latencies = []
+            for _ in range(args.repeat):
+                output = subprocess.run([sys.executable, "-c", _STARTUP, file_name], check=True,
+                                        capture_output=True, text=True, cwd=ROOT).stdout
+                latencies.append(float(output.strip().splitlines()[-1]) * 1e6)
+            return result(name, args.repeat, sum(latencies) / 1e6, latencies, rss)
+    raise ValueError(f"Unknown scenario {name!r}")
+
+
+# Runs the scenario in a fresh interpreter and returns its result entry
+def run_child(name: str, args) -> dict:
+    command = [sys.executable, "-m", "benchmarks.suite", "--child", name]
+    for option in ("airlines", "flights", "tickets", "ops", "repeat", "page", "seed"):
+        command += [f"--{option}", str(getattr(args, option))]
+    output = subprocess.run(command, check=True, capture_output=True, text=True, cwd=ROOT).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=ROOT).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def report(results: List[dict], baseline: Optional[dict]):
+    header = f"{'scenario':>14} {'ops/s':>12} {'p50 us':>10} {'p95 us':>10} {'p99 us':>10} {'RSS MiB':>8} {'peak':>8}"
+    print(header + (f" {'vs base':>8}" if baseline else ""))
+    for entry in results:
+        line = (f"{entry['scenario']:>14} {entry['ops_per_sec']:>12.1f} {entry['p50_us']:>10.1f} "
+                f"{entry['p95_us']:>10.1f} {entry['p99_us']:>10.1f} {entry['rss_before_mib']:>8.1f} "
+                f"{entry['peak_rss_mib']:>8.1f}")
+        old = baseline.get(entry["scenario"]) if baseline else None
+        if old is not None and old.get("ops_per_sec"):
+            line += f" {entry['ops_per_sec'] / old['ops_per_sec']:>7.2f}x"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite of the core booking operations")
+    parser.add_argument("--airlines", type=int, default=20)
+    parser.add_argument("--flights", type=int, default=500, help="flights per airline")
+    parser.add_argument("--tickets", type=int, default=200000, help="reservations in the data set")
+    parser.add_argument("--ops", type=int, default=10000, help="operations of the per-item scenarios")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of the whole-state scenarios")
+    parser.add_argument("--page", type=int, default=50, help="page size of page_tickets")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--json", metavar="FILE", help="write the results to this file")
+    parser.add_argument("--compare", metavar="FILE", help="results of an earlier run to compare with")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scenario(args.child, args)))
+        return
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {entry["scenario"]: entry for entry in json.load(f)["results"]}
+    print(f"{args.airlines} airlines x {args.flights} flights, {args.tickets} tickets, seed {args.seed}")
+    results = [run_child(name, args) for name in args.scenarios]
+    report(results, baseline)
+    if args.json:
+        document = {
+            "meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "commit": _git_commit(),
+                     "python": platform.python_version(), "platform": platform.platform(),
+                     "cpus": os.cpu_count(),
+                     "parameters": {option: getattr(args, option) for option in
+                                    ("airlines", "flights", "tickets", "ops", "repeat", "page", "seed")}},
+            "results": results,
+        }
+        with open(args.json, "w") as f:
+            json.dump(document, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
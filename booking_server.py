@@ -0,0 +1,704 @@
+# Machine-facing HTTP/JSON interface of the booking system.
+# Start it with:  python booking_server.py --port 8080
+#
+# Connections are kept alive (HTTP/1.1), and POST /batch runs many bookings and
+# cancellations in one request, so clients do not pay a round trip per operation.
+#
+#   GET    /airlines                           names of all airlines
+#   POST   /airlines        {"name"}           create an airline
+#   DELETE /airlines/<name>                    remove an airline with its flights and their
+#                                              reservations, returns the refund
+#   GET    /flights?destination=&max_price=    flights, optionally filtered
+#   POST   /flights         {"airline", "kind", "flight_number", "destination", "distance",
+#                            "price"?, "rows"?}
+#   DELETE /flights/<airline>/<flight_number>  remove a flight with its reservations, returns
+#                                              the refund
+#   GET    /tickets?offset=&limit=             reservations in booking order, optionally one page
+#   GET    /tickets/<id>                       one reservation
+#   GET    /quote?airline=&flight_number=&days=&cabin=
+#                                              current fare (load factor and days to departure)
+#   POST   /reservations    {"airline", "flight_number", "name", "cabin"?, "seat"?, "days"?,
+#                            "idempotency_key"?}
+#                                              with "days" the ticket costs the quoted fare;
+#                                              a retry with the key (or the Idempotency-Key
+#                                              header) of a booking returns that ticket
+#   DELETE /reservations/<id>                  cancel, returns the refund
+#   POST   /holds           {"airline", "flight_number", "name", "cabin"?, "seat"?, "days"?,
+#                            "ttl"?}             hold a seat for ttl seconds (e.g. during payment)
+#   POST   /holds/<id>/confirm                 book the held seat, returns the ticket
+#   DELETE /holds/<id>                         release the held seat
+#   POST   /users           {"user_name", "real_name"}
+#                                              register a user; reservations and holds may
+#                                              carry its "user_id"
+#   GET    /users?user_name=&name=             users by username or by real name
+#   GET    /users/<id>                         one user
+#   GET    /users/<id>/tickets                 the user's reservations in booking order
+#   POST   /batch           {"operations": [{"op": "book", ...}, {"op": "cancel", "ticket_id"}]}
+#                                              bookings may carry an "idempotency_key" too
+#   POST   /save                               save_state
+#   GET    /metrics                            counters, latencies and gauges in the Prometheus
+#                                              text format (with --metrics, see metrics.py)
+#   GET    /profile?format=collapsed           slow operations and their sampled stacks so far
+#                                              (with --profile SECONDS, see profiling.py)
+#
+# With --replicate HOST:PORT the server is a replication leader, with --follow HOST:PORT a
+# read-only follower of one (see replication.py); changes sent to a follower fail with 400.
+# With --shards N the airlines are spread over N shards (see sharding.py), with
+# --processes every shard runs in a worker process of its own.
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import metrics
+import profiling
+from airline import AirLine
+from flight import Flight
+from fare_quotes import FareQuoter
+from flight_factory import FlightFactory, flight_kind
+from holds import SeatHold
+from replication import ReplicationFollower, ReplicationLeader
+from seat_inventory import SeatInventory
+from sharding import (FILE_NAME as SHARD_FILE_NAME, ShardedTicketManager, largest_ticket_id, load_shard_part,
+                      make_shard, number_tickets, shard_index, ticket_shard_index)
+from ticket_manager import RemovalReport, TicketManager
+from ticket_reservation import TicketReservation
+from user import User
+
+
+# Raised for requests that refer to something that does not exist (answered with 404)
+class NotFound(Exception):
+    pass
+
+
+def flight_to_dict(airline_name: str, flight: Flight) -> dict:
+    seats = flight.seats
+    return {
+        "airline": airline_name,
+        "kind": flight_kind(flight),
+        "flight_number": flight.flight_number,
+        "destination": flight.destination,
+        "distance": flight.distance,
+        "price": flight.price,
+        "capacity": seats.capacity if seats is not None else None,
+        "available": seats.available() if seats is not None else None,
+    }
+
+
+def ticket_to_dict(ticket: TicketReservation) -> dict:
+    return {
+        "ticket_id": ticket.ticket_id,
+        "name": ticket.name,
+        "flight_number": ticket.flight.flight_number,
+        "price": ticket.price,
+        "seat": ticket.seat,
+        "user_id": ticket.user_id,
+    }
+
+
+def removal_to_dict(report: RemovalReport) -> dict:
+    return {"airlines": report.airlines, "flights": report.flights,
+            "ticket_ids": [ticket.ticket_id for ticket in report.tickets], "refund": report.refund}
+
+
+def user_to_dict(user: User) -> dict:
+    return {"user_id": user.user_id, "user_name": user.user_name, "real_name": user.real_name}
+
+
+def hold_to_dict(hold: SeatHold) -> dict:
+    return {
+        "hold_id": hold.hold_id,
+        "name": hold.name,
+        "flight_number": hold.flight.flight_number,
+        "price": hold.price,
+        "seat": hold.seat,
+        "user_id": hold.user_id,
+        "expires_in": max(0.0, hold.expires - time.monotonic()),
+    }
+
+
+# The operation list of a batch request
+def _operations(body: dict) -> list:
+    operations = body["operations"]
+    if not isinstance(operations, list):
+        raise ValueError("operations must be a list")
+    return operations
+
+
+# The operations behind the endpoints; also used one by one for the items of a batch
+class BookingApi:
+    def __init__(self, manager: TicketManager):
+        self.manager = manager
+        self.quotes = FareQuoter(manager)
+
+    def _airline(self, name: str) -> AirLine:
+        airline = self.manager.get_airline(name)
+        if airline is None:
+            raise NotFound(f"Unknown airline {name!r}")
+        return airline
+
+    def _flight(self, airline_name: str, flight_number: str) -> Flight:
+        flight = self.manager.get_flight(airline_name, flight_number)
+        if flight is None:
+            raise NotFound(f"Unknown flight {airline_name}/{flight_number}")
+        return flight
+
+    def list_airlines(self) -> list:
+        return [airline.name for airline in self.manager.airlines_view()]
+
+    def create_airline(self, body: dict) -> dict:
+        name = body["name"]
+        if self.manager.get_airline(name) is not None:
+            raise ValueError(f"Airline {name!r} already exists")
+        self.manager.add_airline(AirLine(name))
+        return {"name": name}
+
+    def delete_airline(self, name: str) -> dict:
+        return removal_to_dict(self.manager.remove_airline_cascade(self._airline(name)))
+
+    def list_flights(self, destination: Optional[str] = None, max_price: Optional[float] = None) -> list:
+        if destination is None and max_price is None:
+            return [flight_to_dict(airline.name, flight) for airline, flight in self.manager.iter_flights()]
+        return [flight_to_dict(self.manager.airline_of(flight).name, flight)
+                for flight in self.manager.search_flights(destination, max_price=max_price)]
+
+    def create_flight(self, body: dict) -> dict:
+        airline = self._airline(body["airline"])
+        rows = body.get("rows")
+        seats = SeatInventory.single_cabin(rows) if rows else None
+        flight = FlightFactory().create_flight(body["kind"], body["flight_number"], body["destination"],
+                                               float(body["distance"]), body.get("price"), seats)
+        self.manager.add_flight(airline, flight)
+        return flight_to_dict(airline.name, flight)
+
+    def delete_flight(self, airline_name: str, flight_number: str) -> dict:
+        flight = self._flight(airline_name, flight_number)
+        return removal_to_dict(self.manager.remove_flight_cascade(self._airline(airline_name), flight))
+
+    def list_tickets(self, offset: int = 0, limit: Optional[int] = None) -> list:
+        if limit is None and offset == 0:
+            tickets = self.manager.get_all_tickets()
+        else:
+            tickets = self.manager.page_tickets(offset, limit if limit is not None else self.manager.count_tickets())
+        return [ticket_to_dict(ticket) for ticket in tickets]
+
+    def get_ticket(self, ticket_id: int) -> dict:
+        ticket = self.manager.get_ticket(ticket_id)
+        if ticket is None:
+            raise NotFound(f"Unknown ticket {ticket_id}")
+        return ticket_to_dict(ticket)
+
+    def quote(self, airline_name: str, flight_number: str, days: int, cabin: Optional[str] = None) -> dict:
+        flight = self._flight(airline_name, flight_number)
+        return {"airline": airline_name, "flight_number": flight_number, "days": days, "cabin": cabin,
+                "price": self.quotes.quote(flight, days, cabin=cabin)}
+
+    def book(self, body: dict) -> dict:
+        flight = self._flight(body["airline"], body["flight_number"])
+        days = body.get("days")
+        price = self.quotes.quote(flight, int(days), cabin=body.get("cabin")) if days is not None else flight.price
+        user_id = body.get("user_id")
+        ticket = TicketReservation(body["name"], flight, price, body.get("seat"),
+                                   int(user_id) if user_id is not None else None)
+        key = body.get("idempotency_key")
+        if not self.manager.add_ticket(ticket, body.get("cabin"), key):
+            # A retry: the ticket of the first request is the answer
+            ticket = self.manager.get_ticket_by_key(key)
+            if ticket is None:
+                raise ValueError(f"The booking with idempotency key {key!r} was cancelled")
+        return ticket_to_dict(ticket)
+
+    def cancel(self, ticket_id: int) -> dict:
+        if self.manager.get_ticket(ticket_id) is None:
+            raise NotFound(f"Unknown ticket {ticket_id}")
+        return {"ticket_id": ticket_id, "refund": self.manager.remove_ticket_by_id(ticket_id)}
+
+    def hold(self, body: dict) -> dict:
+        flight = self._flight(body["airline"], body["flight_number"])
+        days = body.get("days")
+        price = self.quotes.quote(flight, int(days), cabin=body.get("cabin")) if days is not None else flight.price
+        ttl = body.get("ttl")
+        user_id = body.get("user_id")
+        hold = self.manager.hold_seat(body["name"], flight, body.get("cabin"), body.get("seat"), price,
+                                      float(ttl) if ttl is not None else None,
+                                      int(user_id) if user_id is not None else None)
+        return hold_to_dict(hold)
+
+    def confirm_hold(self, hold_id: str) -> dict:
+        if self.manager.get_hold(hold_id) is None:
+            raise NotFound(f"Unknown hold {hold_id}")
+        return ticket_to_dict(self.manager.confirm_hold(hold_id))
+
+    def release_hold(self, hold_id: str) -> dict:
+        if self.manager.get_hold(hold_id) is None:
+            raise NotFound(f"Unknown hold {hold_id}")
+        self.manager.release_hold(hold_id)
+        return {"hold_id": hold_id, "released": True}
+
+    def create_user(self, body: dict) -> dict:
+        return user_to_dict(self.manager.register_user(body["user_name"], body["real_name"]))
+
+    def find_users(self, user_name: Optional[str] = None, name: Optional[str] = None) -> list:
+        if user_name is not None:
+            user = self.manager.find_user(user_name)
+            return [user_to_dict(user)] if user is not None else []
+        if name is not None:
+            return [user_to_dict(user) for user in self.manager.find_users_by_name(name)]
+        raise ValueError("Give a user_name or a name")
+
+    def get_user(self, user_id: int) -> dict:
+        user = self.manager.get_user(user_id)
+        if user is None:
+            raise NotFound(f"Unknown user {user_id}")
+        return user_to_dict(user)
+
+    def user_tickets(self, user_id: int) -> list:
+        self.get_user(user_id)
+        return [ticket_to_dict(ticket) for ticket in self.manager.get_tickets_for_user(user_id)]
+
+    # Runs every operation on its own; a failing item does not stop the others
+    def batch(self, body: dict) -> list:
+        results = []
+        for operation in _operations(body):
+            try:
+                if not isinstance(operation, dict):
+                    raise ValueError("An operation must be a JSON object")
+                op = operation["op"]
+                if op == "book":
+                    result = self.book(operation)
+                elif op == "cancel":
+                    result = self.cancel(int(operation["ticket_id"]))
+                else:
+                    raise ValueError(f"Unknown operation {op!r}")
+                results.append({"ok": True, "result": result})
+            except KeyError as err:
+                results.append({"ok": False, "error": f"Missing field {err}"})
+            except (ValueError, TypeError, NotFound) as err:
+                results.append({"ok": False, "error": str(err)})
+        return results
+
+    def save(self) -> dict:
+        self.manager.save_state()
+        return {"saved": True}
+
+
+# The BookingApi of one shard, run in a worker process by ShardedBookingApi
+class _ShardApi(BookingApi):
+    def __init__(self, index: int, shards: int, file_name: str):
+        super().__init__(make_shard(index, shards, file_name))
+        self.index = index
+        self.shards = shards
+
+    def load_part(self, source: str) -> bool:
+        return load_shard_part(self.manager, self.index, self.shards, source)
+
+    def largest_ticket_id(self) -> int:
+        return largest_ticket_id(self.manager)
+
+    def number_tickets(self, largest_id: int):
+        number_tickets(self.manager, self.index, self.shards, largest_id)
+
+    # Registers a user created by shard 0 under its id
+    def mirror_user(self, user_name: str, real_name: str, user_id: int):
+        self.manager.register_user(user_name, real_name, user_id)
+
+
+# Main loop of a shard worker process: runs (method, arguments) requests on the shard's
+# API and answers ("ok", result) or ("error", exception), until the pipe is closed
+def _serve_shard(connection, index: int, shards: int, file_name: str):
+    api = _ShardApi(index, shards, file_name)
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        method, args = request
+        try:
+            connection.send(("ok", getattr(api, method)(*args)))
+        except Exception as err:
+            connection.send(("error", err))
+
+
+# A shard worker process, called one request at a time
+class _ShardWorker:
+    def __init__(self, index: int, shards: int, file_name: str):
+        self._connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_serve_shard, args=(child, index, shards, file_name),
+                                               name=f"shard-{index}", daemon=True)
+        self.process.start()
+        child.close()
+        self._lock = threading.Lock()
+
+    def call(self, method: str, *args):
+        with self._lock:
+            self._connection.send((method, args))
+            status, value = self._connection.recv()
+        if status == "error":
+            raise value
+        return value
+
+    def close(self):
+        with self._lock:
+            self._connection.send(None)
+        self.process.join()
+
+
+# The BookingApi over shards running in worker processes. Requests for different shards
+# run at the same time on different cores; listings ask every shard and merge the answers.
+class ShardedBookingApi:
+    def __init__(self, shards: Optional[int] = None, file_name: str = SHARD_FILE_NAME,
+                 default_name: str = TicketManager.DEFAULT_NAME):
+        count = shards if shards is not None else os.cpu_count() or 1
+        if count <= 0:
+            raise ValueError("There must be at least one shard")
+        self.workers: List[_ShardWorker] = [_ShardWorker(index, count, file_name) for index in range(count)]
+        self._pool = ThreadPoolExecutor(max_workers=count, thread_name_prefix="shard-call")
+        # Shards that saved their state before start from it, otherwise from the default state
+        if not any(os.path.exists(file_name.format(index)) for index in range(count)):
+            self._all("load_part", default_name)
+        largest = max(self._all("largest_ticket_id"))
+        self._all("number_tickets", largest)
+
+    def close(self):
+        self._pool.shutdown()
+        for worker in self.workers:
+            worker.close()
+
+    def _worker(self, airline_name: str) -> _ShardWorker:
+        return self.workers[shard_index(airline_name, len(self.workers))]
+
+    # Calls the method on every shard at the same time; the results in shard order
+    def _all(self, method: str, *args) -> list:
+        return list(self._pool.map(lambda worker: worker.call(method, *args), self.workers))
+
+    # Calls the method with a ticket id, first on the shard that numbered the ticket
+    def _ticket_call(self, method: str, ticket_id: int):
+        home = ticket_shard_index(ticket_id, len(self.workers))
+        for index in [home] + [index for index in range(len(self.workers)) if index != home]:
+            try:
+                return self.workers[index].call(method, ticket_id)
+            except NotFound:
+                pass
+        raise NotFound(f"Unknown ticket {ticket_id}")
+
+    def list_airlines(self) -> list:
+        return [name for names in self._all("list_airlines") for name in names]
+
+    def create_airline(self, body: dict) -> dict:
+        return self._worker(body["name"]).call("create_airline", body)
+
+    def list_flights(self, destination: Optional[str] = None, max_price: Optional[float] = None) -> list:
+        results = self._all("list_flights", destination, max_price)
+        if destination is None and max_price is None:
+            return [flight for flights in results for flight in flights]
+        return list(heapq.merge(*results, key=lambda flight: flight["price"]))
+
+    def create_flight(self, body: dict) -> dict:
+        return self._worker(body["airline"]).call("create_flight", body)
+
+    def delete_airline(self, name: str) -> dict:
+        return self._worker(name).call("delete_airline", name)
+
+    def delete_flight(self, airline_name: str, flight_number: str) -> dict:
+        return self._worker(airline_name).call("delete_flight", airline_name, flight_number)
+
+    def list_tickets(self, offset: int = 0, limit: Optional[int] = None) -> list:
+        pages = self._all("list_tickets", 0, offset + limit if limit is not None else None)
+        merged = heapq.merge(*pages, key=lambda ticket: ticket["ticket_id"])
+        return list(itertools.islice(merged, offset, offset + limit if limit is not None else None))
+
+    def get_ticket(self, ticket_id: int) -> dict:
+        return self._ticket_call("get_ticket", ticket_id)
+
+    def quote(self, airline_name: str, flight_number: str, days: int, cabin: Optional[str] = None) -> dict:
+        return self._worker(airline_name).call("quote", airline_name, flight_number, days, cabin)
+
+    def book(self, body: dict) -> dict:
+        return self._worker(body["airline"]).call("book", body)
+
+    def cancel(self, ticket_id: int) -> dict:
+        return self._ticket_call("cancel", ticket_id)
+
+    def hold(self, body: dict) -> dict:
+        return self._worker(body["airline"]).call("hold", body)
+
+    # Hold ids do not tell the shard, so every shard is asked
+    def _hold_call(self, method: str, hold_id: str):
+        for worker in self.workers:
+            try:
+                return worker.call(method, hold_id)
+            except NotFound:
+                pass
+        raise NotFound(f"Unknown hold {hold_id}")
+
+    def confirm_hold(self, hold_id: str) -> dict:
+        return self._hold_call("confirm_hold", hold_id)
+
+    # Every shard keeps all users (see sharding.py); shard 0 assigns the id
+    def create_user(self, body: dict) -> dict:
+        user = self.workers[0].call("create_user", body)
+        for worker in self.workers[1:]:
+            worker.call("mirror_user", user["user_name"], user["real_name"], user["user_id"])
+        return user
+
+    def find_users(self, user_name: Optional[str] = None, name: Optional[str] = None) -> list:
+        return self.workers[0].call("find_users", user_name, name)
+
+    def get_user(self, user_id: int) -> dict:
+        return self.workers[0].call("get_user", user_id)
+
+    def user_tickets(self, user_id: int) -> list:
+        return list(heapq.merge(*self._all("user_tickets", user_id), key=lambda ticket: ticket["ticket_id"]))
+
+    def release_hold(self, hold_id: str) -> dict:
+        return self._hold_call("release_hold", hold_id)
+
+    # Every shard runs its part of the batch at the same time; the results keep the order
+    # of the operations
+    def batch(self, body: dict) -> list:
+        operations = _operations(body)
+        results: List[Optional[dict]] = [None] * len(operations)
+        parts: Dict[int, List[int]] = {}
+        for position, operation in enumerate(operations):
+            try:
+                if not isinstance(operation, dict):
+                    raise ValueError("An operation must be a JSON object")
+                op = operation["op"]
+                if op == "book":
+                    index = shard_index(operation["airline"], len(self.workers))
+                elif op == "cancel":
+                    index = ticket_shard_index(int(operation["ticket_id"]), len(self.workers))
+                else:
+                    raise ValueError(f"Unknown operation {op!r}")
+            except KeyError as err:
+                results[position] = {"ok": False, "error": f"Missing field {err}"}
+                continue
+            except (ValueError, TypeError) as err:
+                results[position] = {"ok": False, "error": str(err)}
+                continue
+            parts.setdefault(index, []).append(position)
+
+        def run(part):
+            index, positions = part
+            return positions, self.workers[index].call("batch", {"operations": [operations[p] for p in positions]})
+        for positions, part_results in self._pool.map(run, parts.items()):
+            for position, result in zip(positions, part_results):
+                results[position] = result
+        # Tickets loaded from a state file may not be in the shard their id points to
+        for position, operation in enumerate(operations):
+            result = results[position]
+            if not isinstance(operation, dict) or result["ok"] or operation.get("op") != "cancel":
+                continue
+            if result["error"] == f"Unknown ticket {operation.get('ticket_id')}":
+                try:
+                    results[position] = {"ok": True, "result": self.cancel(int(operation["ticket_id"]))}
+                except NotFound:
+                    pass
+        return results
+
+    def save(self) -> dict:
+        self._all("save")
+        return {"saved": True}
+
+
+# A response sent as it is instead of as JSON
+class PlainText(str):
+    pass
+
+
+class BookingRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between requests
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without TCP_NODELAY every kept-alive
+    # response would wait for the client's delayed ACK
+    disable_nagle_algorithm = True
+    api: BookingApi = None      # Set by make_server
+
+    def log_message(self, format, *args):
+        # One line per request would dominate the cost under load
+        pass
+
+    def _send(self, status: int, payload):
+        if isinstance(payload, PlainText):
+            body = payload.encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(payload).encode("utf-8")
+            content_type = "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length)) if length else {}
+        if not isinstance(body, dict):
+            raise ValueError("The request body must be a JSON object")
+        return body
+
+    def _handle(self, method: str):
+        try:
+            url = urlsplit(self.path)
+            parts = [part for part in url.path.split("/") if part]
+            self._send(200, self._route(method, parts, parse_qs(url.query)))
+        except NotFound as err:
+            self._send(404, {"error": str(err)})
+        except KeyError as err:
+            self._send(400, {"error": f"Missing field {err}"})
+        except (ValueError, TypeError) as err:
+            self._send(400, {"error": str(err)})
+
+    def _route(self, method: str, parts: list, query: dict):
+        api = self.api
+        if parts == ["airlines"]:
+            if method == "GET":
+                return api.list_airlines()
+            if method == "POST":
+                return api.create_airline(self._body())
+        elif len(parts) == 2 and parts[0] == "airlines" and method == "DELETE":
+            return api.delete_airline(unquote(parts[1]))
+        elif len(parts) == 3 and parts[0] == "flights" and method == "DELETE":
+            return api.delete_flight(unquote(parts[1]), unquote(parts[2]))
+        elif parts == ["flights"]:
+            if method == "GET":
+                destination = query.get("destination", [None])[0]
+                max_price = query.get("max_price", [None])[0]
+                return api.list_flights(destination, float(max_price) if max_price is not None else None)
+            if method == "POST":
+                return api.create_flight(self._body())
+        elif parts == ["tickets"] and method == "GET":
+            limit = query.get("limit", [None])[0]
+            return api.list_tickets(int(query.get("offset", ["0"])[0]), int(limit) if limit is not None else None)
+        elif len(parts) == 2 and parts[0] == "tickets" and method == "GET":
+            return api.get_ticket(int(parts[1]))
+        elif parts == ["quote"] and method == "GET":
+            return api.quote(query["airline"][0], query["flight_number"][0], int(query["days"][0]),
+                             query.get("cabin", [None])[0])
+        elif parts == ["reservations"] and method == "POST":
+            body = self._body()
+            key = self.headers.get("Idempotency-Key")
+            if key is not None:
+                body.setdefault("idempotency_key", key)
+            return api.book(body)
+        elif len(parts) == 2 and parts[0] == "reservations" and method == "DELETE":
+            return api.cancel(int(parts[1]))
+        elif parts == ["holds"] and method == "POST":
+            return api.hold(self._body())
+        elif len(parts) == 3 and parts[0] == "holds" and parts[2] == "confirm" and method == "POST":
+            return api.confirm_hold(parts[1])
+        elif len(parts) == 2 and parts[0] == "holds" and method == "DELETE":
+            return api.release_hold(parts[1])
+        elif parts == ["users"]:
+            if method == "GET":
+                return api.find_users(query.get("user_name", [None])[0], query.get("name", [None])[0])
+            if method == "POST":
+                return api.create_user(self._body())
+        elif len(parts) == 2 and parts[0] == "users" and method == "GET":
+            return api.get_user(int(parts[1]))
+        elif len(parts) == 3 and parts[0] == "users" and parts[2] == "tickets" and method == "GET":
+            return api.user_tickets(int(parts[1]))
+        elif parts == ["batch"] and method == "POST":
+            return api.batch(self._body())
+        elif parts == ["save"] and method == "POST":
+            return api.save()
+        elif parts == ["metrics"] and method == "GET":
+            if metrics.registry is None:
+                raise NotFound("Metrics are not enabled")
+            return PlainText(metrics.registry.prometheus_text())
+        elif parts == ["profile"] and method == "GET":
+            running = profiling.profiler
+            if running is None:
+                raise NotFound("Profiling is not enabled")
+            if query.get("format", [None])[0] == "collapsed":
+                return PlainText(running.collapsed())
+            return PlainText(running.report())
+        raise NotFound(f"No endpoint {method} {self.path}")
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+# Creates a threaded server for the given manager (the TicketManager singleton by default)
+# or API (e.g. a ShardedBookingApi)
+def make_server(host: str = "127.0.0.1", port: int = 8080, manager: Optional[TicketManager] = None,
+                api=None) -> ThreadingHTTPServer:
+    if api is None:
+        api = BookingApi(manager if manager is not None else TicketManager())
+    handler = type("Handler", (BookingRequestHandler,), {"api": api})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/JSON booking server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    role = parser.add_mutually_exclusive_group()
+    role.add_argument("--replicate", metavar="HOST:PORT", help="stream changes to followers connecting here")
+    role.add_argument("--follow", metavar="HOST:PORT", help="be a read-only copy of this leader")
+    parser.add_argument("--shards", type=int, help="spread the airlines over this many shards")
+    parser.add_argument("--processes", action="store_true", help="run every shard in a process of its own")
+    parser.add_argument("--metrics", action="store_true", help="collect metrics and serve them on /metrics")
+    parser.add_argument("--profile", type=float, metavar="SECONDS",
+                        help="log operations slower than this, sample their stacks and serve /profile")
+    args = parser.parse_args()
+    if args.shards and (args.replicate or args.follow):
+        parser.error("--shards cannot be combined with replication")
+    if args.processes and not args.shards:
+        parser.error("--processes needs --shards")
+    if (args.metrics or args.profile is not None) and args.processes:
+        parser.error("--metrics and --profile cannot see into shard processes, use them without --processes")
+    api = None
+    if args.processes:
+        api = ShardedBookingApi(args.shards)
+        manager = None
+    elif args.shards:
+        manager = ShardedTicketManager(args.shards)
+    else:
+        manager = TicketManager()
+    if args.replicate:
+        host, port = args.replicate.rsplit(":", 1)
+        ReplicationLeader(manager, host, int(port))
+    elif args.follow:
+        host, port = args.follow.rsplit(":", 1)
+        ReplicationFollower(manager, (host, int(port)))
+    if args.metrics:
+        metrics.enable_metrics(manager)
+    if args.profile is not None:
+        logging.basicConfig(format="%(asctime)s %(message)s")
+        profiling.enable_profiling(args.profile, extra_classes=[BookingApi])
+        profiling.install_dump_signal()
+    server = make_server(args.host, args.port, manager, api)
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if api is not None:
+            api.close()
+
+
+if __name__ == "__main__":
+    main()
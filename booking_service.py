@@ -0,0 +1,90 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from flight import Flight
+from holds import SeatHold
+from ticket_manager import TicketManager
+from ticket_reservation import TicketReservation
+from user import User
+
+
+# Asyncio front-end of the TicketManager. One event loop can serve any number of
+# concurrent clients: bookings and cancellations run on a small thread pool (they may
+# wait for a flight lock or a journal fsync), saving and loading run on a separate
+# single-thread pool, so a save in progress never holds up the bookings.
+class AsyncBookingService:
+    def __init__(self, manager: Optional[TicketManager] = None, booking_workers: int = 8):
+        self.manager: TicketManager = manager if manager is not None else TicketManager()
+        self._booking_pool = ThreadPoolExecutor(max_workers=booking_workers, thread_name_prefix="booking")
+        self._io_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persistence")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+    async def _run(self, pool: ThreadPoolExecutor, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+
+    # Books a ticket and returns the reservation (ValueError if the flight is full or unknown).
+    # A retry with the idempotency key of an earlier booking returns that booking's ticket
+    # (None if it was cancelled since). With a user id the ticket is booked for that registered user.
+    async def create_reservation(self, real_name: str, flight: Flight, cabin: Optional[str] = None,
+                                 seat: Optional[str] = None, idempotency_key: Optional[str] = None,
+                                 user_id: Optional[int] = None) -> Optional[TicketReservation]:
+        ticket = TicketReservation(real_name, flight, flight.price, seat, user_id)
+        if not await self._run(self._booking_pool, self.manager.add_ticket, ticket, cabin, idempotency_key):
+            return self.manager.get_ticket_by_key(idempotency_key)
+        return ticket
+
+    # Holds a seat while the payment runs (see TicketManager.hold_seat)
+    async def hold_seat(self, real_name: str, flight: Flight, cabin: Optional[str] = None,
+                        seat: Optional[str] = None, ttl: Optional[float] = None,
+                        user_id: Optional[int] = None) -> SeatHold:
+        return await self._run(self._booking_pool, self.manager.hold_seat, real_name, flight, cabin, seat, None, ttl,
+                               user_id)
+
+    # Books the held seat and returns the ticket (ValueError if the hold expired)
+    async def confirm_hold(self, hold_id: str) -> TicketReservation:
+        return await self._run(self._booking_pool, self.manager.confirm_hold, hold_id)
+
+    async def release_hold(self, hold_id: str):
+        await self._run(self._booking_pool, self.manager.release_hold, hold_id)
+
+    # Cancels a ticket by id and returns the refunded price
+    async def cancel(self, ticket_id: int) -> float:
+        return await self._run(self._booking_pool, self.manager.remove_ticket_by_id, ticket_id)
+
+    async def get_ticket(self, ticket_id: int) -> Optional[TicketReservation]:
+        return self.manager.get_ticket(ticket_id)
+
+    # Registers a user (ValueError if the username is taken)
+    async def register_user(self, user_name: str, real_name: str) -> User:
+        return await self._run(self._booking_pool, self.manager.register_user, user_name, real_name)
+
+    # The bookings of a registered user, in booking order
+    async def user_tickets(self, user_id: int) -> List[TicketReservation]:
+        return self.manager.get_tickets_for_user(user_id)
+
+    # All tickets in booking order, or one page of them when a limit is given
+    async def list_tickets(self, offset: int = 0, limit: Optional[int] = None) -> List[TicketReservation]:
+        if limit is None and offset == 0:
+            return self.manager.get_all_tickets()
+        return self.manager.page_tickets(offset, limit if limit is not None else self.manager.count_tickets())
+
+    # Returns the flights matching all given filters, cheapest first (destination is case-insensitive)
+    async def search_flights(self, destination: Optional[str] = None, max_price: Optional[float] = None,
+                             min_price: Optional[float] = None, limit: Optional[int] = None) -> List[Flight]:
+        return self.manager.search_flights(destination, min_price, max_price, limit=limit)
+
+    async def save(self):
+        await self._run(self._io_pool, self.manager.save_state)
+
+    async def load(self, file_name: Optional[str] = None) -> bool:
+        return await self._run(self._io_pool, self.manager.load_state, file_name)
+
+    def close(self):
+        self._booking_pool.shutdown(wait=True)
+        self._io_pool.shutdown(wait=True)
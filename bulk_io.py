@@ -0,0 +1,262 @@
+# Streaming import and export of schedules and reservations as CSV or JSON Lines.
+#
+#   python bulk_io.py import-flights schedule.csv
+#   python bulk_io.py export-tickets tickets.jsonl
+#
+# Files are read and written row by row, and imported flights are added in batches, so the
+# memory used does not depend on the file size. The format follows the file extension
+# (.csv, .jsonl/.ndjson) unless it is given explicitly. Bytes that are not UTF-8 only fail
+# the row they are in.
+#
+# Flight files have the columns airline, kind, flight_number, destination, distance and the
+# optional price (calculated from the distance when empty) and rows (seats rows of six
+# seats, no capacity limit when empty). Airlines that do not exist yet are created.
+import argparse
+import csv
+import json
+import math
+import time
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple, Union
+
+from airline import AirLine
+from flight import Flight
+from flight_factory import FlightFactory, flight_kind
+from seat_inventory import SeatInventory
+from ticket_manager import TicketManager
+
+FLIGHT_FIELDS = ["airline", "kind", "flight_number", "destination", "distance", "price", "rows"]
+TICKET_FIELDS = ["ticket_id", "name", "airline", "flight_number", "price", "seat"]
+
+
+# Counts of an import or export run
+class BulkReport:
+    # At most this many row errors are kept, the rest are only counted
+    MAX_ERRORS = 100
+
+    def __init__(self):
+        self.rows: int = 0
+        self.written: int = 0
+        self.failed: int = 0
+        self.errors: List[Tuple[int, str]] = []    # (row number, message)
+        self.seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def error(self, row: int, message: str):
+        self.failed += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append((row, message))
+
+    def __str__(self):
+        return (f"{self.rows} rows, {self.written} written, {self.failed} failed "
+                f"in {self.seconds:.2f}s ({self.rows_per_second:.0f} rows/s)")
+
+
+def _format(file_name: str, file_format: Optional[str]) -> str:
+    if file_format is None:
+        file_format = "csv" if file_name.lower().endswith(".csv") else "jsonl"
+    if file_format not in ("csv", "jsonl"):
+        raise ValueError(f"Unknown file format {file_format!r}")
+    return file_format
+
+
+# Yields (row number, row) from a CSV or JSON Lines file, one row at a time. CSV rows are
+# dicts, JSON Lines rows are the unparsed lines, so a broken line only fails its own row.
+# ValueError if the CSV header is not valid text.
+def read_rows(stream: TextIO, file_format: str) -> Iterator[Tuple[int, Union[dict, str]]]:
+    if file_format == "csv":
+        # Row 1 is the header; without it no row can be read
+        reader = csv.DictReader(stream)
+        try:
+            for name in reader.fieldnames or ():
+                _check_text(name)
+        except ValueError as err:
+            raise ValueError(f"Invalid header: {err}")
+        yield from enumerate(reader, 2)
+    else:
+        for number, line in enumerate(stream, 1):
+            if line.strip():
+                yield number, line
+
+
+# Files are read with errors="surrogateescape", so undecodable bytes reach the row as
+# surrogates; ValueError if the text has any
+def _check_text(text: str):
+    try:
+        text.encode("utf-8")
+    except UnicodeEncodeError as err:
+        raise ValueError(f"Invalid text: byte {ord(text[err.start]) - 0xDC00:#x} is not UTF-8")
+
+
+# Builds a flight from one row of a schedule file; ValueError if the row is not valid
+def flight_from_row(row: Union[dict, str]) -> Tuple[str, Flight]:
+    if isinstance(row, str):
+        _check_text(row)
+        row = json.loads(row)
+        if not isinstance(row, dict):
+            raise ValueError("Row is not a JSON object")
+    values = {}
+    for name in FLIGHT_FIELDS:
+        value = row.get(name)
+        value = str(value).strip() if value is not None else ""
+        _check_text(value)
+        values[name] = value if value != "" else None
+    for name in ("airline", "kind", "flight_number", "destination", "distance"):
+        if values[name] is None:
+            raise ValueError(f"Missing {name}")
+    try:
+        distance = float(values["distance"])
+        price = float(values["price"]) if values["price"] is not None else None
+        rows = int(values["rows"]) if values["rows"] is not None else None
+    except ValueError as err:
+        raise ValueError(f"Invalid number: {err}")
+    if not math.isfinite(distance) or (price is not None and not math.isfinite(price)):
+        raise ValueError("Distance and price must be finite numbers")
+    if distance <= 0:
+        raise ValueError("Distance must be positive")
+    if price is not None and price < 0:
+        raise ValueError("Price must not be negative")
+    seats = SeatInventory.single_cabin(rows) if rows is not None else None
+    flight = FlightFactory().create_flight(values["kind"], values["flight_number"], values["destination"],
+                                           distance, price, seats)
+    return values["airline"], flight
+
+
+# Imports flights from a CSV or JSON Lines file. Invalid rows and flight numbers that the
+# airline already has are reported and skipped, every other row is added.
+def import_flights(manager: TicketManager, file_name: str, file_format: Optional[str] = None,
+                   batch_size: int = 1000) -> BulkReport:
+    file_format = _format(file_name, file_format)
+    with open(file_name, newline="" if file_format == "csv" else None, encoding="utf-8",
+              errors="surrogateescape") as stream:
+        return import_flight_rows(manager, read_rows(stream, file_format), batch_size)
+
+
+def import_flight_rows(manager: TicketManager, rows: Iterable[Tuple[int, Union[dict, str]]],
+                       batch_size: int = 1000) -> BulkReport:
+    return add_parsed_flights(manager, (parse_flight_row(number, row) for number, row in rows), batch_size)
+
+
+# (row number, airline name, flight, None) for a valid row, (row number, None, None, error) otherwise
+ParsedRow = Tuple[int, Optional[str], Optional[Flight], Optional[str]]
+
+
+def parse_flight_row(number: int, row: Union[dict, str]) -> ParsedRow:
+    try:
+        airline_name, flight = flight_from_row(row)
+    except ValueError as err:
+        return number, None, None, str(err)
+    return number, airline_name, flight, None
+
+
+# Adds parsed rows to the manager in batches, in the order given. Duplicate flight numbers
+# (within the rows or with flights the airline already has) are errors, the first one wins.
+def add_parsed_flights(manager: TicketManager, parsed: Iterable[ParsedRow], batch_size: int = 1000,
+                       report: Optional[BulkReport] = None) -> BulkReport:
+    report = report if report is not None else BulkReport()
+    start = time.perf_counter()
+    airlines: Dict[str, AirLine] = {airline.name: airline for airline in manager.airlines_view()}
+    # Flight numbers already taken per airline
+    taken: Dict[str, Set[str]] = {name: {flight.flight_number for flight in airline.iter_flights()}
+                                  for name, airline in airlines.items()}
+    parsed = iter(parsed)
+    while True:
+        chunk = list(islice(parsed, batch_size))
+        if not chunk:
+            break
+        batch: List[Tuple[AirLine, Flight]] = []
+        for number, airline_name, flight, error in chunk:
+            report.rows += 1
+            if error is not None:
+                report.error(number, error)
+                continue
+            numbers = taken.setdefault(airline_name, set())
+            if flight.flight_number in numbers:
+                report.error(number, f"Duplicate flight {airline_name}/{flight.flight_number}")
+                continue
+            numbers.add(flight.flight_number)
+            airline = airlines.get(airline_name)
+            if airline is None:
+                airline = airlines[airline_name] = AirLine(airline_name)
+                manager.add_airline(airline)
+            batch.append((airline, flight))
+        manager.add_flights(batch)
+        report.written += len(batch)
+    report.seconds += time.perf_counter() - start
+    return report
+
+
+# Writes rows to a CSV or JSON Lines file one at a time
+def _write_rows(file_name: str, file_format: Optional[str], fields: List[str],
+                rows: Iterable[dict]) -> BulkReport:
+    file_format = _format(file_name, file_format)
+    report = BulkReport()
+    start = time.perf_counter()
+    with open(file_name, "w", newline="" if file_format == "csv" else None, encoding="utf-8") as stream:
+        if file_format == "csv":
+            writer = csv.DictWriter(stream, fields)
+            writer.writeheader()
+            write = writer.writerow
+        else:
+            def write(row: dict):
+                stream.write(json.dumps(row) + "\n")
+        for row in rows:
+            write(row)
+            report.rows += 1
+    report.written = report.rows
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+# Exports all reservations
+def export_tickets(manager: TicketManager, file_name: str, file_format: Optional[str] = None) -> BulkReport:
+    def rows():
+        for ticket in manager.iter_tickets():
+            airline = manager.airline_of(ticket.flight)
+            yield {"ticket_id": ticket.ticket_id, "name": ticket.name,
+                   "airline": airline.name if airline is not None else None,
+                   "flight_number": ticket.flight.flight_number, "price": ticket.price, "seat": ticket.seat}
+    return _write_rows(file_name, file_format, TICKET_FIELDS, rows())
+
+
+# Exports the schedule in the format import_flights reads
+def export_flights(manager: TicketManager, file_name: str, file_format: Optional[str] = None) -> BulkReport:
+    def rows():
+        for airline, flight in manager.iter_flights():
+            # Only single-cabin seat maps of six seats per row fit the rows column
+            layout = flight.seats.layout if flight.seats is not None else []
+            rows = layout[0][1] if len(layout) == 1 and layout[0][2] == "ABCDEF" else None
+            yield {"airline": airline.name, "kind": flight_kind(flight), "flight_number": flight.flight_number,
+                   "destination": flight.destination, "distance": flight.distance, "price": flight.price,
+                   "rows": rows}
+    return _write_rows(file_name, file_format, FLIGHT_FIELDS, rows())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import and export")
+    parser.add_argument("action", choices=["import-flights", "export-flights", "export-tickets"])
+    parser.add_argument("file")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="default: from the file extension")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--no-save", action="store_true", help="do not save the state after an import")
+    args = parser.parse_args()
+
+    manager = TicketManager()
+    if args.action == "import-flights":
+        report = import_flights(manager, args.file, args.format, args.batch_size)
+        if not args.no_save:
+            manager.save_state()
+    elif args.action == "export-flights":
+        report = export_flights(manager, args.file, args.format)
+    else:
+        report = export_tickets(manager, args.file, args.format)
+    print(report)
+    for row, message in report.errors:
+        print(f"  row {row}: {message}")
+
+
+if __name__ == "__main__":
+    main()
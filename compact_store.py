@@ -0,0 +1,216 @@
+import threading
+import weakref
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from typing import Dict, Iterator, List, Optional
+
+from flight import Flight
+from ticket_reservation import TicketReservation
+
+
+# Drop-in replacement for ReservationStore that keeps reservations in columns instead of
+# one object per ticket: ticket id, flight number, price, passenger number, seat number and
+# user id are arrays of machine numbers, flights, names and seat labels are stored once in tables.
+# This takes a few dozen bytes per ticket instead of several hundred.
+# TicketReservation objects are only built when a ticket is asked for, and the store keeps
+# one object per ticket id while it is in use (like SQLiteReservationStore).
+class CompactReservationStore:
+    # Removed rows are marked in the flight column and dropped once they are the majority
+    _REMOVED = -1
+    _COMPACT_MIN = 1024
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._next_id: int = 1
+        # Columns, one row per ticket, ordered by ticket id
+        self._ids = array("q")
+        self._flight = array("i")
+        self._price = array("d")
+        self._passenger = array("i")
+        self._seat = array("i")         # -1: no seat
+        self._user = array("q")         # -1: no registered user
+        self._count: int = 0
+        self._removed: int = 0
+        # Value tables; they only grow, entries are not dropped with the last ticket using them
+        self._flights: List[Flight] = []
+        self._flight_no: Dict[Flight, int] = {}
+        self._names: List[str] = []
+        self._name_no: Dict[str, int] = {}
+        self._labels: List[str] = []
+        self._label_no: Dict[str, int] = {}
+        # Secondary indexes: flight / passenger number / user id -> ascending ticket ids
+        self._by_flight: Dict[int, array] = {}
+        self._by_name: Dict[int, array] = {}
+        self._by_user: Dict[int, array] = {}
+        self._live: "weakref.WeakValueDictionary[int, TicketReservation]" = weakref.WeakValueDictionary()
+
+    @staticmethod
+    def _number(value, table: list, numbers: dict) -> int:
+        number = numbers.get(value)
+        if number is None:
+            number = numbers[value] = len(table)
+            table.append(value)
+        return number
+
+    # Row of a stored ticket, or None
+    def _row(self, ticket_id: int) -> Optional[int]:
+        row = bisect_left(self._ids, ticket_id)
+        if row < len(self._ids) and self._ids[row] == ticket_id and self._flight[row] != self._REMOVED:
+            return row
+        return None
+
+    def _ticket(self, row: int) -> TicketReservation:
+        ticket_id = self._ids[row]
+        ticket = self._live.get(ticket_id)
+        if ticket is None:
+            seat = self._seat[row]
+            user = self._user[row]
+            ticket = TicketReservation(self._names[self._passenger[row]], self._flights[self._flight[row]],
+                                       self._price[row], self._labels[seat] if seat >= 0 else None,
+                                       user if user >= 0 else None)
+            ticket.ticket_id = ticket_id
+            self._live[ticket_id] = ticket
+        return ticket
+
+    def __len__(self) -> int:
+        return self._count
+
+    # Walks the tickets by id, so it is not disturbed by changes made while iterating
+    def __iter__(self) -> Iterator[TicketReservation]:
+        last = 0
+        while True:
+            with self._lock:
+                row = bisect_right(self._ids, last)
+                while row < len(self._ids) and self._flight[row] == self._REMOVED:
+                    row += 1
+                if row == len(self._ids):
+                    return
+                last = self._ids[row]
+                ticket = self._ticket(row)
+            yield ticket
+
+    def __contains__(self, ticket: TicketReservation) -> bool:
+        ticket_id = ticket.ticket_id
+        return ticket_id is not None and self.get(ticket_id) is ticket
+
+    def add(self, ticket: TicketReservation) -> int:
+        with self._lock:
+            ticket_id = ticket.ticket_id
+            if ticket_id is None:
+                ticket_id = self._next_id
+                ticket.ticket_id = ticket_id
+            elif self._row(ticket_id) is not None:
+                raise ValueError(f"Duplicate ticket id {ticket_id}")
+            self._next_id = max(self._next_id, ticket_id + 1)
+            flight = self._number(ticket.flight, self._flights, self._flight_no)
+            passenger = self._number(ticket.name, self._names, self._name_no)
+            seat = self._number(ticket.seat, self._labels, self._label_no) if ticket.seat is not None else -1
+            user = ticket.user_id if ticket.user_id is not None else -1
+            if not self._ids or self._ids[-1] < ticket_id:
+                row = len(self._ids)
+                for column, value in ((self._ids, ticket_id), (self._flight, flight), (self._price, ticket.price),
+                                      (self._passenger, passenger), (self._seat, seat), (self._user, user)):
+                    column.append(value)
+            else:
+                # Tickets loaded with older ids than the newest one
+                row = bisect_left(self._ids, ticket_id)
+                if row < len(self._ids) and self._ids[row] == ticket_id:
+                    self._removed -= 1
+                    self._flight[row], self._price[row] = flight, ticket.price
+                    self._passenger[row], self._seat[row], self._user[row] = passenger, seat, user
+                else:
+                    for column, value in ((self._ids, ticket_id), (self._flight, flight), (self._price, ticket.price),
+                                          (self._passenger, passenger), (self._seat, seat), (self._user, user)):
+                        column.insert(row, value)
+            self._count += 1
+            self._index(self._by_flight, flight, ticket_id)
+            self._index(self._by_name, passenger, ticket_id)
+            if user >= 0:
+                self._index(self._by_user, user, ticket_id)
+            self._live[ticket_id] = ticket
+        return ticket_id
+
+    def get(self, ticket_id: int) -> Optional[TicketReservation]:
+        with self._lock:
+            row = self._row(ticket_id)
+            return self._ticket(row) if row is not None else None
+
+    def remove_by_id(self, ticket_id: int) -> TicketReservation:
+        with self._lock:
+            row = self._row(ticket_id)
+            if row is None:
+                raise ValueError("Unknown ticket")
+            ticket = self._ticket(row)
+            self._unindex(self._by_flight, self._flight[row], ticket_id)
+            self._unindex(self._by_name, self._passenger[row], ticket_id)
+            self._unindex(self._by_user, self._user[row], ticket_id)
+            self._flight[row] = self._REMOVED
+            self._live.pop(ticket_id, None)
+            self._count -= 1
+            self._removed += 1
+            if self._removed >= self._COMPACT_MIN and self._removed > self._count:
+                self._compact()
+            return ticket
+
+    def remove(self, ticket: TicketReservation):
+        if ticket not in self:
+            raise ValueError("Unknown ticket")
+        self.remove_by_id(ticket.ticket_id)
+
+    def at(self, idx: int) -> TicketReservation:
+        if idx < 0 or idx >= self._count:
+            raise ValueError("Wrong index")
+        return next(islice(self, idx, None))
+
+    def page(self, offset: int, limit: int) -> List[TicketReservation]:
+        with self._lock:
+            return list(islice(self, offset, offset + limit))
+
+    def by_flight(self, flight: Flight) -> List[TicketReservation]:
+        return self._tickets(self._by_flight, self._flight_no.get(flight))
+
+    def by_name(self, name: str) -> List[TicketReservation]:
+        return self._tickets(self._by_name, self._name_no.get(name))
+
+    def by_user(self, user_id: int) -> List[TicketReservation]:
+        return self._tickets(self._by_user, user_id)
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def _tickets(self, index: dict, number: Optional[int]) -> List[TicketReservation]:
+        with self._lock:
+            return [self._ticket(self._row(ticket_id)) for ticket_id in index.get(number, ())]
+
+    # Drops the removed rows
+    def _compact(self):
+        keep = [row for row, flight in enumerate(self._flight) if flight != self._REMOVED]
+        for name in ("_ids", "_flight", "_price", "_passenger", "_seat", "_user"):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, (column[row] for row in keep)))
+        self._removed = 0
+
+    @staticmethod
+    def _index(index: dict, key: int, ticket_id: int):
+        ids = index.get(key)
+        if ids is None:
+            index[key] = array("q", (ticket_id,))
+        elif ids[-1] < ticket_id:
+            ids.append(ticket_id)
+        else:
+            ids.insert(bisect_left(ids, ticket_id), ticket_id)
+
+    @staticmethod
+    def _unindex(index: dict, key: int, ticket_id: int):
+        ids = index.get(key)
+        if ids is not None:
+            pos = bisect_left(ids, ticket_id)
+            if pos < len(ids) and ids[pos] == ticket_id:
+                del ids[pos]
+            if not ids:
+                del index[key]
@@ -3,6 +3,10 @@ from ticket_reservation import TicketReservation
 from flight import Flight
 from flight_factory import FlightFactory
 from airline import AirLine
+from seat_inventory import SeatInventory
+import sys
+import bulk_io
+import profiling
 
 # Global ticket manager object
 ticket_manager = TicketManager()
@@ -11,7 +15,8 @@ ticket_manager = TicketManager()
 def input_integer(question: str, validator: callable = None, invalid_text: str = "") -> int:
     while True:
         try:
-            result = int(input(question + " "))
+            with profiling.waiting():
+                result = int(input(question + " "))
             if validator is None or validator(result):
                 return result
             else:
@@ -23,7 +28,8 @@ def input_integer(question: str, validator: callable = None, invalid_text: str =
 def input_float(question: str, validator: callable = None, invalid_text: str = "") -> float:
     while True:
         try:
-            result = float(input(question + " "))
+            with profiling.waiting():
+                result = float(input(question + " "))
             if validator is None or validator(result):
                 return result
             else:
@@ -34,7 +40,8 @@ def input_float(question: str, validator: callable = None, invalid_text: str = "
 # Utility function to get a valid string input from user
 def input_string(question: str, validator: callable = None, invalid_text: str = "") -> str:
     while True:
-        result = input(question + " ")
+        with profiling.waiting():
+            result = input(question + " ")
         if validator is None or validator(result):
             return result
         else:
@@ -69,8 +76,8 @@ def handle_airlines():
         print()
         print("Airline menu. The following functions are available:")
         print("These are the known airlines:")
-        for airline_name in ticket_manager.get_all_airlines().keys():
-            print(f"  {airline_name}")
+        for airline in ticket_manager.airlines_view():
+            print(f"  {airline.name}")
         print("1: Create new airline")
         print("2: Delete airline")
         print("0: Go back")
@@ -111,18 +118,24 @@ def delete_airline():
     if airline is None:
         return
     try:
-        ticket_manager.remove_airline_by_airline_object(airline)
+        if airline.flight_count() == 0:
+            ticket_manager.remove_airline_by_airline_object(airline)
+            return
+        answer = input_string(f"The airline has {airline.flight_count()} flight(s). "
+                              "Delete them with all their reservations? (y/n)",
+                              lambda x: x.lower() in ("y", "n"), "Please answer y or n!")
+        if answer.lower() == "y":
+            print(ticket_manager.remove_airline_cascade(airline))
     except ValueError as err:
         print(err)
 
 # Lists all flights
 def list_flights():
     print("Currently available flights:")
-    all_flights = ticket_manager.get_all_flights()
     i = 0
-    for airline_name, flights in all_flights.items():
-        print(f"{airline_name}: ")
-        for flight in flights:
+    for airline in ticket_manager.airlines_view():
+        print(f"{airline.name}: ")
+        for flight in airline.iter_flights():
             i += 1
             print(f"  {i}: {flight}")
 
@@ -135,9 +148,10 @@ def handle_flights():
         print("2: Create new flight")
         print("3: Delete flight")
         print("4: Change flight's price")
+        print("5: Search flights")
         print("0: Go back")
-        choice = input_integer("Choose a number!", lambda x: 0 <= x <= 4,
-                               "The number must be an integer and between 0 and 4!")
+        choice = input_integer("Choose a number!", lambda x: 0 <= x <= 5,
+                               "The number must be an integer and between 0 and 5!")
         if choice == 0:
             return
         elif choice == 1:
@@ -148,6 +162,19 @@ def handle_flights():
             delete_flight()
         elif choice == 4:
             change_flight_price()
+        elif choice == 5:
+            search_flights()
+
+# Searches flights by destination and maximum price
+def search_flights():
+    destination = input_string("Enter a destination, or leave it empty for any destination:")
+    max_price = input_float("Enter the maximum ticket price. If you enter 0, any price is accepted.",
+                            lambda x: x >= 0, "Price must be a non-negative number")
+    flights = ticket_manager.search_flights(destination or None, max_price=max_price or None)
+    if not flights:
+        print("No flights found.")
+    for flight in flights:
+        print(f"  {flight}")
 
 # Creates a new flight
 def create_flight():
@@ -169,11 +196,14 @@ def create_flight():
                         lambda x: x >= 0, "Price must be a non-negative number")
     if price == 0.0:
         price = None
+    rows = input_integer("How many seat rows (6 seats each) does the plane have? Enter 0 for no seat limit.",
+                         lambda x: x >= 0, "The number of rows must be a non-negative integer")
+    seats = SeatInventory.single_cabin(rows) if rows > 0 else None
 
     flight_factory = FlightFactory()
     type_string = "domestic" if domestic_or_int_choice == 2 else "international"
-    flight: Flight = flight_factory.create_flight(type_string, flight_number, destination, distance, price)
-    airline.add_flight(flight)
+    flight: Flight = flight_factory.create_flight(type_string, flight_number, destination, distance, price, seats)
+    ticket_manager.add_flight(airline, flight)
 
 # Lets the user choose a flight from a selected airline
 def choose_flight(airline: AirLine):
@@ -198,7 +228,10 @@ def delete_flight():
     flight = choose_flight(airline)
     if flight is None:
         return
-    airline.remove_flight_object(flight)
+    try:
+        print(ticket_manager.remove_flight_cascade(airline, flight))
+    except ValueError as err:
+        print(err)
 
 # Changes the price of a selected flight
 def change_flight_price():
@@ -213,7 +246,7 @@ def change_flight_price():
                         lambda x: x >= 0, "Price must be a non-negative number")
     if price == 0.0:
         price = flight.calculate_price(flight.distance)
-    flight.price = price
+    ticket_manager.change_flight_price(airline, flight, price)
 
 # Ticket reservation menu
 def handle_tickets():
@@ -237,8 +270,7 @@ def handle_tickets():
 
 # Lists all ticket reservations
 def list_tickets():
-    tickets = ticket_manager.get_all_tickets()
-    for number, ticket in enumerate(tickets, 1):
+    for number, ticket in enumerate(ticket_manager.iter_tickets(), 1):
         print(f"{number}: {ticket}")
 
 # Lets user choose a ticket
@@ -270,7 +302,13 @@ def create_ticket():
     if name == "0":
         return
     ticket = TicketReservation(name, flight, flight.price)
-    ticket_manager.add_ticket(ticket)
+    try:
+        ticket_manager.add_ticket(ticket)
+    except ValueError as err:
+        print(err)
+        return
+    if ticket.seat is not None:
+        print(f"Seat {ticket.seat} is reserved.")
 
 # Deletes a selected ticket reservation
 def delete_ticket():
@@ -287,20 +325,61 @@ def handle_files():
         print("1: Save")
         print("2: Load")
         print("3: Restore default state")
+        print("4: Import flights from a CSV/JSON Lines file")
+        print("5: Export reservations to a CSV/JSON Lines file")
         print("0: Go back")
-        choice = input_integer("Choose a number!", lambda x: 0 <= x <= 3,
-                               "The number must be an integer and between 0 and 3!")
+        choice = input_integer("Choose a number!", lambda x: 0 <= x <= 5,
+                               "The number must be an integer and between 0 and 5!")
         if choice == 0:
             return
         elif choice == 1:
             ticket_manager.save_state()
         elif choice == 2:
-            ticket_manager.load_state()
+            load_state(ticket_manager.load_state)
         elif choice == 3:
-            ticket_manager.load_default()
+            load_state(ticket_manager.load_default)
+        elif choice == 4:
+            import_flights()
+        elif choice == 5:
+            export_tickets()
+
+# Loads a saved state; a damaged or unknown file keeps the current state
+def load_state(load):
+    try:
+        load()
+    except ValueError as err:
+        print(f"Could not load the saved state: {err}")
+
+# Imports flights from a schedule file and prints the result
+def import_flights():
+    file_name = input_string("File name (.csv or .jsonl):", lambda s: s != "", "Please enter a file name!")
+    try:
+        report = bulk_io.import_flights(ticket_manager, file_name)
+    except (OSError, ValueError) as err:
+        print(err)
+        return
+    print(report)
+    for row, message in report.errors:
+        print(f"  row {row}: {message}")
+
+# Exports all reservations to a file
+def export_tickets():
+    file_name = input_string("File name (.csv or .jsonl):", lambda s: s != "", "Please enter a file name!")
+    try:
+        print(bulk_io.export_tickets(ticket_manager, file_name))
+    except OSError as err:
+        print(err)
+
+# The menu actions that profiling times (see profiling.py); the menus and input helpers are
+# left out, their time is spent waiting for the user
+PROFILED_HANDLERS = ["create_airline", "delete_airline", "list_flights", "search_flights", "create_flight",
+                     "delete_flight", "change_flight_price", "list_tickets", "create_ticket",
+                     "delete_ticket", "load_state", "import_flights", "export_tickets"]
 
 # Entry point for the console-based application
 def console_main():
+    module = sys.modules[__name__]
+    profiling.enable_from_environment([(module, name) for name in PROFILED_HANDLERS])
     print("Hello! Welcome to my ticket booking software!")
     while True:
         try:
@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from airline import AirLine
+from flight import Flight
+from holds import SeatHold
+from mutation_listener import MutationListener
+from ticket_reservation import TicketReservation
+
+
+# Yield-managed fare: the flight's base price (Flight.price, by default calculate_price)
+# raised as the flight fills up, as departure gets close and with the expected demand.
+class DynamicPricing:
+    def __init__(self, load_surcharge: float = 1.0, late_days: int = 14, late_surcharge: float = 0.5,
+                 min_factor: float = 0.5, max_factor: float = 3.0):
+        self.load_surcharge = load_surcharge    # extra fare (x base) on a full flight
+        self.late_days = late_days              # the late surcharge starts this many days before departure
+        self.late_surcharge = late_surcharge    # extra fare (x base) on the day of departure
+        self.min_factor = min_factor
+        self.max_factor = max_factor
+
+    # Share of the seats already taken (of the cabin, if given); 0 for flights without seat map
+    @staticmethod
+    def load_factor(flight: Flight, cabin: Optional[str] = None) -> float:
+        seats = flight.seats
+        if seats is None:
+            return 0.0
+        if cabin is None:
+            capacity = seats.capacity
+        else:
+            capacity = sum(rows * len(letters) for name, rows, letters in seats.layout if name == cabin)
+        if capacity == 0:
+            return 1.0
+        return 1.0 - seats.available(cabin) / capacity
+
+    def price(self, flight: Flight, days_to_departure: int, demand: float = 1.0,
+              cabin: Optional[str] = None) -> float:
+        if days_to_departure < 0:
+            raise ValueError("The flight has already departed")
+        if demand <= 0:
+            raise ValueError("Demand must be positive")
+        factor = 1.0 + self.load_surcharge * self.load_factor(flight, cabin) ** 2
+        if days_to_departure < self.late_days:
+            factor += self.late_surcharge * (self.late_days - days_to_departure) / self.late_days
+        factor *= demand
+        factor = min(max(factor, self.min_factor), self.max_factor)
+        return round(flight.price * factor, 2)
+
+
+# Fare quotes with a cache in front of the pricing. Quotes are asked for much more often
+# than seats are booked, so a quote is kept until it expires (ttl seconds), is pushed out
+# by newer ones (at most max_entries are kept) or the flight changes: as a listener of the
+# TicketManager every booking, cancellation, seat hold or release and price change of a
+# flight invalidates its quotes. Invalidation only bumps the flight's version, stale
+# entries age out of the cache; a removed flight's entries are dropped at once.
+class FareQuoter(MutationListener):
+    def __init__(self, manager, pricing: Optional[DynamicPricing] = None, ttl: float = 60.0,
+                 max_entries: int = 100000, clock: Callable[[], float] = time.monotonic):
+        if max_entries <= 0:
+            raise ValueError("The cache must hold at least one quote")
+        self.manager = manager
+        self.pricing = pricing if pricing is not None else DynamicPricing()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        # (flight, days, demand, cabin) -> (flight version, expiry time, price), least recently used first
+        self._cache: "OrderedDict[tuple, Tuple[int, float, float]]" = OrderedDict()
+        self._versions: Dict[Flight, int] = {}
+        # Cache keys by flight, so a removed flight's entries are found without a scan
+        self._keys: Dict[Flight, Set[tuple]] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+        manager.add_listener(self)
+
+    def close(self):
+        self.manager.remove_listener(self)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    # Returns the current fare of a seat on the flight
+    def quote(self, flight: Flight, days_to_departure: int, demand: float = 1.0,
+              cabin: Optional[str] = None) -> float:
+        key = (flight, days_to_departure, demand, cabin)
+        now = self._clock()
+        with self._lock:
+            version = self._versions.get(flight, 0)
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] == version and entry[1] > now:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+        price = self.pricing.price(flight, days_to_departure, demand, cabin)
+        with self._lock:
+            # A booking that came in meanwhile makes this price stale already
+            if self._versions.get(flight, 0) == version:
+                self._cache[key] = (version, now + self.ttl, price)
+                self._cache.move_to_end(key)
+                self._keys.setdefault(flight, set()).add(key)
+                while len(self._cache) > self.max_entries:
+                    old_key, _ = self._cache.popitem(last=False)
+                    keys = self._keys[old_key[0]]
+                    keys.discard(old_key)
+                    if not keys:
+                        del self._keys[old_key[0]]
+        return price
+
+    # Books a ticket at the quoted fare and returns the price paid
+    def book(self, real_name: str, flight: Flight, days_to_departure: int, demand: float = 1.0,
+             cabin: Optional[str] = None, seat: Optional[str] = None) -> float:
+        price = self.quote(flight, days_to_departure, demand, cabin)
+        return self.manager.create_reservation(real_name, flight, cabin, seat, price)
+
+    def invalidate(self, flight: Flight):
+        with self._lock:
+            self._versions[flight] = self._versions.get(flight, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._versions.clear()
+            self._keys.clear()
+
+    # --- MutationListener ---
+
+    def ticket_added(self, airline: AirLine, ticket: TicketReservation):
+        self.invalidate(ticket.flight)
+
+    def ticket_removed(self, ticket: TicketReservation):
+        self.invalidate(ticket.flight)
+
+    def hold_added(self, hold: SeatHold):
+        self.invalidate(hold.flight)
+
+    def hold_released(self, hold: SeatHold):
+        self.invalidate(hold.flight)
+
+    def flight_price_changed(self, airline: AirLine, flight: Flight):
+        self.invalidate(flight)
+
+    def flight_prices_changed(self, changes: List[Tuple[AirLine, Flight]]):
+        with self._lock:
+            for _, flight in changes:
+                self._versions[flight] = self._versions.get(flight, 0) + 1
+
+    def flight_removed(self, airline: AirLine, flight: Flight):
+        with self._lock:
+            self._versions.pop(flight, None)
+            for key in self._keys.pop(flight, ()):
+                del self._cache[key]
+
+    def state_replaced(self, manager):
+        self.clear()
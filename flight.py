@@ -1,19 +1,36 @@
+import sys
 from abc import ABC, abstractmethod, abstractproperty
 from typing import Optional
 
-# Abstract base class representing a general flight
+from seat_inventory import SeatInventory
+
+# Abstract base class representing a general flight.
+# Flights have no __dict__ (subclasses must declare __slots__ too) and share equal strings.
 class Flight(ABC):
-    def __init__(self, flight_number: str, destination: str, distance: float, price: Optional[float]=None):
+    __slots__ = ("_flight_number", "_destination", "_distance", "_price", "_seats")
+
+    def __init__(self, flight_number: str, destination: str, distance: float, price: Optional[float]=None,
+                 seats: Optional[SeatInventory]=None):
         # Initialize flight attributes
-        self._flight_number: str = flight_number      # Unique identifier for the flight
-        self._destination: str = destination          # Destination city or airport
+        self._flight_number: str = sys.intern(flight_number)      # Unique identifier for the flight
+        self._destination: str = sys.intern(destination)          # Destination city or airport
         self._distance: float = distance              # Distance of the flight in kilometers
+        self._seats = seats                           # Seat map, None means no capacity limit
 
         # If no price is provided, calculate it using the subclass's implementation
         if price is None:
             price = self.calculate_price(distance)
         self._price: float = price
 
+    # Flights pickled before __slots__ store a __dict__, and those from before seat maps
+    # existed have no _seats; both are accepted
+    def __setstate__(self, state):
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **state[1]}
+        self._seats = None
+        for key, value in state.items():
+            setattr(self, key, value)
+
     @abstractmethod
     def calculate_price(self, distance):
         # Abstract method to calculate the ticket price based on distance
@@ -26,7 +43,7 @@ class Flight(ABC):
 
     @flight_number.setter
     def flight_number(self, flight_number):
-        self._flight_number = flight_number
+        self._flight_number = sys.intern(flight_number)
 
     # Property for destination
     @property
@@ -35,7 +52,7 @@ class Flight(ABC):
 
     @destination.setter
     def destination(self, destination):
-        self._destination = destination
+        self._destination = sys.intern(destination)
 
     # Property for price
     @property
@@ -51,6 +68,11 @@ class Flight(ABC):
     def distance(self):
         return self._distance
 
+    # Property for the seat map (None if the flight has no capacity limit)
+    @property
+    def seats(self) -> Optional[SeatInventory]:
+        return self._seats
+
     @abstractmethod
     def __str__(self):
         # Abstract method to provide a string representation of the flight
@@ -4,13 +4,19 @@ from flight import Flight
 from international_flight import InternationalFlight
 from domestic_flight import DomesticFlight
 from metaclasses import Singleton
+from seat_inventory import SeatInventory
 
 
+# Returns the 'kind' string that FlightFactory.create_flight needs to rebuild the flight
+def flight_kind(flight: Flight) -> str:
+    return "international" if flight.is_international() else "domestic"
+
 # Factory class for creating flight objects.
 # Uses Singleton pattern to ensure only one instance of the factory exists.
 class FlightFactory(metaclass=Singleton):
 
-    def create_flight(self, kind: str, flight_number: str, destination: str, distance: float, price: Optional[float]=None) -> Flight:
+    def create_flight(self, kind: str, flight_number: str, destination: str, distance: float, price: Optional[float]=None,
+                      seats: Optional[SeatInventory]=None) -> Flight:
         """
         Creates a flight instance based on the 'kind' parameter.
 
@@ -20,6 +26,7 @@ class FlightFactory(metaclass=Singleton):
         - destination: destination of the flight
         - distance: distance in kilometers
         - price: optional, calculated if not provided
+        - seats: optional seat map, no capacity limit if not provided
 
         Returns:
         - An instance of InternationalFlight or DomesticFlight
@@ -29,7 +36,7 @@ class FlightFactory(metaclass=Singleton):
         """
         kind = kind.lower()
         if kind == "international":
-            return InternationalFlight(flight_number, destination, distance, price)
+            return InternationalFlight(flight_number, destination, distance, price, seats)
         if kind == "domestic":
-            return DomesticFlight(flight_number, destination, distance, price)
+            return DomesticFlight(flight_number, destination, distance, price, seats)
         raise ValueError("Unknown flight type")
@@ -0,0 +1,217 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+from itertools import count
+from typing import Dict, List, Optional, Tuple
+
+from airline import AirLine
+from flight import Flight
+from mutation_listener import MutationListener
+
+# Sorted entries are (value, sequence number, flight); the unique sequence number keeps
+# flights themselves out of the comparisons and makes every entry removable by bisect.
+_Entry = Tuple[float, int, Flight]
+
+
+def _remove(entries: List[_Entry], entry: _Entry):
+    idx = bisect_left(entries, entry)
+    if idx < len(entries) and entries[idx][1] == entry[1]:
+        del entries[idx]
+
+
+def _range(entries: List[_Entry], low: Optional[float], high: Optional[float]) -> List[_Entry]:
+    start = 0 if low is None else bisect_left(entries, (low,))
+    end = len(entries) if high is None else bisect_right(entries, (high, float("inf")))
+    return entries[start:end]
+
+
+# Indexes over all flights known to the TicketManager: hash on flight number and on
+# destination (case-insensitive), and price/distance-sorted lists both per destination
+# and overall. It follows the manager as a MutationListener, so adding/removing flights
+# and changing prices keep it up to date without rescanning the schedule.
+class FlightSearchIndex(MutationListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq = count()
+        # flight -> (airline, sequence number, indexed price)
+        self._entries: Dict[Flight, Tuple[AirLine, int, float]] = {}
+        self._by_number: Dict[str, List[Flight]] = {}
+        self._by_destination: Dict[str, List[_Entry]] = {}     # sorted by price
+        self._by_price: List[_Entry] = []
+        self._by_distance: List[_Entry] = []
+        # Manager whose replaced state is not indexed yet
+        self._pending = None
+
+    # --- maintenance ---
+
+    # With sort=False the entries are only appended and the caller sorts the lists afterwards
+    def _add(self, airline: AirLine, flight: Flight, sort: bool = True):
+        if flight in self._entries:
+            return
+        seq = next(self._seq)
+        price = flight.price
+        self._entries[flight] = (airline, seq, price)
+        self._by_number.setdefault(flight.flight_number, []).append(flight)
+        add = insort if sort else list.append
+        add(self._by_destination.setdefault(flight.destination.casefold(), []), (price, seq, flight))
+        add(self._by_price, (price, seq, flight))
+        add(self._by_distance, (flight.distance, seq, flight))
+
+    def _remove(self, flight: Flight):
+        entry = self._entries.pop(flight, None)
+        if entry is None:
+            return
+        _, seq, price = entry
+        flights = self._by_number[flight.flight_number]
+        flights.remove(flight)
+        if not flights:
+            del self._by_number[flight.flight_number]
+        destination = flight.destination.casefold()
+        _remove(self._by_destination[destination], (price, seq, flight))
+        if not self._by_destination[destination]:
+            del self._by_destination[destination]
+        _remove(self._by_price, (price, seq, flight))
+        _remove(self._by_distance, (flight.distance, seq, flight))
+
+    def _rebuild(self, airlines: List[AirLine]):
+        self._entries.clear()
+        self._by_number.clear()
+        self._by_destination.clear()
+        self._by_price.clear()
+        self._by_distance.clear()
+        for airline in airlines:
+            for flight in airline.iter_flights():
+                self._add(airline, flight, sort=False)
+        self._by_price.sort()
+        self._by_distance.sort()
+        for entries in self._by_destination.values():
+            entries.sort()
+
+    def rebuild(self, airlines: List[AirLine]):
+        with self._lock:
+            self._pending = None
+            self._rebuild(airlines)
+
+    # Builds the indexes of a replaced state on first use. Called with the lock held.
+    def _ensure(self):
+        if self._pending is not None:
+            manager, self._pending = self._pending, None
+            self._rebuild(manager.airlines)
+
+    def airline_added(self, airline: AirLine):
+        with self._lock:
+            self._ensure()
+            for flight in airline.iter_flights():
+                self._add(airline, flight)
+
+    def airline_removed(self, airline: AirLine):
+        with self._lock:
+            self._ensure()
+            for flight in airline.iter_flights():
+                self._remove(flight)
+
+    def flight_added(self, airline: AirLine, flight: Flight):
+        with self._lock:
+            self._ensure()
+            self._add(airline, flight)
+
+    # Many new flights: appended unsorted, then every list sorted once
+    def flights_added(self, flights: List[Tuple[AirLine, Flight]]):
+        with self._lock:
+            self._ensure()
+            for airline, flight in flights:
+                self._add(airline, flight, sort=False)
+            self._by_price.sort()
+            self._by_distance.sort()
+            for destination in {flight.destination.casefold() for _, flight in flights}:
+                self._by_destination[destination].sort()
+
+    def flight_removed(self, airline: AirLine, flight: Flight):
+        with self._lock:
+            self._ensure()
+            self._remove(flight)
+
+    def flight_price_changed(self, airline: AirLine, flight: Flight):
+        with self._lock:
+            self._ensure()
+            entry = self._entries.get(flight)
+            if entry is None or entry[2] == flight.price:
+                return
+            _, seq, old_price = entry
+            _remove(self._by_destination[flight.destination.casefold()], (old_price, seq, flight))
+            _remove(self._by_price, (old_price, seq, flight))
+            insort(self._by_destination[flight.destination.casefold()], (flight.price, seq, flight))
+            insort(self._by_price, (flight.price, seq, flight))
+            self._entries[flight] = (airline, seq, flight.price)
+
+    # Many changes at once: the entries are updated first and the sorted lists re-sorted once
+    def flight_prices_changed(self, changes: List[Tuple[AirLine, Flight]]):
+        with self._lock:
+            self._ensure()
+            destinations = set()
+            for airline, flight in changes:
+                entry = self._entries.get(flight)
+                if entry is None or entry[2] == flight.price:
+                    continue
+                self._entries[flight] = (airline, entry[1], flight.price)
+                destinations.add(flight.destination.casefold())
+            if not destinations:
+                return
+            self._by_price = sorted((price, seq, flight) for flight, (_, seq, price) in self._entries.items())
+            for destination in destinations:
+                self._by_destination[destination] = sorted(
+                    (self._entries[flight][2], seq, flight) for _, seq, flight in self._by_destination[destination])
+
+    # The indexes are only rebuilt when next used, so loading a large (or lazily loaded)
+    # state does not have to wait for them
+    def state_replaced(self, manager):
+        with self._lock:
+            self._pending = manager
+            self._rebuild([])
+
+    # --- queries ---
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure()
+            return len(self._entries)
+
+    # Airline of an indexed flight, None if the flight is not indexed
+    def airline_of(self, flight: Flight) -> Optional[AirLine]:
+        if self._pending is not None:
+            with self._lock:
+                self._ensure()
+        entry = self._entries.get(flight)
+        return entry[0] if entry is not None else None
+
+    def by_flight_number(self, flight_number: str) -> List[Flight]:
+        if self._pending is not None:
+            with self._lock:
+                self._ensure()
+        return list(self._by_number.get(flight_number, ()))
+
+    # Flights matching every given filter, cheapest first. With a destination only that
+    # destination's flights are looked at, a price range is cut out of the sorted list by
+    # bisection, so the cost depends on the number of matches, not on the schedule size.
+    def search(self, destination: Optional[str] = None, min_price: Optional[float] = None,
+               max_price: Optional[float] = None, min_distance: Optional[float] = None,
+               max_distance: Optional[float] = None, limit: Optional[int] = None) -> List[Flight]:
+        with self._lock:
+            self._ensure()
+            if destination is not None:
+                entries = _range(self._by_destination.get(destination.casefold(), []), min_price, max_price)
+            elif min_price is not None or max_price is not None or (min_distance is None and max_distance is None):
+                entries = _range(self._by_price, min_price, max_price)
+            else:
+                entries = sorted((self._entries[flight][2], seq, flight) for _, seq, flight in
+                                 _range(self._by_distance, min_distance, max_distance))
+                min_distance = max_distance = None
+        result = []
+        for _, _, flight in entries:
+            if min_distance is not None and flight.distance < min_distance:
+                continue
+            if max_distance is not None and flight.distance > max_distance:
+                continue
+            result.append(flight)
+            if limit is not None and len(result) >= limit:
+                break
+        return result
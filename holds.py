@@ -0,0 +1,90 @@
+import heapq
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flight import Flight
+
+
+# A seat kept for a passenger while the booking is not confirmed yet (e.g. during payment).
+# The seat and the price are fixed when the hold is made; confirming turns it into a ticket.
+class SeatHold:
+    __slots__ = ("hold_id", "name", "flight", "price", "seat", "expires", "user_id")
+
+    def __init__(self, name: str, flight: Flight, price: float, seat: Optional[str], expires: float,
+                 user_id: Optional[int] = None):
+        self.hold_id: str = uuid.uuid4().hex
+        self.name = name
+        self.flight = flight
+        self.price = price
+        self.seat = seat            # Seat label, None if the flight has no seat map
+        self.expires = expires      # time.monotonic() after which the seat is released
+        self.user_id = user_id      # Registered user the ticket will be booked for, or None
+
+    def __str__(self):
+        return f"SeatHold {self.hold_id=} {self.name=} {self.flight=} {self.price=} {self.seat=}"
+
+
+# The open holds by id, with their deadlines in a heap, so the due holds are found in
+# O(log n) each without looking at the others. Confirmed and released holds leave their
+# heap entry behind; it is skipped when it comes up, and the heap is rebuilt when such
+# entries make up most of it.
+class HoldTable:
+    # clock gives the time of the deadlines; SeatHold.expires is a time.monotonic() value
+    # unless a table is made with another clock (e.g. in a simulation)
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._holds: Dict[str, SeatHold] = {}
+        self._deadlines: List[Tuple[float, str]] = []
+        # Notified when a hold is added, so a thread waiting for the next deadline wakes up
+        self.changed = threading.Condition(self._lock)
+
+    def __len__(self) -> int:
+        return len(self._holds)
+
+    def get(self, hold_id: str) -> Optional[SeatHold]:
+        return self._holds.get(hold_id)
+
+    def add(self, hold: SeatHold):
+        with self._lock:
+            self._holds[hold.hold_id] = hold
+            heapq.heappush(self._deadlines, (hold.expires, hold.hold_id))
+            if len(self._deadlines) > 2 * len(self._holds) + 1024:
+                self._deadlines = [(h.expires, h.hold_id) for h in self._holds.values()]
+                heapq.heapify(self._deadlines)
+            if self._deadlines[0][1] == hold.hold_id:
+                self.changed.notify_all()
+
+    # Removes and returns the hold, None if it is not open
+    def pop(self, hold_id: str) -> Optional[SeatHold]:
+        with self._lock:
+            return self._holds.pop(hold_id, None)
+
+    # Removes the heap entries that are due and returns their holds that are still open.
+    # The holds stay in the table: the caller pops each one under its flight's lock.
+    def due(self, now: Optional[float] = None) -> List[SeatHold]:
+        if now is None:
+            now = self.clock()
+        holds = []
+        with self._lock:
+            deadlines = self._deadlines
+            while deadlines and deadlines[0][0] <= now:
+                _, hold_id = heapq.heappop(deadlines)
+                hold = self._holds.get(hold_id)
+                if hold is not None:
+                    holds.append(hold)
+        return holds
+
+    # The earliest deadline in the heap, None if it is empty (may belong to a closed hold)
+    def next_deadline(self) -> Optional[float]:
+        return self._deadlines[0][0] if self._deadlines else None
+
+    # Forgets every hold and returns them; their seats are the caller's business
+    def clear(self) -> List[SeatHold]:
+        with self._lock:
+            holds = list(self._holds.values())
+            self._holds.clear()
+            self._deadlines.clear()
+        return holds
@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional, Tuple
+
+
+# Results of booking requests by idempotency key, so a retried request gets the ticket of
+# the first one instead of a second booking. Entries expire after ttl seconds and at most
+# max_entries are kept, the oldest are dropped first; lookups and inserts are O(1).
+# Expiry times are wall-clock times, as the table is saved with the state.
+class IdempotencyTable:
+    def __init__(self, ttl: float = 24 * 3600.0, max_entries: int = 1000000,
+                 clock: Callable[[], float] = time.time):
+        if max_entries <= 0:
+            raise ValueError("The table must hold at least one key")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (expiry time, ticket id, price) in insertion order, which is expiry order
+        # as long as the ttl does not change; get checks the expiry of every entry anyway
+        self._entries: "OrderedDict[str, Tuple[float, int, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # Returns (ticket id, price) of the request with the key, or None if it is unknown or expired
+    def get(self, key: str) -> Optional[Tuple[int, float]]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self._clock():
+            return None
+        return entry[1], entry[2]
+
+    # Records the ticket booked by the request with the key and returns the expiry time
+    def put(self, key: str, ticket_id: int, price: float, expires: Optional[float] = None) -> float:
+        now = self._clock()
+        if expires is None:
+            expires = now + self.ttl
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, ticket_id, price)
+            self._prune(now)
+        return expires
+
+    def _prune(self, now: float):
+        entries = self._entries
+        while entries:
+            key, entry = next(iter(entries.items()))
+            if entry[0] > now and len(entries) <= self.max_entries:
+                break
+            entries.popitem(last=False)
+
+    # The live entries as [key, expiry time, ticket id, price] lists, for saving
+    def entries(self) -> List[list]:
+        now = self._clock()
+        with self._lock:
+            return [[key, expires, ticket_id, price] for key, (expires, ticket_id, price) in self._entries.items()
+                    if expires > now]
+
+    # Replaces the content with saved entries
+    def restore(self, entries: Iterable[Iterable]):
+        now = self._clock()
+        with self._lock:
+            self._entries.clear()
+            for key, expires, ticket_id, price in sorted(entries, key=lambda entry: entry[1]):
+                self._entries[key] = (expires, ticket_id, price)
+            self._prune(now)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -1,11 +1,15 @@
 from typing import Optional
 from flight import Flight
+from seat_inventory import SeatInventory
 
 
 class InternationalFlight(Flight):
-    def __init__(self, flight_number: str, destination: str, distance: float, price: Optional[float] = None):
+    __slots__ = ()
+
+    def __init__(self, flight_number: str, destination: str, distance: float, price: Optional[float] = None,
+                 seats: Optional[SeatInventory] = None):
         # Initialize an international flight using the base Flight class
-        super().__init__(flight_number, destination, distance, price)
+        super().__init__(flight_number, destination, distance, price, seats)
 
     def calculate_price(self, distance):
         # Calculates ticket price for international flights (higher rate per km)
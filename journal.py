@@ -0,0 +1,268 @@
+import json
+import os
+import struct
+import threading
+import zlib
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from airline import AirLine
+from flight import Flight
+from flight_factory import FlightFactory, flight_kind
+from mutation_listener import MutationListener
+from seat_inventory import SeatInventory
+from state_format import encode_state, read_state, state_file_path, write_state_file
+from storage import StorageBackend
+from ticket_reservation import TicketReservation
+from user import User
+
+# Every record is framed as <payload length><crc32 of payload><payload>, the payload being
+# a compact JSON array. A torn write at the end of the file fails the length or crc check
+# and is cut off during replay.
+_HEADER = struct.Struct("<II")
+
+
+def frame(payload: bytes) -> bytes:
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+# Reads the next framed payload from a file or socket stream; None at the end of the
+# stream or at a torn or damaged frame
+def read_frame(stream) -> Optional[bytes]:
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    length, crc = _HEADER.unpack(header)
+    payload = stream.read(length)
+    if len(payload) < length or zlib.crc32(payload) != crc:
+        return None
+    return payload
+
+
+# Turns every change made through the TicketManager into a record
+# [operation, sequence number, arguments...] that apply_record can repeat on another
+# manager. Subclasses decide where the records go (the journal file, replicas...).
+class MutationRecorder(MutationListener):
+    # Called with the operation and its arguments; adds the sequence number and stores the record
+    def _append(self, *record):
+        raise NotImplementedError
+
+    def airline_added(self, airline: AirLine):
+        self._append("add_airline", airline.name)
+
+    def airline_removed(self, airline: AirLine):
+        self._append("remove_airline", airline.name)
+
+    def flight_added(self, airline: AirLine, flight: Flight):
+        seats = flight.seats
+        self._append("add_flight", airline.name, flight_kind(flight), flight.flight_number,
+                     flight.destination, flight.distance, flight.price, seats.layout if seats else None)
+
+    def flight_removed(self, airline: AirLine, flight: Flight):
+        self._append("remove_flight", airline.name, flight.flight_number)
+
+    def flight_price_changed(self, airline: AirLine, flight: Flight):
+        self._append("set_price", airline.name, flight.flight_number, flight.price)
+
+    def ticket_added(self, airline: AirLine, ticket: TicketReservation):
+        self._append("add_ticket", ticket.ticket_id, ticket.name, airline.name,
+                     ticket.flight.flight_number, ticket.price, ticket.seat, ticket.user_id)
+
+    def ticket_removed(self, ticket: TicketReservation):
+        self._append("remove_ticket", ticket.ticket_id)
+
+    # One record (and one fsync) for all of them
+    def tickets_removed(self, tickets: List[TicketReservation]):
+        self._append("remove_tickets", [ticket.ticket_id for ticket in tickets])
+
+    def idempotency_key_added(self, key: str, ticket: TicketReservation, expires: float):
+        self._append("add_key", key, ticket.ticket_id, ticket.price, expires)
+
+    def user_added(self, user: User):
+        self._append("add_user", user.user_id, user.user_name, user.real_name)
+
+
+def _find_flight(manager, airline_name: str, flight_number: str) -> Tuple[AirLine, Flight]:
+    airline = manager.get_airline(airline_name)
+    if airline is not None:
+        for flight in airline.iter_flights():
+            if flight.flight_number == flight_number:
+                return airline, flight
+    raise ValueError(f"Record refers to unknown flight {airline_name}/{flight_number}")
+
+
+# Bookings and cancellations are repeated through the manager's internal methods, so
+# metrics.py does not count a replayed record as a new one
+def _remove_ticket(manager, ticket_id: int):
+    ticket = manager.get_ticket(ticket_id)
+    if ticket is None:
+        raise ValueError("Unknown ticket")
+    manager._remove_ticket(ticket)
+
+
+# Repeats a recorded change on the manager through its own methods
+def apply_record(manager, op: str, args: list):
+    if op == "add_airline":
+        manager.add_airline(AirLine(args[0]))
+    elif op == "remove_airline":
+        manager.remove_airline_by_airline_object(manager.get_airline(args[0]))
+    elif op == "add_flight":
+        airline_name, kind, number, destination, distance, price, layout = args
+        seats = SeatInventory(layout) if layout is not None else None
+        flight = FlightFactory().create_flight(kind, number, destination, distance, price, seats)
+        manager.add_flight(manager.get_airline(airline_name), flight)
+    elif op == "remove_flight":
+        manager.remove_flight(*_find_flight(manager, *args))
+    elif op == "set_price":
+        airline, flight = _find_flight(manager, args[0], args[1])
+        manager.change_flight_price(airline, flight, args[2])
+    elif op == "add_ticket":
+        # Records written before users existed have no user id
+        ticket_id, name, airline_name, number, price, seat = args[:6]
+        _, flight = _find_flight(manager, airline_name, number)
+        ticket = TicketReservation(name, flight, price, seat, args[6] if len(args) > 6 else None)
+        ticket.ticket_id = ticket_id
+        manager._add_ticket(ticket, None, None)
+    elif op == "remove_ticket":
+        _remove_ticket(manager, args[0])
+    elif op == "remove_tickets":
+        for ticket_id in args[0]:
+            _remove_ticket(manager, ticket_id)
+    elif op == "add_key":
+        key, ticket_id, price, expires = args
+        manager.idempotency.put(key, ticket_id, price, expires)
+    elif op == "add_user":
+        user_id, user_name, real_name = args
+        manager.register_user(user_name, real_name, user_id)
+    else:
+        raise ValueError(f"Unknown record {op!r}")
+
+
+# Write-ahead journal of TicketManager mutations. Every change is appended as a small
+# record, so saving costs O(change) instead of writing the whole state. After
+# COMPACT_EVERY records the state is written to a snapshot and the journal restarts.
+class Journal(MutationRecorder, StorageBackend):
+
+    COMPACT_EVERY: int = 10000      # Number of records after which save_state compacts
+
+    def __init__(self, journal_path: str = "tickets.journal", snapshot_path: str = "tickets.state",
+                 fsync: bool = True):
+        self.journal_path: str = journal_path
+        self.snapshot_path: str = snapshot_path
+        self.fsync: bool = fsync                # fsync every record, so acknowledged changes survive a crash
+        self._seq: int = 0                      # Sequence number of the last written record
+        self._records_since_snapshot: int = 0
+        self._replaying: bool = False
+        self._file = None
+        # Records of bookings on different flights can arrive from several threads at once
+        self._lock = threading.Lock()
+
+    def _append(self, *record):
+        if self._replaying:
+            return
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.journal_path, "ab")
+            self._seq += 1
+            payload = json.dumps([record[0], self._seq, *record[1:]], separators=(",", ":")).encode("utf-8")
+            self._file.write(frame(payload))
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._records_since_snapshot += 1
+
+    # A state loaded from elsewhere (e.g. the default file) becomes the new snapshot
+    def state_replaced(self, manager):
+        if not self._replaying:
+            self.compact(manager)
+
+    def exists(self) -> bool:
+        return state_file_path(self.snapshot_path) is not None or os.path.exists(self.journal_path)
+
+    # Compacts the journal if it grew too long, otherwise returns the fsync of what was written
+    def save(self, manager) -> Optional[Callable[[], None]]:
+        if self._records_since_snapshot >= self.COMPACT_EVERY:
+            self.compact(manager)
+            return None
+        return self._sync
+
+    def _sync(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    def reset(self, manager):
+        self.compact(manager)
+
+    # Writes the full state to the snapshot file and starts a new, empty journal.
+    # The snapshot remembers the last sequence number it contains, so a crash between
+    # writing the snapshot and truncating the journal does not replay records twice.
+    def compact(self, manager):
+        with self._lock:
+            self._compact(manager)
+
+    def _compact(self, manager):
+        write_state_file(self.snapshot_path,
+                         encode_state(manager.airlines, manager.tickets,
+                                      {"journal_seq": self._seq, "idempotency": manager.idempotency.entries()},
+                                      users=manager.users))
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        with open(self.journal_path, "wb") as f:
+            os.fsync(f.fileno())
+        self._records_since_snapshot = 0
+
+    def files(self, manager) -> List[str]:
+        return [self.snapshot_path, self.journal_path]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # --- reading ---
+
+    # Yields the valid records of the journal file and cuts off a torn tail
+    def _read_records(self) -> Iterator[list]:
+        try:
+            f = open(self.journal_path, "r+b")
+        except FileNotFoundError:
+            return
+        with f:
+            valid_end = 0
+            while True:
+                payload = read_frame(f)
+                if payload is None:
+                    break
+                valid_end = f.tell()
+                yield json.loads(payload)
+            if f.seek(0, os.SEEK_END) != valid_end:
+                f.truncate(valid_end)
+
+    # Loads the snapshot, then replays the journal on top of it through the manager's
+    # own methods. Returns False if neither file exists.
+    def load(self, manager) -> bool:
+        self.close()
+        self._replaying = True
+        try:
+            content = read_state(self.snapshot_path)
+            found = content is not None
+            if content is None:
+                content = {"airlines": [], "tickets": [], "users": [], "meta": {}}
+            manager.replace_state(content["airlines"], content["tickets"],
+                                  idempotency=content["meta"].get("idempotency", ()), users=content["users"])
+            snapshot_seq = content["meta"].get("journal_seq", 0)
+            self._seq = snapshot_seq
+            self._records_since_snapshot = 0
+            for record in self._read_records():
+                found = True
+                seq = record[1]
+                if seq <= snapshot_seq:
+                    continue
+                apply_record(manager, record[0], record[2:])
+                self._seq = seq
+                self._records_since_snapshot += 1
+        finally:
+            self._replaying = False
+        return found
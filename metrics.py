@@ -0,0 +1,266 @@
+# Counters, latency histograms and gauges of the booking system.
+#
+#   registry = enable_metrics(manager)     # start counting, with the gauges of manager
+#   registry.values()                      # pull API: {name: value or histogram dict}
+#   registry.prometheus_text()             # Prometheus text exposition format
+#   disable_metrics()
+#
+# Enabling replaces the measured methods of BaseTicketManager and FlightFactory by timed
+# wrappers; disabling puts the original functions back, so switched-off metrics cost
+# nothing at all. The wrappers are on the classes, so every manager (all shards of a
+# ShardedTicketManager too) counts into the one registry; gauges read the managers given
+# to enable_metrics or watch when they are collected.
+import bisect
+import functools
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flight_factory import FlightFactory
+from ticket_manager import BaseTicketManager
+
+
+# A count that only goes up. With read it counts nothing itself and reports what read
+# returns (e.g. the number of observations of a histogram).
+class Counter:
+    def __init__(self, name: str, help: str, read: Optional[Callable[[], int]] = None):
+        self.name = name
+        self.help = help
+        self._value: int = 0
+        self._read = read
+        self._lock = threading.Lock()
+
+    @property
+    def value(self) -> int:
+        return self._read() if self._read is not None else self._value
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self._value += amount
+
+
+# Counts observations into fixed buckets (upper bounds in seconds), like a Prometheus histogram
+class Histogram:
+
+    BUCKETS: Tuple[float, ...] = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                                  0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name: str, help: str, buckets: Optional[Tuple[float, ...]] = None):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets) if buckets is not None else self.BUCKETS
+        # One count per bucket plus the +Inf bucket; not cumulative, see cumulative()
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    # (upper bound, observations up to it) pairs, the last bound is +Inf
+    def cumulative(self) -> List[Tuple[float, int]]:
+        with self._lock:
+            counts = list(self.counts)
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    # Estimated value below which the given fraction of the observations falls (upper bound
+    # of its bucket), None without observations
+    def quantile(self, fraction: float) -> Optional[float]:
+        pairs = self.cumulative()
+        total = pairs[-1][1]
+        if total == 0:
+            return None
+        for bound, count in pairs:
+            if count >= fraction * total:
+                return bound
+        return float("inf")
+
+
+# A value read when the metrics are collected
+class Gauge:
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.read = read
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.counters: Dict[str, Counter] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.gauges: Dict[str, Gauge] = {}
+
+    def counter(self, name: str, help: str, read: Optional[Callable[[], int]] = None) -> Counter:
+        return self.counters.setdefault(name, Counter(name, help, read))
+
+    def histogram(self, name: str, help: str) -> Histogram:
+        return self.histograms.setdefault(name, Histogram(name, help))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> Gauge:
+        gauge = self.gauges[name] = Gauge(name, help, read)
+        return gauge
+
+    # Current values: counters and gauges as numbers, histograms as
+    # {"count", "sum", "p50", "p95", "p99"} (quantiles are bucket upper bounds)
+    def values(self) -> Dict[str, object]:
+        values: Dict[str, object] = {name: counter.value for name, counter in self.counters.items()}
+        for name, histogram in self.histograms.items():
+            values[name] = {"count": histogram.count, "sum": histogram.sum, "p50": histogram.quantile(0.5),
+                            "p95": histogram.quantile(0.95), "p99": histogram.quantile(0.99)}
+        for name, gauge in self.gauges.items():
+            values[name] = gauge.read()
+        return values
+
+    # All metrics in the Prometheus text exposition format (version 0.0.4)
+    def prometheus_text(self) -> str:
+        lines = []
+        for counter in self.counters.values():
+            lines += [f"# HELP {counter.name} {counter.help}", f"# TYPE {counter.name} counter",
+                      f"{counter.name} {counter.value}"]
+        for histogram in self.histograms.values():
+            lines += [f"# HELP {histogram.name} {histogram.help}", f"# TYPE {histogram.name} histogram"]
+            for bound, count in histogram.cumulative():
+                label = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{histogram.name}_bucket{{le="{label}"}} {count}')
+            lines += [f"{histogram.name}_sum {histogram.sum!r}", f"{histogram.name}_count {histogram.count}"]
+        for gauge in self.gauges.values():
+            lines += [f"# HELP {gauge.name} {gauge.help}", f"# TYPE {gauge.name} gauge",
+                      f"{gauge.name} {gauge.read()!r}"]
+        return "\n".join(lines) + "\n"
+
+
+# (class, method name, metric name, total counter name, what it measures). The methods of
+# one metric share the counters <total counter name> and tickets_<metric>_errors_total and
+# the histogram tickets_<metric>_seconds. Bookings and cancellations are measured at the
+# public methods, which do not call one another, so a request counts once; journal replay
+# and replication go through the internal methods and are not counted (see apply_record).
+_TIMED = [
+    (BaseTicketManager, "add_ticket", "booking", "tickets_bookings_total", "bookings"),
+    (BaseTicketManager, "create_reservation", "booking", "tickets_bookings_total", "bookings"),
+    (BaseTicketManager, "confirm_hold", "booking", "tickets_bookings_total", "bookings"),
+    (BaseTicketManager, "remove_ticket_by_id", "cancellation", "tickets_cancellations_total", "cancellations"),
+    (BaseTicketManager, "remove_ticket_by_index", "cancellation", "tickets_cancellations_total", "cancellations"),
+    (BaseTicketManager, "remove_ticket_by_ticket_object", "cancellation", "tickets_cancellations_total",
+     "cancellations"),
+    (BaseTicketManager, "remove_flight_cascade", "removal", "tickets_removals_total",
+     "flight and airline removals"),
+    (BaseTicketManager, "remove_airline_cascade", "removal", "tickets_removals_total",
+     "flight and airline removals"),
+    (BaseTicketManager, "search_flights", "search", "tickets_searches_total", "flight searches"),
+    (BaseTicketManager, "save_state", "save", "tickets_saves_total", "state saves"),
+    (BaseTicketManager, "load_state", "load", "tickets_loads_total", "state loads"),
+    (BaseTicketManager, "hold_seat", "hold", "tickets_holds_total", "seat holds"),
+]
+
+# Methods returning a RemovalReport; the reservations they remove are counted too
+_REMOVALS = ["remove_flight_cascade", "remove_airline_cascade"]
+
+_lock = threading.Lock()
+_originals: Dict[Tuple[type, str], Callable] = {}
+registry: Optional[MetricsRegistry] = None      # The registry of the enabled metrics
+
+
+def _timed(func: Callable, errors: Counter, seconds: Histogram) -> Callable:
+    clock = time.perf_counter
+    observe = seconds.observe
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            observe(clock() - start)
+    return wrapper
+
+
+def _removed_tickets(func: Callable, tickets: Counter) -> Callable:
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        report = func(*args, **kwargs)
+        tickets.inc(len(report.tickets))
+        return report
+    return wrapper
+
+
+def _counted(func: Callable, calls: Counter) -> Callable:
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        calls.inc()
+        return func(*args, **kwargs)
+    return wrapper
+
+
+# Bytes the manager's saved state takes on disk (see StorageBackend.files)
+def _state_bytes(manager) -> int:
+    storage = getattr(manager, "storage", None)
+    if storage is None:
+        # A ShardedTicketManager
+        return sum(_state_bytes(shard) for shard in getattr(manager, "shards", ()))
+    return sum(os.path.getsize(path) for path in storage.files(manager) if os.path.exists(path))
+
+
+# Adds the gauges of a manager (reservations, flights, airlines, open holds, state size);
+# a prefix tells several managers apart
+def watch(manager, prefix: str = "tickets"):
+    if registry is None:
+        raise ValueError("Metrics are not enabled")
+    registry.gauge(f"{prefix}_reservations", "Reservations in memory", manager.count_tickets)
+    registry.gauge(f"{prefix}_flights", "Flights of all airlines", lambda: sum(1 for _ in manager.iter_flights()))
+    registry.gauge(f"{prefix}_airlines", "Airlines", lambda: len(manager.get_all_airlines()))
+    registry.gauge(f"{prefix}_holds_open", "Seat holds not confirmed or expired yet",
+                   lambda: sum(len(shard.holds) for shard in getattr(manager, "shards", [manager])))
+    registry.gauge(f"{prefix}_state_bytes", "Bytes of the saved state on disk", lambda: _state_bytes(manager))
+
+
+# Starts collecting metrics into a new registry and returns it; with a manager its gauges
+# are added too (see watch). Enabling twice keeps the first registry.
+def enable_metrics(manager=None) -> MetricsRegistry:
+    global registry
+    with _lock:
+        if registry is None:
+            new = MetricsRegistry()
+            for cls, method, metric, total, what in _TIMED:
+                original = cls.__dict__[method]
+                _originals[cls, method] = original
+                seconds = new.histogram(f"tickets_{metric}_seconds", f"Duration of {what}")
+                # Every call is one observation of the histogram
+                new.counter(total, f"Number of {what}", lambda seconds=seconds: seconds.count)
+                setattr(cls, method, _timed(original, new.counter(f"tickets_{metric}_errors_total", f"Failed {what}"),
+                                            seconds))
+            removed = new.counter("tickets_removed_with_flight_total",
+                                  "Reservations removed together with their flight or airline")
+            for method in _REMOVALS:
+                setattr(BaseTicketManager, method, _removed_tickets(BaseTicketManager.__dict__[method], removed))
+            original = FlightFactory.__dict__["create_flight"]
+            _originals[FlightFactory, "create_flight"] = original
+            FlightFactory.create_flight = _counted(original, new.counter("tickets_flights_created_total",
+                                                                         "Flights created by the FlightFactory"))
+            registry = new
+    if manager is not None:
+        watch(manager)
+    return registry
+
+
+# Puts the original methods back; the registry keeps the values collected so far
+def disable_metrics():
+    global registry
+    with _lock:
+        for (cls, method), original in _originals.items():
+            setattr(cls, method, original)
+        _originals.clear()
+        registry = None
@@ -0,0 +1,66 @@
+from typing import List, Tuple
+
+from airline import AirLine
+from flight import Flight
+from holds import SeatHold
+from ticket_reservation import TicketReservation
+from user import User
+
+
+# Base class for objects that want to follow every change made through the TicketManager
+# (persistence, indexes, caches...). Every hook is a no-op, subclasses override what they need.
+class MutationListener:
+    def airline_added(self, airline: AirLine):
+        pass
+
+    def airline_removed(self, airline: AirLine):
+        pass
+
+    def flight_added(self, airline: AirLine, flight: Flight):
+        pass
+
+    # Called once for a batch of new flights, with (airline, flight) pairs
+    def flights_added(self, flights: List[Tuple[AirLine, Flight]]):
+        for airline, flight in flights:
+            self.flight_added(airline, flight)
+
+    def flight_removed(self, airline: AirLine, flight: Flight):
+        pass
+
+    def flight_price_changed(self, airline: AirLine, flight: Flight):
+        pass
+
+    # Called once for a batch of price changes, with (airline, flight) pairs
+    def flight_prices_changed(self, changes: List[Tuple[AirLine, Flight]]):
+        for airline, flight in changes:
+            self.flight_price_changed(airline, flight)
+
+    def ticket_added(self, airline: AirLine, ticket: TicketReservation):
+        pass
+
+    def ticket_removed(self, ticket: TicketReservation):
+        pass
+
+    # Called once for the tickets removed with their flight (see remove_flight_cascade)
+    def tickets_removed(self, tickets: List[TicketReservation]):
+        for ticket in tickets:
+            self.ticket_removed(ticket)
+
+    # A seat was held (see TicketManager.hold_seat)
+    def hold_added(self, hold: SeatHold):
+        pass
+
+    # A hold ended without a ticket: released, expired, or its booking was refused
+    def hold_released(self, hold: SeatHold):
+        pass
+
+    def user_added(self, user: User):
+        pass
+
+    # Called after ticket_added when the booking came with an idempotency key (see idempotency.py)
+    def idempotency_key_added(self, key: str, ticket: TicketReservation, expires: float):
+        pass
+
+    # Called after the whole state was replaced (load, restore default...)
+    def state_replaced(self, manager):
+        pass
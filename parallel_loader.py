@@ -0,0 +1,143 @@
+# Loads large schedule files on several processes.
+#
+#   python parallel_loader.py schedule1.csv schedule2.jsonl --workers 8
+#
+# Every file is cut into shards of about --shard-size bytes at line boundaries. A process
+# pool parses and validates the shards (building the flights through FlightFactory, like
+# bulk_io does, so every flight kind the factory knows works here too) and sends back the
+# flights and the errors of their rows. The results are merged in file and line order, so
+# the outcome (which of two duplicate flight numbers wins, the order of the flights)
+# does not depend on the number of workers or on which shard finished first.
+#
+# CSV files must not contain line breaks inside quoted fields, as shards are cut at lines.
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import bulk_io
+from bulk_io import BulkReport, ParsedRow
+from ticket_manager import TicketManager
+
+
+# (file name, file format, CSV header or None, first byte, end byte)
+Shard = Tuple[str, str, Optional[List[str]], int, int]
+
+
+# Cuts a file into shards; the CSV header is read here and passed to every shard
+def plan_shards(file_name: str, file_format: str, shard_size: int) -> Tuple[List[Shard], int]:
+    header = None
+    start = 0
+    with open(file_name, "rb") as stream:
+        if file_format == "csv":
+            first = stream.readline()
+            header = next(csv.reader([first.decode("utf-8")]), [])
+            start = len(first)
+    size = os.path.getsize(file_name)
+    shards = []
+    while start < size or not shards:
+        end = min(start + shard_size, size)
+        shards.append((file_name, file_format, header, start, end))
+        start = end
+    # Line number of the first line of the first shard
+    return shards, 2 if header is not None else 1
+
+
+# Parses the lines starting in [start, end) of a file. Runs in the worker processes.
+# Returns the parsed rows with line numbers counted from the start of the shard, and the
+# number of lines the shard covers.
+def parse_shard(shard: Shard) -> Tuple[List[ParsedRow], int]:
+    file_name, file_format, header, start, end = shard
+    parsed = []
+    lines = 0
+    with open(file_name, "rb") as stream:
+        if start > 0:
+            # A line that started in the previous shard belongs to that shard
+            stream.seek(start - 1)
+            stream.readline()
+        position = stream.tell()
+        while position < end:
+            line = stream.readline()
+            if not line:
+                break
+            position += len(line)
+            number = lines
+            lines += 1
+            try:
+                text = line.decode("utf-8")
+            except UnicodeDecodeError as err:
+                parsed.append((number, None, None, f"Invalid text: {err}"))
+                continue
+            if not text.strip():
+                continue
+            if header is not None:
+                row = dict(zip(header, next(csv.reader([text]))))
+            else:
+                row = text
+            parsed.append(bulk_io.parse_flight_row(number, row))
+    return parsed, lines
+
+
+def _parse_all(shards: Sequence[Shard], workers: int) -> Iterator[Tuple[List[ParsedRow], int]]:
+    if workers <= 1 or len(shards) <= 1:
+        return map(parse_shard, shards)
+    executor = ProcessPoolExecutor(max_workers=workers)
+
+    # map() returns the results in shard order, whatever order the workers finish in
+    def results():
+        with executor:
+            yield from executor.map(parse_shard, shards)
+    return results()
+
+
+# Loads schedule files into the manager and returns the merged report. Errors are reported
+# as (line number, "file: message").
+def load_schedules(manager: TicketManager, file_names: Iterable[str], workers: Optional[int] = None,
+                   shard_size: int = 4 * 2 ** 20, batch_size: int = 1000) -> BulkReport:
+    workers = workers if workers is not None else os.cpu_count() or 1
+    start = time.perf_counter()
+    shards: List[Shard] = []
+    first_lines: List[Optional[int]] = []
+    for file_name in file_names:
+        file_shards, first_line = plan_shards(file_name, bulk_io._format(file_name, None), shard_size)
+        shards.extend(file_shards)
+        first_lines.extend([first_line] + [None] * (len(file_shards) - 1))
+
+    def merged() -> Iterator[ParsedRow]:
+        line = 0
+        for shard, first_line, (parsed, lines) in zip(shards, first_lines, _parse_all(shards, workers)):
+            if first_line is not None:
+                line = first_line
+            for number, airline_name, flight, error in parsed:
+                if error is not None:
+                    error = f"{shard[0]}: {error}"
+                yield line + number, airline_name, flight, error
+            line += lines
+
+    report = bulk_io.add_parsed_flights(manager, merged(), batch_size)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel schedule loader")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--workers", type=int, default=None, help="default: number of CPUs")
+    parser.add_argument("--shard-size", type=int, default=4 * 2 ** 20, help="bytes per shard")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--no-save", action="store_true", help="do not save the state after loading")
+    args = parser.parse_args()
+
+    manager = TicketManager()
+    report = load_schedules(manager, args.files, args.workers, args.shard_size, args.batch_size)
+    if not args.no_save:
+        manager.save_state()
+    print(report)
+    for row, message in report.errors:
+        print(f"  line {row}: {message}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+from typing import Iterable, List, Optional, Sequence
+
+from flight import Flight
+
+# NumPy is optional: without it the same rules run as plain Python loops
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# The columns of a batch of flights that fare rules work on. With NumPy they are arrays and
+# every operation is one vectorised pass, otherwise they are lists.
+class FareColumns:
+    def __init__(self, flights: Sequence[Flight]):
+        self.flights = flights
+        distance = [flight.distance for flight in flights]
+        international = [flight.is_international() for flight in flights]
+        self.destination: List[str] = [flight.destination for flight in flights]
+        if np is not None:
+            self.distance = np.asarray(distance, dtype=np.float64)
+            self.international = np.asarray(international, dtype=bool)
+        else:
+            self.distance = distance
+            self.international = international
+
+    def __len__(self) -> int:
+        return len(self.flights)
+
+    # Mask of the flights matching every given filter, None if there is no filter
+    def select(self, kind: Optional[str] = None, destination: Optional[str] = None,
+               min_distance: Optional[float] = None, max_distance: Optional[float] = None):
+        if kind is None and destination is None and min_distance is None and max_distance is None:
+            return None
+        if kind is not None and kind.lower() not in ("international", "domestic"):
+            raise ValueError("Unknown flight type")
+        wanted = kind is None or kind.lower() == "international"
+        destination = destination.casefold() if destination is not None else None
+        if np is not None:
+            mask = np.ones(len(self), dtype=bool)
+            if kind is not None:
+                mask &= self.international == wanted
+            if destination is not None:
+                mask &= np.fromiter((d.casefold() == destination for d in self.destination), bool, len(self))
+            if min_distance is not None:
+                mask &= self.distance >= min_distance
+            if max_distance is not None:
+                mask &= self.distance <= max_distance
+            return mask
+        return [(kind is None or international == wanted)
+                and (destination is None or dest.casefold() == destination)
+                and (min_distance is None or distance >= min_distance)
+                and (max_distance is None or distance <= max_distance)
+                for international, dest, distance in zip(self.international, self.destination, self.distance)]
+
+    # Distance times the per-km rate of each flight's kind
+    def per_km(self, domestic: float, international: float):
+        if np is not None:
+            return self.distance * np.where(self.international, international, domestic)
+        return [d * (international if i else domestic) for d, i in zip(self.distance, self.international)]
+
+    def zeros(self):
+        if np is not None:
+            return np.zeros(len(self))
+        return [0.0] * len(self)
+
+    def scale(self, prices, factor: float, mask=None):
+        if np is not None:
+            return prices * factor if mask is None else np.where(mask, prices * factor, prices)
+        if mask is None:
+            return [p * factor for p in prices]
+        return [p * factor if m else p for p, m in zip(prices, mask)]
+
+    def add(self, prices, amount: float, mask=None):
+        if np is not None:
+            return prices + amount if mask is None else np.where(mask, prices + amount, prices)
+        if mask is None:
+            return [p + amount for p in prices]
+        return [p + amount if m else p for p, m in zip(prices, mask)]
+
+    def round(self, prices, step: float):
+        if np is not None:
+            return np.round(prices / step) * step
+        return [round(p / step) * step for p in prices]
+
+
+# A fare rule turns the prices computed by the rules before it into new ones.
+# Rules are applied in order; the first one usually sets the base fare.
+class FareRule:
+    def apply(self, prices, columns: FareColumns):
+        raise NotImplementedError
+
+
+# Base fare: distance times a per-km rate. The defaults are the rates of
+# DomesticFlight.calculate_price and InternationalFlight.calculate_price.
+class PerKmRate(FareRule):
+    def __init__(self, domestic: float = 10.0, international: float = 12.0):
+        self.domestic = domestic
+        self.international = international
+
+    def apply(self, prices, columns: FareColumns):
+        return columns.per_km(self.domestic, self.international)
+
+
+# Multiplies the fare of the flights matching the filters (all flights without filters)
+class Multiplier(FareRule):
+    def __init__(self, factor: float, kind: Optional[str] = None, destination: Optional[str] = None,
+                 min_distance: Optional[float] = None, max_distance: Optional[float] = None):
+        self.factor = factor
+        self.filters = dict(kind=kind, destination=destination, min_distance=min_distance, max_distance=max_distance)
+
+    def apply(self, prices, columns: FareColumns):
+        return columns.scale(prices, self.factor, columns.select(**self.filters))
+
+
+# Adds a fixed amount to the fare of the flights matching the filters
+class Surcharge(FareRule):
+    def __init__(self, amount: float, kind: Optional[str] = None, destination: Optional[str] = None,
+                 min_distance: Optional[float] = None, max_distance: Optional[float] = None):
+        self.amount = amount
+        self.filters = dict(kind=kind, destination=destination, min_distance=min_distance, max_distance=max_distance)
+
+    def apply(self, prices, columns: FareColumns):
+        return columns.add(prices, self.amount, columns.select(**self.filters))
+
+
+# Rounds every fare to a multiple of step
+class RoundTo(FareRule):
+    def __init__(self, step: float):
+        if step <= 0:
+            raise ValueError("Rounding step must be positive")
+        self.step = step
+
+    def apply(self, prices, columns: FareColumns):
+        return columns.round(prices, self.step)
+
+
+# Prices many flights at once with a list of fare rules, instead of calling
+# calculate_price flight by flight. Without rules it reproduces calculate_price.
+class PricingEngine:
+    def __init__(self, rules: Optional[Iterable[FareRule]] = None):
+        self.rules: List[FareRule] = list(rules) if rules is not None else [PerKmRate()]
+
+    # Returns the price of every given flight, in the same order
+    def price(self, flights: Sequence[Flight]) -> List[float]:
+        columns = FareColumns(flights)
+        prices = columns.zeros()
+        for rule in self.rules:
+            prices = rule.apply(prices, columns)
+        return prices.tolist() if np is not None else [float(p) for p in prices]
+
+    # Reprices the given flights (all flights of the manager by default) and applies the new
+    # prices in one batch. Returns the number of flights whose price changed.
+    def reprice(self, manager, flights: Optional[Iterable[Flight]] = None) -> int:
+        if flights is None:
+            flights = [flight for _, flight in manager.iter_flights()]
+        else:
+            flights = list(flights)
+        return manager.change_flight_prices(zip(flights, self.price(flights)))
@@ -0,0 +1,282 @@
+# Opt-in profiling of the booking system: a slow-operation log and stack sampling.
+#
+#   enable_profiling(threshold=0.1)     # log every operation that takes 100 ms or more
+#   profiler.report()                   # aggregated profile, any time while it runs
+#   disable_profiling()
+#
+# Enabling wraps the public methods of the managers (and of any extra class given, e.g.
+# the HTTP BookingApi, or module function, e.g. the console handlers) like metrics.py
+# does; disabling puts the originals back, so
+# switched-off profiling costs nothing. Only the outermost wrapped call of a thread is
+# measured. A sampler thread looks at the calls in progress every interval seconds; once
+# a call has run for threshold seconds, its thread's stack is sampled until it ends. A
+# slow call is logged with its hottest sampled lines, and all samples are aggregated per
+# operation into the profile that report() and collapsed() return. Time spent in
+# waiting() (a console waiting for the user) is neither counted nor sampled.
+#
+# The consoles enable it, for the managers and their menu actions, with the
+# TICKETS_SLOW_SECONDS environment variable (see enable_from_environment), the booking
+# server with --profile. The profile can be dumped
+# without a restart by sending SIGUSR1 (see install_dump_signal) or, on the server, with
+# GET /profile. When used together with metrics.py, switch them off in the reverse order
+# of switching them on.
+import collections
+import contextlib
+import functools
+import inspect
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sharding import ShardedTicketManager
+from ticket_manager import BaseTicketManager
+
+DEFAULT_CLASSES = (BaseTicketManager, ShardedTicketManager)
+
+# Totals of one operation
+class OperationStats:
+    __slots__ = ("count", "total", "max", "slow")
+
+    def __init__(self):
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+        self.slow: int = 0
+
+
+class _Call:
+    __slots__ = ("name", "start", "samples", "waited", "waiting")
+
+    def __init__(self, name: str, start: float):
+        self.name = name
+        self.start = start
+        self.samples: Optional[collections.Counter] = None
+        self.waited: float = 0.0                # Seconds spent in waiting()
+        self.waiting: Optional[float] = None    # Start of the current wait
+
+
+class Profiler:
+
+    MAX_DEPTH: int = 64     # Frames kept of a sampled stack, innermost first
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.005, logger: Optional[logging.Logger] = None):
+        self.threshold = threshold
+        self.interval = interval
+        self.log = logger if logger is not None else logging.getLogger("tickets.slow")
+        self.stats: Dict[str, OperationStats] = {}
+        # Samples of all slow calls by (operation,) + stack
+        self.samples: collections.Counter = collections.Counter()
+        self._active: Dict[int, _Call] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+
+    # Returns func wrapped so its calls are measured as the given operation
+    def wrap(self, name: str, func: Callable) -> Callable:
+        clock = time.perf_counter
+        active = self._active
+        get_ident = threading.get_ident
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            ident = get_ident()
+            if ident in active:
+                return func(*args, **kwargs)
+            call = active[ident] = _Call(name, clock())
+            try:
+                return func(*args, **kwargs)
+            finally:
+                del active[ident]
+                self._finish(call, clock() - call.start - call.waited)
+        return wrapper
+
+    def _finish(self, call: _Call, elapsed: float):
+        with self._lock:
+            stats = self.stats.get(call.name)
+            if stats is None:
+                stats = self.stats[call.name] = OperationStats()
+            stats.count += 1
+            stats.total += elapsed
+            stats.max = max(stats.max, elapsed)
+            if elapsed >= self.threshold:
+                stats.slow += 1
+        if elapsed >= self.threshold:
+            hottest = ""
+            if call.samples:
+                lines = collections.Counter()
+                for stack, count in call.samples.items():
+                    lines[stack[-1]] += count
+                hottest = "; hottest: " + ", ".join(f"{line} x{count}" for line, count in lines.most_common(3))
+            self.log.warning("Slow %s: %.3f s%s", call.name, elapsed, hottest)
+
+    def _sample_loop(self):
+        own_file = __file__
+        while not self._stop.wait(self.interval):
+            if not self._active:
+                continue
+            now = time.perf_counter()
+            frames = None
+            for ident, call in list(self._active.items()):
+                if call.waiting is not None or now - call.start - call.waited < self.threshold:
+                    continue
+                if frames is None:
+                    frames = sys._current_frames()
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None and len(stack) < self.MAX_DEPTH:
+                    code = frame.f_code
+                    if code.co_filename != own_file:
+                        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if not stack:
+                    continue
+                stack = tuple(reversed(stack))
+                if call.samples is None:
+                    call.samples = collections.Counter()
+                call.samples[stack] += 1
+                with self._lock:
+                    self.samples[(call.name,) + stack] += 1
+
+    # The aggregated samples in the collapsed format of flame graph tools:
+    # "operation;outer frame;...;inner frame count" per line
+    def collapsed(self) -> str:
+        with self._lock:
+            items = sorted(self.samples.items(), key=lambda item: -item[1])
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in items)
+
+    # Readable profile: per operation the calls, time and slow calls, then the lines that
+    # were sampled most often in slow calls
+    def report(self, top: int = 20) -> str:
+        with self._lock:
+            stats = sorted(self.stats.items(), key=lambda item: -item[1].total)
+            lines = collections.Counter()
+            for stack, count in self.samples.items():
+                lines[(stack[0], stack[-1])] += count
+        out = [f"{'operation':<44} {'calls':>9} {'total s':>10} {'mean ms':>9} {'max ms':>9} {'slow':>6}"]
+        for name, s in stats:
+            out.append(f"{name:<44} {s.count:>9} {s.total:>10.3f} {s.total / s.count * 1000:>9.3f} "
+                       f"{s.max * 1000:>9.1f} {s.slow:>6}")
+        if lines:
+            out += ["", f"Most sampled lines in calls over {self.threshold} s:"]
+            for (name, line), count in lines.most_common(top):
+                out.append(f"{count:>8}  {name}: {line}")
+        return "\n".join(out) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+            self.samples.clear()
+
+
+_lock = threading.Lock()
+# (class or module, name, original function) of everything wrapped
+_originals: List[Tuple[object, str, Callable]] = []
+profiler: Optional[Profiler] = None     # The running profiler
+
+
+# Public methods of the class that are worth timing (generators only build an iterator)
+def _methods(cls: type) -> Iterable[Tuple[str, Callable]]:
+    for name, value in list(vars(cls).items()):
+        if not name.startswith("_") and inspect.isfunction(value) and not inspect.isgeneratorfunction(value):
+            yield name, value
+
+
+# Starts profiling the public methods of the managers and of the extra classes, and the
+# extra functions given as (module, function name) pairs, and returns the profiler. A
+# module function is only measured where it is called through the module's globals.
+# Enabling twice keeps the first profiler (and its settings) and only adds the new ones.
+def enable_profiling(threshold: float = 0.1, interval: float = 0.005, logger: Optional[logging.Logger] = None,
+                     extra_classes: Iterable[type] = (),
+                     extra_functions: Iterable[Tuple[object, str]] = ()) -> Profiler:
+    global profiler
+    with _lock:
+        if profiler is None:
+            profiler = Profiler(threshold, interval, logger)
+            classes = list(DEFAULT_CLASSES)
+        else:
+            classes = []
+        done = {cls for cls, _, _ in _originals}
+        for cls in classes + [cls for cls in extra_classes if cls not in classes]:
+            if cls in done:
+                continue
+            for name, func in _methods(cls):
+                _originals.append((cls, name, func))
+                setattr(cls, name, profiler.wrap(f"{cls.__name__}.{name}", func))
+        done = {(owner, name) for owner, name, _ in _originals}
+        for module, name in extra_functions:
+            if (module, name) in done:
+                continue
+            func = getattr(module, name)
+            _originals.append((module, name, func))
+            setattr(module, name, profiler.wrap(f"{module.__name__}.{name}", func))
+        return profiler
+
+
+# Puts the original methods back and stops the sampler; the profiler keeps what it collected
+def disable_profiling():
+    global profiler
+    with _lock:
+        for owner, name, func in reversed(_originals):
+            setattr(owner, name, func)
+        _originals.clear()
+        if profiler is not None:
+            profiler.stop()
+            profiler = None
+
+
+# Time spent inside does not count to the call in progress, and it is not sampled meanwhile
+@contextlib.contextmanager
+def waiting():
+    running = profiler
+    call = running._active.get(threading.get_ident()) if running is not None else None
+    if call is None:
+        yield
+        return
+    call.waiting = time.perf_counter()
+    try:
+        yield
+    finally:
+        call.waited += time.perf_counter() - call.waiting
+        call.waiting = None
+
+
+# Makes the signal (SIGUSR1 by default) write the current profile to file_name
+def install_dump_signal(file_name: str = "tickets.profile.txt", signum: int = getattr(signal, "SIGUSR1", 0)):
+    if not signum:
+        return
+
+    def dump(_signum, _frame):
+        running = profiler
+        if running is not None:
+            with open(file_name, "w") as f:
+                f.write(running.report())
+                f.write("\n")
+                f.write(running.collapsed())
+    signal.signal(signum, dump)
+
+
+# Enables profiling if the environment variable TICKETS_SLOW_SECONDS is set to a threshold.
+# Slow operations are logged to TICKETS_SLOW_LOG (tickets.slow.log by default), so they
+# do not get in the way of a console, and SIGUSR1 dumps the profile. extra_functions are
+# passed on to enable_profiling.
+def enable_from_environment(extra_functions: Iterable[Tuple[object, str]] = ()) -> Optional[Profiler]:
+    threshold = os.environ.get("TICKETS_SLOW_SECONDS")
+    if not threshold:
+        return None
+    logger = logging.getLogger("tickets.slow")
+    handler = logging.FileHandler(os.environ.get("TICKETS_SLOW_LOG", "tickets.slow.log"))
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    logger.addHandler(handler)
+    logger.propagate = False
+    running = enable_profiling(float(threshold), logger=logger, extra_functions=extra_functions)
+    install_dump_signal()
+    return running
@@ -0,0 +1,270 @@
+# Leader/follower replication of the TicketManager state between processes.
+#
+#   python booking_server.py --port 8080 --replicate 127.0.0.1:9000      (leader)
+#   python booking_server.py --port 8081 --follow 127.0.0.1:9000         (follower)
+#
+# The leader records every change as the journal does (see MutationRecorder) and streams
+# the records to the followers over a socket, framed like the journal file. A follower
+# repeats them on its own manager with apply_record and is read-only for everything else:
+# it serves searches and listings, bookings must go to the leader.
+#
+# A connecting follower sends the id of the leader it followed last and the sequence
+# number of the last record it applied. If that is the same leader and the leader still
+# has the records after it (the last TAIL_RECORDS are kept), it gets only those;
+# otherwise it first gets a state file (see state_format.py) of the leader's current
+# state, then the records that follow. A follower that cannot keep up (more than
+# QUEUE_LIMIT frames waiting) is disconnected; it reconnects and catches up the same way.
+import json
+import socket
+import threading
+import uuid
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from journal import MutationRecorder, apply_record, frame, read_frame
+from state_format import MAGIC, decode_state, encode_state
+
+
+def _encode(record: list) -> bytes:
+    return frame(json.dumps(record, separators=(",", ":")).encode("utf-8"))
+
+
+# A connected follower, written to by its own thread so a slow one never holds up a booking
+class _Peer:
+    def __init__(self, connection: socket.socket, limit: int):
+        self.connection = connection
+        self._frames: Deque[Optional[bytes]] = deque()
+        self._limit = limit
+        self._ready = threading.Condition()
+        self.closed = False
+        threading.Thread(target=self._send_loop, name="replication-send", daemon=True).start()
+
+    # Returns False if the follower is too far behind (or gone) and was disconnected
+    def send(self, data: bytes) -> bool:
+        with self._ready:
+            if self.closed:
+                return False
+            if len(self._frames) >= self._limit:
+                self._close()
+                return False
+            self._frames.append(data)
+            self._ready.notify()
+        return True
+
+    def close(self):
+        with self._ready:
+            self._close()
+
+    def _close(self):
+        if not self.closed:
+            self.closed = True
+            self._frames.clear()
+            self._frames.append(None)
+            self._ready.notify()
+
+    def _send_loop(self):
+        try:
+            while True:
+                with self._ready:
+                    while not self._frames:
+                        self._ready.wait()
+                    data = self._frames.popleft()
+                if data is None:
+                    break
+                self.connection.sendall(data)
+        except OSError:
+            pass
+        finally:
+            self.close()
+            self.connection.close()
+
+
+# Streams the changes of the manager to the followers connecting to (host, port).
+# Port 0 picks a free port, see address.
+class ReplicationLeader(MutationRecorder):
+
+    TAIL_RECORDS: int = 100000      # Records kept for followers that reconnect
+    QUEUE_LIMIT: int = 100000       # Frames waiting for one follower before it is dropped
+    HELLO_TIMEOUT: float = 10.0     # Seconds a connecting follower has to introduce itself
+
+    def __init__(self, manager, host: str = "127.0.0.1", port: int = 0):
+        self.manager = manager
+        self.leader_id: str = uuid.uuid4().hex
+        self._seq: int = 0
+        self._tail: Deque[Tuple[int, bytes]] = deque(maxlen=self.TAIL_RECORDS)
+        self._peers: List[_Peer] = []
+        self._lock = threading.Lock()
+        self._server = socket.create_server((host, port))
+        self.address: Tuple[str, int] = self._server.getsockname()[:2]
+        threading.Thread(target=self._accept_loop, name="replication-accept", daemon=True).start()
+        manager.add_listener(self)
+
+    # Sequence number of the last change
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def follower_count(self) -> int:
+        with self._lock:
+            return len(self._peers)
+
+    def close(self):
+        self.manager.remove_listener(self)
+        self._server.close()
+        with self._lock:
+            for peer in self._peers:
+                peer.close()
+            self._peers.clear()
+
+    def _append(self, *record):
+        with self._lock:
+            self._seq += 1
+            data = _encode([record[0], self._seq, *record[1:]])
+            self._tail.append((self._seq, data))
+            self._broadcast(data)
+
+    def _broadcast(self, data: bytes):
+        self._peers = [peer for peer in self._peers if peer.send(data)]
+
+    # A replaced state (loaded file, default state...) reaches the followers as a state file
+    def state_replaced(self, manager):
+        with self._lock:
+            self._seq += 1
+            self._tail.clear()
+            self._broadcast(self._state_file())
+
+    # Called while the manager is held exclusively
+    def _state_file(self) -> bytes:
+        return frame(encode_state(self.manager.airlines, self.manager.tickets,
+                                  {"leader": self.leader_id, "seq": self._seq,
+                                   "idempotency": self.manager.idempotency.entries()},
+                                  users=self.manager.users))
+
+    def _accept_loop(self):
+        while True:
+            try:
+                connection, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._welcome, args=(connection,), name="replication-welcome",
+                             daemon=True).start()
+
+    def _welcome(self, connection: socket.socket):
+        try:
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection.settimeout(self.HELLO_TIMEOUT)
+            with connection.makefile("rb") as stream:
+                payload = read_frame(stream)
+            connection.settimeout(None)
+            hello = json.loads(payload) if payload is not None else None
+            if not isinstance(hello, dict):
+                raise ValueError("Invalid hello")
+        except (OSError, ValueError):
+            connection.close()
+            return
+        # No change may slip in between choosing what the follower gets and registering it
+        self.manager.run_exclusive(lambda: self._register(connection, hello.get("leader"), hello.get("seq", 0)))
+
+    def _register(self, connection: socket.socket, leader_id: Optional[str], seq: int):
+        with self._lock:
+            peer = _Peer(connection, self.QUEUE_LIMIT)
+            if leader_id == self.leader_id and (seq == self._seq or (self._tail and self._tail[0][0] <= seq + 1)):
+                peer.send(_encode(["resume", self.leader_id, seq]))
+                for record_seq, data in self._tail:
+                    if record_seq > seq:
+                        peer.send(data)
+            else:
+                peer.send(self._state_file())
+            self._peers.append(peer)
+
+
+# Keeps the manager a read-only copy of the leader at address. Reconnects after
+# RETRY_SECONDS when the connection is lost, continuing from the last applied record.
+class ReplicationFollower:
+
+    RETRY_SECONDS: float = 1.0
+
+    def __init__(self, manager, address: Tuple[str, int]):
+        self.manager = manager
+        self.address = address
+        self.leader_id: Optional[str] = None
+        self.seq: int = 0                               # Sequence number of the last applied change
+        self.error: Optional[str] = None                # Why the last connection ended
+        self._applied = threading.Condition()
+        self._stop = threading.Event()
+        self._connection: Optional[socket.socket] = None
+        self._thread = threading.Thread(target=self._run, name="replication-follow", daemon=True)
+        manager.writer_thread = self._thread
+        self._thread.start()
+
+    # Waits until the change with the given sequence number (see ReplicationLeader.seq) is
+    # applied, and at least the leader's state was received; False on timeout
+    def wait_for(self, seq: int, timeout: Optional[float] = None) -> bool:
+        with self._applied:
+            return self._applied.wait_for(lambda: self.leader_id is not None and self.seq >= seq, timeout)
+
+    # Stops following; the manager becomes writable again (e.g. to promote it to leader)
+    def close(self):
+        self._stop.set()
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._thread.join()
+        self.manager.writer_thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._follow()
+            except OSError as err:
+                self.error = str(err)
+            except ValueError as err:
+                # Out of step with the leader: start over from its full state
+                self.error = str(err)
+                self.leader_id = None
+            self._stop.wait(self.RETRY_SECONDS)
+
+    def _follow(self):
+        connection = socket.create_connection(self.address)
+        self._connection = connection
+        try:
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            hello = json.dumps({"leader": self.leader_id, "seq": self.seq}).encode("utf-8")
+            connection.sendall(frame(hello))
+            with connection.makefile("rb") as stream:
+                while not self._stop.is_set():
+                    payload = read_frame(stream)
+                    if payload is None:
+                        raise ConnectionError("Connection to the leader lost")
+                    self._receive(payload)
+        finally:
+            self._connection = None
+            connection.close()
+
+    def _receive(self, payload: bytes):
+        if payload.startswith(MAGIC):
+            content = decode_state(payload)
+            self.manager.replace_state(content["airlines"], content["tickets"],
+                                       idempotency=content["meta"].get("idempotency", ()), users=content["users"])
+            self._applied_up_to(content["meta"]["leader"], content["meta"]["seq"])
+            return
+        record = json.loads(payload)
+        if record[0] == "resume":
+            self.leader_id = record[1]
+            return
+        seq = record[1]
+        if seq <= self.seq:
+            return
+        if seq != self.seq + 1:
+            raise ValueError(f"Missing records {self.seq + 1}..{seq - 1}")
+        apply_record(self.manager, record[0], record[2:])
+        self._applied_up_to(self.leader_id, seq)
+
+    def _applied_up_to(self, leader_id: str, seq: int):
+        with self._applied:
+            self.leader_id = leader_id
+            self.seq = seq
+            self._applied.notify_all()
@@ -0,0 +1,112 @@
+import threading
+from itertools import islice
+from typing import Dict, Iterator, List, Optional
+
+from flight import Flight
+from ticket_reservation import TicketReservation
+
+
+# Keeps ticket reservations keyed by a stable ticket id, with secondary
+# indexes by flight, by passenger name and by registered user. Every lookup and removal is a
+# dictionary operation, so the cost does not grow with the number of tickets.
+# Writes are serialised by a lock that is only held for the few dictionary updates;
+# readers copy the dictionaries in a single call and do not need it.
+class ReservationStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_id: int = 1
+        # Primary storage; dicts keep insertion order, so iteration is in booking order
+        self._tickets: Dict[int, TicketReservation] = {}
+        # Secondary indexes: flight / passenger name / user id -> {ticket id: ticket}
+        self._by_flight: Dict[Flight, Dict[int, TicketReservation]] = {}
+        self._by_name: Dict[str, Dict[int, TicketReservation]] = {}
+        self._by_user: Dict[int, Dict[int, TicketReservation]] = {}
+
+    def __len__(self) -> int:
+        return len(self._tickets)
+
+    # Iterates over a snapshot of the references, so bookings made meanwhile cannot break it
+    def __iter__(self) -> Iterator[TicketReservation]:
+        return iter(list(self._tickets.values()))
+
+    def __contains__(self, ticket: TicketReservation) -> bool:
+        ticket_id = ticket.ticket_id
+        return ticket_id is not None and self._tickets.get(ticket_id) is ticket
+
+    # Stores a ticket and returns its id. Tickets that already carry an id
+    # (e.g. loaded from a file) keep it, new ones get the next free id.
+    def add(self, ticket: TicketReservation) -> int:
+        with self._lock:
+            ticket_id = ticket.ticket_id
+            if ticket_id is None:
+                ticket_id = self._next_id
+                ticket.ticket_id = ticket_id
+            elif ticket_id in self._tickets:
+                raise ValueError(f"Duplicate ticket id {ticket_id}")
+            self._next_id = max(self._next_id, ticket_id + 1)
+            self._tickets[ticket_id] = ticket
+            self._by_flight.setdefault(ticket.flight, {})[ticket_id] = ticket
+            self._by_name.setdefault(ticket.name, {})[ticket_id] = ticket
+            if ticket.user_id is not None:
+                self._by_user.setdefault(ticket.user_id, {})[ticket_id] = ticket
+        return ticket_id
+
+    # Returns the ticket with the given id, or None if there is no such ticket
+    def get(self, ticket_id: int) -> Optional[TicketReservation]:
+        return self._tickets.get(ticket_id)
+
+    # Removes a ticket by id and returns it
+    def remove_by_id(self, ticket_id: int) -> TicketReservation:
+        with self._lock:
+            ticket = self._tickets.pop(ticket_id, None)
+            if ticket is None:
+                raise ValueError("Unknown ticket")
+            self._unindex(self._by_flight, ticket.flight, ticket_id)
+            self._unindex(self._by_name, ticket.name, ticket_id)
+            self._unindex(self._by_user, ticket.user_id, ticket_id)
+        return ticket
+
+    # Removes a ticket by reference
+    def remove(self, ticket: TicketReservation):
+        if ticket not in self:
+            raise ValueError("Unknown ticket")
+        self.remove_by_id(ticket.ticket_id)
+
+    # Returns the ticket at the given position in booking order
+    def at(self, idx: int) -> TicketReservation:
+        if idx < 0 or idx >= len(self._tickets):
+            raise ValueError("Wrong index")
+        return next(islice(self._tickets.values(), idx, None))
+
+    # Returns up to limit tickets in booking order, starting at the given position
+    def page(self, offset: int, limit: int) -> List[TicketReservation]:
+        with self._lock:
+            return list(islice(self._tickets.values(), offset, offset + limit))
+
+    # Returns all tickets booked on a flight
+    def by_flight(self, flight: Flight) -> List[TicketReservation]:
+        return list(self._by_flight.get(flight, {}).values())
+
+    # Returns all tickets booked for a passenger name
+    def by_name(self, name: str) -> List[TicketReservation]:
+        return list(self._by_name.get(name, {}).values())
+
+    # Returns all tickets booked by a registered user, in booking order
+    def by_user(self, user_id: int) -> List[TicketReservation]:
+        return list(self._by_user.get(user_id, {}).values())
+
+    def clear(self):
+        with self._lock:
+            self._next_id = 1
+            self._tickets.clear()
+            self._by_flight.clear()
+            self._by_name.clear()
+            self._by_user.clear()
+
+    @staticmethod
+    def _unindex(index: dict, key, ticket_id: int):
+        bucket = index.get(key)
+        if bucket is not None:
+            bucket.pop(ticket_id, None)
+            if not bucket:
+                del index[key]
@@ -0,0 +1,119 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# Seat map of a flight. Cabins are consecutive blocks of rows, e.g.
+# [("business", 4, "ACDF"), ("economy", 30, "ABCDEF")] gives seats 1A..4F and 5A..34F.
+# Occupancy is one byte per seat, free seats per cabin are counted and kept on a stack,
+# so checking availability and holding or releasing a seat are constant-time.
+class SeatInventory:
+    def __init__(self, cabins: Sequence[Tuple[str, int, str]]):
+        # (name, first row, number of rows, seat letters, index of the first seat)
+        self._cabins: List[Tuple[str, int, int, str, int]] = []
+        first_row = 1
+        offset = 0
+        for name, rows, letters in cabins:
+            if rows <= 0 or not letters:
+                raise ValueError("Cabin must have at least one seat")
+            self._cabins.append((name, first_row, rows, letters, offset))
+            first_row += rows
+            offset += rows * len(letters)
+        self._taken: bytearray = bytearray(offset)
+        self._free: Dict[str, int] = {}
+        self._total_free: int = offset
+        # Candidate free seats per cabin, front seats on top. Seats held by label stay on the
+        # stack and are skipped when popped; _stacked prevents pushing a seat twice.
+        self._stacks: Dict[str, List[int]] = {}
+        self._stacked: bytearray = bytearray(b"\x01" * offset)
+        for name, _, rows, letters, start in self._cabins:
+            count = rows * len(letters)
+            self._free[name] = self._free.get(name, 0) + count
+            self._stacks.setdefault(name, []).extend(range(start + count - 1, start - 1, -1))
+
+    # Inventory with a single economy cabin of the given number of rows
+    @classmethod
+    def single_cabin(cls, rows: int, letters: str = "ABCDEF") -> "SeatInventory":
+        return cls([("economy", rows, letters)])
+
+    # The cabin list the inventory was built from
+    @property
+    def layout(self) -> List[Tuple[str, int, str]]:
+        return [(name, rows, letters) for name, _, rows, letters, _ in self._cabins]
+
+    @property
+    def capacity(self) -> int:
+        return len(self._taken)
+
+    # Number of free seats, in one cabin or in the whole flight
+    def available(self, cabin: Optional[str] = None) -> int:
+        if cabin is None:
+            return self._total_free
+        return self._free.get(cabin, 0)
+
+    def has_seat(self, cabin: Optional[str] = None) -> bool:
+        return self.available(cabin) > 0
+
+    def _index(self, seat: str) -> Tuple[int, str]:
+        try:
+            row = int(seat[:-1])
+        except ValueError:
+            raise ValueError(f"Invalid seat {seat!r}")
+        letter = seat[-1:]
+        for name, first_row, rows, letters, start in self._cabins:
+            if first_row <= row < first_row + rows and letter in letters:
+                return start + (row - first_row) * len(letters) + letters.index(letter), name
+        raise ValueError(f"Invalid seat {seat!r}")
+
+    def _label(self, idx: int) -> str:
+        for _, first_row, rows, letters, start in reversed(self._cabins):
+            if idx >= start:
+                row, col = divmod(idx - start, len(letters))
+                return f"{first_row + row}{letters[col]}"
+        raise ValueError("Invalid seat")
+
+    def is_taken(self, seat: str) -> bool:
+        return bool(self._taken[self._index(seat)[0]])
+
+    # Labels of all held seats, front to back
+    def taken_seats(self) -> List[str]:
+        seats = []
+        idx = self._taken.find(1)
+        while idx != -1:
+            seats.append(self._label(idx))
+            idx = self._taken.find(1, idx + 1)
+        return seats
+
+    # Holds the given seat, or the frontmost free seat (of a cabin, if given) and returns its label
+    def hold(self, seat: Optional[str] = None, cabin: Optional[str] = None) -> str:
+        if seat is not None:
+            idx, seat_cabin = self._index(seat)
+            if self._taken[idx]:
+                raise ValueError(f"Seat {seat} is already taken")
+        else:
+            cabins = [cabin] if cabin is not None else list(self._stacks)
+            for seat_cabin in cabins:
+                if self._free.get(seat_cabin, 0) > 0:
+                    break
+            else:
+                raise ValueError("No seats available")
+            stack = self._stacks[seat_cabin]
+            idx = stack.pop()
+            self._stacked[idx] = 0
+            while self._taken[idx]:
+                idx = stack.pop()
+                self._stacked[idx] = 0
+        self._taken[idx] = 1
+        self._free[seat_cabin] -= 1
+        self._total_free -= 1
+        return self._label(idx)
+
+    # Frees a previously held seat
+    def release(self, seat: str):
+        idx, cabin = self._index(seat)
+        if not self._taken[idx]:
+            raise ValueError(f"Seat {seat} is not taken")
+        self._taken[idx] = 0
+        self._free[cabin] += 1
+        self._total_free += 1
+        if not self._stacked[idx]:
+            self._stacked[idx] = 1
+            self._stacks[cabin].append(idx)
@@ -0,0 +1,405 @@
+# Sharded mode of the TicketManager: airlines, with their flights and reservations, are
+# spread over independent BaseTicketManager shards by a hash of the airline name. Every
+# shard has its own locks, indexes, listeners and state file, so changes to airlines of
+# different shards never wait for each other.
+#
+#   manager = ShardedTicketManager(4)          # in place of TicketManager()
+#   python booking_server.py --shards 4 [--processes]
+#
+# ShardedTicketManager routes the TicketManager API to the shards in this process. The
+# booking server can also run every shard in a worker process of its own (see
+# ShardedBookingApi in booking_server.py), so bookings use all cores.
+#
+# Every shard keeps (and saves) the whole user registry, so bookings can check and index
+# their user without asking another shard; shard 0 assigns the ids of new users.
+#
+# Shard i of n numbers new tickets i + 1, i + 1 + n, i + 1 + 2n... above the largest id
+# loaded, so ticket ids stay unique and a ticket's shard follows from its id. Tickets
+# loaded from a state file keep their ids and are found by asking the other shards.
+import heapq
+import itertools
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from airline import AirLine
+from flight import Flight
+from holds import SeatHold
+from mutation_listener import MutationListener
+from state_format import read_state
+from storage import FileStorage
+from ticket_manager import BaseTicketManager, RemovalReport, TicketManager
+from ticket_reservation import TicketReservation
+from user import User
+from views import ListView
+
+FILE_NAME: str = "tickets.shard{}.state"     # State file of every shard
+
+
+# Index of the shard that holds the airline; stable between runs, unlike hash()
+def shard_index(airline_name: str, shards: int) -> int:
+    return zlib.crc32(airline_name.encode("utf-8")) % shards
+
+
+# Index of the shard that numbered the ticket (see the top of the file)
+def ticket_shard_index(ticket_id: int, shards: int) -> int:
+    return (ticket_id - 1) % shards
+
+
+# Splits a state into the part of every shard. Tickets go with their flight's airline;
+# tickets of flights no airline has go to the shard of their id. Tickets without an id
+# (from old state files) are numbered first, as the shards' own stores would give them
+# overlapping ids.
+def split_state(airlines: Iterable[AirLine], tickets: Iterable[TicketReservation],
+                shards: int) -> List[Tuple[List[AirLine], List[TicketReservation]]]:
+    tickets = list(tickets)
+    next_id = max((ticket.ticket_id for ticket in tickets if ticket.ticket_id is not None), default=0) + 1
+    for ticket in tickets:
+        if ticket.ticket_id is None:
+            ticket.ticket_id = next_id
+            next_id += 1
+    parts = [([], []) for _ in range(shards)]
+    flight_shards: Dict[Flight, int] = {}
+    for airline in airlines:
+        index = shard_index(airline.name, shards)
+        parts[index][0].append(airline)
+        for flight in airline.iter_flights():
+            flight_shards[flight] = index
+    for ticket in tickets:
+        index = flight_shards.get(ticket.flight)
+        if index is None:
+            index = ticket_shard_index(ticket.ticket_id, shards)
+        parts[index][1].append(ticket)
+    return parts
+
+
+# Splits saved idempotency keys (see IdempotencyTable.entries) like split_state split the
+# tickets: every key goes to the shard that holds its ticket, keys of tickets cancelled
+# since to the shard of the ticket id
+def split_keys(entries: Iterable[list], parts: List[Tuple[List[AirLine], List[TicketReservation]]]) -> List[List[list]]:
+    ticket_shards = {ticket.ticket_id: index for index, (_, tickets) in enumerate(parts) for ticket in tickets}
+    keys: List[List[list]] = [[] for _ in parts]
+    for entry in entries:
+        index = ticket_shards.get(entry[2])
+        keys[index if index is not None else ticket_shard_index(entry[2], len(parts))].append(entry)
+    return keys
+
+
+def largest_ticket_id(shard: BaseTicketManager) -> int:
+    return max((ticket.ticket_id for ticket in shard.iter_tickets()), default=0)
+
+
+# Makes the shard number its new tickets after the largest id of all shards
+def number_tickets(shard: BaseTicketManager, index: int, shards: int, largest_id: int):
+    first = largest_id + 1 + (index - largest_id) % shards
+    shard.ticket_ids = itertools.count(first, shards)
+
+
+# Creates shard index of shards, kept in file_name (with the index in place of {})
+def make_shard(index: int, shards: int, file_name: str = FILE_NAME) -> BaseTicketManager:
+    shard = BaseTicketManager()
+    shard.use_storage(FileStorage(file_name.format(index)))
+    return shard
+
+
+# Loads a state file that was not written by a shard and keeps the shard's part of it
+def load_shard_part(shard: BaseTicketManager, index: int, shards: int, source: str) -> bool:
+    content = read_state(source)
+    if content is None:
+        return False
+    parts = split_state(content["airlines"], content["tickets"], shards)
+    keys = split_keys(content["meta"].get("idempotency", ()), parts)
+    airlines, tickets = parts[index]
+    shard.replace_state(airlines, tickets, idempotency=keys[index], users=content["users"])
+    return True
+
+
+# The TicketManager API over shards in this process. Results are the shards' own objects,
+# so they can be passed back in like those of the TicketManager. Operations on several
+# airlines (change_flight_prices, add_flights) are atomic per shard, not as a whole.
+class ShardedTicketManager:
+
+    FILE_NAME: str = FILE_NAME
+    DEFAULT_NAME: str = TicketManager.DEFAULT_NAME
+
+    def __init__(self, shards: Optional[int] = None, file_name: Optional[str] = None):
+        count = shards if shards is not None else os.cpu_count() or 1
+        if count <= 0:
+            raise ValueError("There must be at least one shard")
+        if file_name is not None:
+            self.FILE_NAME = file_name
+        self.shards: List[BaseTicketManager] = [make_shard(index, count, self.FILE_NAME) for index in range(count)]
+        # Shards that saved their state before start from it, otherwise from the default state
+        if not any(os.path.exists(self.FILE_NAME.format(index)) for index in range(count)):
+            self.load_default()
+        else:
+            self._number_tickets()
+
+    def _number_tickets(self):
+        largest = max(largest_ticket_id(shard) for shard in self.shards)
+        for index, shard in enumerate(self.shards):
+            number_tickets(shard, index, len(self.shards), largest)
+
+    # --- routing ---
+
+    def shard_for(self, airline_name: str) -> BaseTicketManager:
+        return self.shards[shard_index(airline_name, len(self.shards))]
+
+    def _flight_shard(self, flight: Flight) -> Optional[BaseTicketManager]:
+        for shard in self.shards:
+            if shard.search.airline_of(flight) is not None:
+                return shard
+        return None
+
+    def _ticket_shard(self, ticket_id: int) -> Optional[BaseTicketManager]:
+        home = self.shards[ticket_shard_index(ticket_id, len(self.shards))]
+        if home.get_ticket(ticket_id) is not None:
+            return home
+        for shard in self.shards:
+            if shard is not home and shard.get_ticket(ticket_id) is not None:
+                return shard
+        return None
+
+    # --- listeners ---
+
+    # The listener is added to every shard; it sees the changes of each shard on its own
+    def add_listener(self, listener: MutationListener):
+        for shard in self.shards:
+            shard.add_listener(listener)
+
+    def remove_listener(self, listener: MutationListener):
+        for shard in self.shards:
+            shard.remove_listener(listener)
+
+    # --- reading ---
+
+    def airline_of(self, flight: Flight) -> Optional[AirLine]:
+        shard = self._flight_shard(flight)
+        return shard.airline_of(flight) if shard is not None else None
+
+    def get_all_airlines(self):
+        return {airline.name: airline for shard in self.shards for airline in shard.airlines_view()}
+
+    def get_all_flights(self) -> Dict[str, List[Flight]]:
+        return {name: flights for shard in self.shards for name, flights in shard.get_all_flights().items()}
+
+    def get_airline(self, name: str) -> Optional[AirLine]:
+        return self.shard_for(name).get_airline(name)
+
+    # Read-only view of the airlines of all shards, taken when called
+    def airlines_view(self) -> ListView:
+        return ListView([airline for shard in self.shards for airline in shard.airlines_view()])
+
+    def iter_flights(self) -> Iterator[Tuple[AirLine, Flight]]:
+        for shard in self.shards:
+            yield from shard.iter_flights()
+
+    # Iterates over the tickets of all shards in ticket id (booking) order
+    def iter_tickets(self) -> Iterator[TicketReservation]:
+        return heapq.merge(*(shard.iter_tickets() for shard in self.shards), key=lambda ticket: ticket.ticket_id)
+
+    def count_tickets(self) -> int:
+        return sum(shard.count_tickets() for shard in self.shards)
+
+    def page_tickets(self, offset: int = 0, limit: int = 50) -> List[TicketReservation]:
+        if offset < 0 or limit < 0:
+            raise ValueError("Offset and limit must not be negative")
+        pages = [shard.page_tickets(0, offset + limit) for shard in self.shards]
+        merged = heapq.merge(*pages, key=lambda ticket: ticket.ticket_id)
+        return list(itertools.islice(merged, offset, offset + limit))
+
+    def get_flight(self, airline_name: str, flight_number: str) -> Optional[Flight]:
+        return self.shard_for(airline_name).get_flight(airline_name, flight_number)
+
+    def search_flights(self, destination: Optional[str] = None, min_price: Optional[float] = None,
+                       max_price: Optional[float] = None, min_distance: Optional[float] = None,
+                       max_distance: Optional[float] = None, limit: Optional[int] = None) -> List[Flight]:
+        results = [shard.search_flights(destination, min_price, max_price, min_distance, max_distance, limit)
+                   for shard in self.shards]
+        merged = heapq.merge(*results, key=lambda flight: flight.price)
+        return list(itertools.islice(merged, limit))
+
+    def get_all_tickets(self) -> List[TicketReservation]:
+        return list(self.iter_tickets())
+
+    def get_ticket(self, ticket_id: int) -> Optional[TicketReservation]:
+        shard = self._ticket_shard(ticket_id)
+        return shard.get_ticket(ticket_id) if shard is not None else None
+
+    # A retried request books on the same flight, so its key is in the flight's shard
+    def get_ticket_by_key(self, key: str) -> Optional[TicketReservation]:
+        for shard in self.shards:
+            ticket = shard.get_ticket_by_key(key)
+            if ticket is not None:
+                return ticket
+        return None
+
+    def get_tickets_for_flight(self, flight: Flight) -> List[TicketReservation]:
+        shard = self._flight_shard(flight)
+        return shard.get_tickets_for_flight(flight) if shard is not None else []
+
+    def get_tickets_for_passenger(self, name: str) -> List[TicketReservation]:
+        tickets = [ticket for shard in self.shards for ticket in shard.get_tickets_for_passenger(name)]
+        tickets.sort(key=lambda ticket: ticket.ticket_id)
+        return tickets
+
+    def get_tickets_for_airline(self, airline: AirLine) -> List[TicketReservation]:
+        return self.shard_for(airline.name).get_tickets_for_airline(airline)
+
+    def get_tickets_for_user(self, user_id: int) -> List[TicketReservation]:
+        return list(heapq.merge(*(shard.get_tickets_for_user(user_id) for shard in self.shards),
+                                key=lambda ticket: ticket.ticket_id))
+
+    def get_user(self, user_id: int) -> Optional[User]:
+        return self.shards[0].get_user(user_id)
+
+    def find_user(self, user_name: str) -> Optional[User]:
+        return self.shards[0].find_user(user_name)
+
+    def find_users_by_name(self, real_name: str) -> List[User]:
+        return self.shards[0].find_users_by_name(real_name)
+
+    # --- changes ---
+
+    # Shard 0 assigns the id, the other shards register the user under it
+    def register_user(self, user_name: str, real_name: str, user_id: Optional[int] = None) -> User:
+        user = self.shards[0].register_user(user_name, real_name, user_id)
+        for shard in self.shards[1:]:
+            shard.register_user(user_name, real_name, user.user_id)
+        return user
+
+    def add_ticket(self, ticket: TicketReservation, cabin: Optional[str] = None,
+                   idempotency_key: Optional[str] = None) -> bool:
+        if ticket is None:
+            return False
+        shard = self._flight_shard(ticket.flight)
+        if shard is None:
+            raise ValueError("Unknown flight")
+        return shard.add_ticket(ticket, cabin, idempotency_key)
+
+    def remove_ticket_by_index(self, idx: int) -> float:
+        page = self.page_tickets(idx, 1) if idx >= 0 else []
+        if not page:
+            raise ValueError("Wrong index")
+        return self.remove_ticket_by_ticket_object(page[0])
+
+    def remove_ticket_by_id(self, ticket_id: int) -> float:
+        shard = self._ticket_shard(ticket_id)
+        if shard is None:
+            raise ValueError("Unknown ticket")
+        return shard.remove_ticket_by_id(ticket_id)
+
+    def remove_ticket_by_ticket_object(self, ticket: TicketReservation) -> float:
+        shard = self._ticket_shard(ticket.ticket_id) if ticket.ticket_id is not None else None
+        if shard is None:
+            raise ValueError("Unknown ticket")
+        return shard.remove_ticket_by_ticket_object(ticket)
+
+    def add_airline(self, airline: AirLine):
+        self.shard_for(airline.name).add_airline(airline)
+
+    def remove_airline_by_airline_object(self, airline):
+        self.shard_for(airline.name).remove_airline_by_airline_object(airline)
+
+    def add_flight(self, airline: AirLine, flight: Flight):
+        self.shard_for(airline.name).add_flight(airline, flight)
+
+    def add_flights(self, flights: Iterable[Tuple[AirLine, Flight]]):
+        batches: Dict[int, List[Tuple[AirLine, Flight]]] = {}
+        for airline, flight in flights:
+            batches.setdefault(shard_index(airline.name, len(self.shards)), []).append((airline, flight))
+        for index, batch in batches.items():
+            self.shards[index].add_flights(batch)
+
+    def remove_flight(self, airline: AirLine, flight: Flight):
+        self.shard_for(airline.name).remove_flight(airline, flight)
+
+    # The airline's shard holds the flights and their reservations (see split_state)
+    def remove_flight_cascade(self, airline: AirLine, flight: Flight) -> RemovalReport:
+        return self.shard_for(airline.name).remove_flight_cascade(airline, flight)
+
+    def remove_airline_cascade(self, airline: AirLine) -> RemovalReport:
+        return self.shard_for(airline.name).remove_airline_cascade(airline)
+
+    def change_flight_price(self, airline: AirLine, flight: Flight, price: float):
+        self.shard_for(airline.name).change_flight_price(airline, flight, price)
+
+    def change_flight_prices(self, prices: Iterable[Tuple[Flight, float]]) -> int:
+        batches: Dict[int, List[Tuple[Flight, float]]] = {}
+        for flight, price in prices:
+            shard = self._flight_shard(flight)
+            if shard is None:
+                raise ValueError("Unknown flight")
+            batches.setdefault(self.shards.index(shard), []).append((flight, price))
+        return sum(self.shards[index].change_flight_prices(batch) for index, batch in batches.items())
+
+    def create_reservation(self, real_name: str, flight: Flight, cabin: Optional[str] = None,
+                           seat: Optional[str] = None, price: Optional[float] = None,
+                           idempotency_key: Optional[str] = None, user_id: Optional[int] = None) -> float:
+        shard = self._flight_shard(flight)
+        if shard is None:
+            raise ValueError("Unknown flight")
+        return shard.create_reservation(real_name, flight, cabin, seat, price, idempotency_key, user_id)
+
+    def hold_seat(self, real_name: str, flight: Flight, cabin: Optional[str] = None, seat: Optional[str] = None,
+                  price: Optional[float] = None, ttl: Optional[float] = None,
+                  user_id: Optional[int] = None) -> SeatHold:
+        shard = self._flight_shard(flight)
+        if shard is None:
+            raise ValueError("Unknown flight")
+        return shard.hold_seat(real_name, flight, cabin, seat, price, ttl, user_id)
+
+    def _hold_shard(self, hold_id: str) -> BaseTicketManager:
+        for shard in self.shards:
+            if shard.get_hold(hold_id) is not None:
+                return shard
+        raise ValueError("Unknown or expired hold")
+
+    def get_hold(self, hold_id: str) -> Optional[SeatHold]:
+        for shard in self.shards:
+            hold = shard.get_hold(hold_id)
+            if hold is not None:
+                return hold
+        return None
+
+    def confirm_hold(self, hold_id: str, idempotency_key: Optional[str] = None) -> TicketReservation:
+        return self._hold_shard(hold_id).confirm_hold(hold_id, idempotency_key)
+
+    def release_hold(self, hold_id: str):
+        self._hold_shard(hold_id).release_hold(hold_id)
+
+    def expire_holds(self) -> int:
+        return sum(shard.expire_holds() for shard in self.shards)
+
+    # --- state ---
+
+    # The shards write their files at the same time
+    def save_state(self):
+        with ThreadPoolExecutor(max_workers=len(self.shards)) as pool:
+            list(pool.map(BaseTicketManager.save_state, self.shards))
+
+    # Without a file name every shard loads its own file, otherwise the state file is split
+    # between the shards
+    def load_state(self, file_name=None) -> bool:
+        if file_name is None:
+            loaded = [shard.load_state() for shard in self.shards]
+            self._number_tickets()
+            return any(loaded)
+        content = read_state(file_name)
+        if content is None:
+            return False
+        self.replace_state(content["airlines"], content["tickets"], idempotency=content["meta"].get("idempotency", ()),
+                           users=content["users"])
+        return True
+
+    def replace_state(self, airlines: List[AirLine], tickets: List[TicketReservation] = (),
+                      idempotency: Iterable[list] = (), users: Iterable[User] = ()):
+        parts = split_state(airlines, tickets, len(self.shards))
+        users = list(users)
+        for shard, (shard_airlines, shard_tickets), keys in zip(self.shards, parts, split_keys(idempotency, parts)):
+            shard.replace_state(shard_airlines, shard_tickets, idempotency=keys, users=users)
+        self._number_tickets()
+
+    def load_default(self):
+        self.load_state(self.DEFAULT_NAME)
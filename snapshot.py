@@ -0,0 +1,439 @@
+# Binary snapshot of the whole state that is memory-mapped and read lazily, so loading it
+# takes about the same time whatever the size of the data:
+#
+#   python snapshot.py default.pickle default.snap      (convert a state file)
+#   TicketManager().load_state("default.snap")
+#
+# Airlines are created on load, the flights of an airline when its flights are first used,
+# tickets when they are asked for (by id, by flight, by name or by iterating). Changes made
+# after loading are kept in memory on top of the file, which is never written to; saving
+# goes through the storage backend as usual.
+#
+# Layout of version 2 (little-endian): a header with the magic, the format version, the
+# record counts and the offsets of the sections, then the sections:
+#   strings       offsets (n + 1 x u64) and UTF-8 data of every distinct string
+#   airlines      name, first flight, flight count
+#   flights       kind, number, destination, seat layout (JSON), distance, price,
+#                 first ticket, ticket count; the flights of an airline are consecutive,
+#                 flights only referenced by tickets come after those of the airlines
+#   tickets       id, price, flight, name, seat, user id (-1 without user); sorted by
+#                 flight, then id
+#   by id         ticket record numbers sorted by ticket id
+#   by name       ticket record numbers sorted by passenger name, then id
+#   users         id, username, real name of the registered users (read on load)
+#   by user       record numbers of the tickets with a user, sorted by user id, then id
+# Version 1 files have no user id in the tickets and no users or by user sections; they
+# are still read.
+import argparse
+import json
+import mmap
+import struct
+import sys
+import threading
+import weakref
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from airline import AirLine
+from flight import Flight
+from flight_factory import FlightFactory, flight_kind
+from reservation_store import ReservationStore
+from seat_inventory import SeatInventory
+from state_format import read_state
+from ticket_reservation import TicketReservation
+from user import User
+
+MAGIC = b"TKTSNAP\x00"
+VERSION = 2
+
+_MAGIC_VERSION = struct.Struct("<8sI")
+_HEADER = struct.Struct("<8sIIIIIII9Q")
+_AIRLINE = struct.Struct("<III")
+_FLIGHT = struct.Struct("<IIIIddII")
+_TICKET = struct.Struct("<qdIIIq")
+_USER = struct.Struct("<qII")
+# Header and ticket records of version 1
+_HEADER_V1 = struct.Struct("<8sIIIII7Q")
+_TICKET_V1 = struct.Struct("<qdIII")
+_INDEX = struct.Struct("<I")
+_OFFSET = struct.Struct("<Q")
+_NONE = 0xFFFFFFFF
+
+
+# Returns True if the file starts like a snapshot
+def is_snapshot(file_name: str) -> bool:
+    try:
+        with open(file_name, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+# Writes airlines, tickets and users into a snapshot file
+def write_snapshot(file_name: str, airlines: Iterable[AirLine], tickets: Iterable[TicketReservation],
+                   users: Iterable[User] = ()):
+    strings: Dict[str, int] = {}
+
+    def string(value: Optional[str]) -> int:
+        if value is None:
+            return _NONE
+        number = strings.get(value)
+        if number is None:
+            number = strings[value] = len(strings)
+        return number
+
+    airlines = list(airlines)
+    flights: List[Flight] = []
+    flight_numbers: Dict[Flight, int] = {}
+    airline_records = []
+    for airline in airlines:
+        first = len(flights)
+        for flight in airline.iter_flights():
+            flight_numbers[flight] = len(flights)
+            flights.append(flight)
+        airline_records.append(_AIRLINE.pack(string(airline.name), first, len(flights) - first))
+    tickets = list(tickets)
+    for ticket in tickets:
+        if ticket.flight not in flight_numbers:
+            flight_numbers[ticket.flight] = len(flights)
+            flights.append(ticket.flight)
+    tickets.sort(key=lambda ticket: (flight_numbers[ticket.flight], ticket.ticket_id))
+    ticket_counts = [0] * len(flights)
+    for ticket in tickets:
+        ticket_counts[flight_numbers[ticket.flight]] += 1
+    flight_records = []
+    first_ticket = 0
+    for number, flight in enumerate(flights):
+        seats = flight.seats
+        layout = string(json.dumps(seats.layout)) if seats is not None else _NONE
+        flight_records.append(_FLIGHT.pack(string(flight_kind(flight)), string(flight.flight_number),
+                                           string(flight.destination), layout, flight.distance, flight.price,
+                                           first_ticket, ticket_counts[number]))
+        first_ticket += ticket_counts[number]
+    ticket_records = [_TICKET.pack(ticket.ticket_id, ticket.price, flight_numbers[ticket.flight],
+                                   string(ticket.name), string(ticket.seat),
+                                   ticket.user_id if ticket.user_id is not None else -1) for ticket in tickets]
+    by_id = sorted(range(len(tickets)), key=lambda record: tickets[record].ticket_id)
+    by_name = sorted(range(len(tickets)), key=lambda record: (tickets[record].name, tickets[record].ticket_id))
+    by_user = sorted((record for record in range(len(tickets)) if tickets[record].user_id is not None),
+                     key=lambda record: (tickets[record].user_id, tickets[record].ticket_id))
+    user_records = [_USER.pack(user.user_id, string(user.user_name), string(user.real_name)) for user in users]
+
+    data = [value.encode("utf-8") for value in strings]
+    offsets = [0]
+    for chunk in data:
+        offsets.append(offsets[-1] + len(chunk))
+    sections = [b"".join(_OFFSET.pack(offset) for offset in offsets), b"".join(data),
+                b"".join(airline_records), b"".join(flight_records), b"".join(ticket_records),
+                b"".join(_INDEX.pack(record) for record in by_id),
+                b"".join(_INDEX.pack(record) for record in by_name), b"".join(user_records),
+                b"".join(_INDEX.pack(record) for record in by_user)]
+    position = _HEADER.size
+    starts = []
+    for section in sections:
+        starts.append(position)
+        position += len(section)
+    with open(file_name, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(strings), len(airlines), len(flights), len(tickets),
+                             len(user_records), len(by_user), *starts))
+        for section in sections:
+            f.write(section)
+
+
+# An airline whose flights are read from the snapshot when they are first used
+class MappedAirLine(AirLine):
+    def __init__(self, name: str, snapshot: "MappedSnapshot", first: int, count: int):
+        self._name = name
+        self._snapshot = snapshot
+        self._range = (first, count)
+        self._loaded: Optional[List[Flight]] = None
+
+    @property
+    def _flights(self) -> List[Flight]:
+        if self._loaded is None:
+            first, count = self._range
+            self._loaded = [self._snapshot.flight(number) for number in range(first, first + count)]
+        return self._loaded
+
+    # Pickled as a plain AirLine, without the snapshot
+    def __reduce__(self):
+        return AirLine, (self._name,), {"_name": self._name, "_flights": self._flights}
+
+
+# An open snapshot file
+class MappedSnapshot:
+    def __init__(self, file_name: str):
+        with open(file_name, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < _MAGIC_VERSION.size:
+            raise ValueError(f"{file_name} is not a snapshot")
+        magic, version = _MAGIC_VERSION.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{file_name} is not a snapshot")
+        if version == VERSION and len(self._map) >= _HEADER.size:
+            (_, _, self.string_count, self.airline_count, self.flight_count, self.ticket_count,
+             self.user_count, self.user_ticket_count, *self._sections) = _HEADER.unpack_from(self._map, 0)
+            self._ticket_struct = _TICKET
+        elif version == 1 and len(self._map) >= _HEADER_V1.size:
+            (_, _, self.string_count, self.airline_count, self.flight_count, self.ticket_count,
+             *self._sections) = _HEADER_V1.unpack_from(self._map, 0)
+            self.user_count = self.user_ticket_count = 0
+            self._ticket_struct = _TICKET_V1
+        else:
+            raise ValueError(f"Unsupported snapshot version {version} in {file_name}")
+        self._lock = threading.RLock()
+        self._strings: Dict[int, str] = {}
+        # Flights are kept once read, so every ticket and airline shares the same object
+        self._flights: Dict[int, Flight] = {}
+        self.flight_numbers: Dict[Flight, int] = {}
+
+    def string(self, number: int) -> Optional[str]:
+        if number == _NONE:
+            return None
+        value = self._strings.get(number)
+        if value is None:
+            start, end = struct.unpack_from("<QQ", self._map, self._sections[0] + number * _OFFSET.size)
+            data = self._sections[1]
+            value = self._strings[number] = sys.intern(self._map[data + start:data + end].decode("utf-8"))
+        return value
+
+    def airlines(self) -> List[AirLine]:
+        result = []
+        for number in range(self.airline_count):
+            name, first, count = _AIRLINE.unpack_from(self._map, self._sections[2] + number * _AIRLINE.size)
+            result.append(MappedAirLine(self.string(name), self, first, count))
+        return result
+
+    def flight_record(self, number: int) -> tuple:
+        return _FLIGHT.unpack_from(self._map, self._sections[3] + number * _FLIGHT.size)
+
+    # The flight with the given record number. Its seat map is rebuilt from its tickets.
+    def flight(self, number: int) -> Flight:
+        flight = self._flights.get(number)
+        if flight is not None:
+            return flight
+        with self._lock:
+            flight = self._flights.get(number)
+            if flight is None:
+                kind, flight_number, destination, layout, distance, price, first, count = self.flight_record(number)
+                seats = SeatInventory([tuple(cabin) for cabin in json.loads(self.string(layout))]) \
+                    if layout != _NONE else None
+                flight = FlightFactory().create_flight(self.string(kind), self.string(flight_number),
+                                                       self.string(destination), distance, price, seats)
+                if seats is not None:
+                    for record in range(first, first + count):
+                        seat = self.ticket_record(record)[4]
+                        if seat != _NONE:
+                            seats.hold(self.string(seat))
+                self.flight_numbers[flight] = number
+                self._flights[number] = flight
+            return flight
+
+    # (id, price, flight number, name, seat, user id or -1)
+    def ticket_record(self, record: int) -> tuple:
+        ticket_struct = self._ticket_struct
+        values = ticket_struct.unpack_from(self._map, self._sections[4] + record * ticket_struct.size)
+        return values if ticket_struct is _TICKET else values + (-1,)
+
+    def by_id(self, position: int) -> int:
+        return _INDEX.unpack_from(self._map, self._sections[5] + position * _INDEX.size)[0]
+
+    def by_name(self, position: int) -> int:
+        return _INDEX.unpack_from(self._map, self._sections[6] + position * _INDEX.size)[0]
+
+    def by_user(self, position: int) -> int:
+        return _INDEX.unpack_from(self._map, self._sections[8] + position * _INDEX.size)[0]
+
+    def users(self) -> List[User]:
+        result = []
+        for number in range(self.user_count):
+            user_id, user_name, real_name = _USER.unpack_from(self._map, self._sections[7] + number * _USER.size)
+            result.append(User(self.string(user_name), self.string(real_name), user_id))
+        return result
+
+    def reservations(self) -> "MappedReservationStore":
+        return MappedReservationStore(self)
+
+    def close(self):
+        self._map.close()
+
+
+# Reservation store over a snapshot, with the ReservationStore API. Tickets of the file are
+# built when asked for (one object per id while in use, like SQLiteReservationStore).
+# Tickets added later live in an ordinary ReservationStore, removed ones are remembered by id.
+class MappedReservationStore:
+    def __init__(self, snapshot: MappedSnapshot):
+        self._snapshot = snapshot
+        self._lock = threading.RLock()
+        self._mapped: int = snapshot.ticket_count
+        self._removed: Set[int] = set()
+        self._added = ReservationStore()
+        self._max_id: int = self._ticket_id(self._mapped - 1) if self._mapped else 0
+        self._next_id: int = self._max_id + 1
+        self._live: "weakref.WeakValueDictionary[int, TicketReservation]" = weakref.WeakValueDictionary()
+
+    def _ticket_id(self, position: int) -> int:
+        return self._snapshot.ticket_record(self._snapshot.by_id(position))[0]
+
+    # Record number of a ticket id in the file, or None
+    def _find(self, ticket_id: int) -> Optional[int]:
+        low, high = 0, self._mapped
+        while low < high:
+            middle = (low + high) // 2
+            if self._ticket_id(middle) < ticket_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._mapped and self._ticket_id(low) == ticket_id:
+            return self._snapshot.by_id(low)
+        return None
+
+    def _ticket(self, record: int) -> Optional[TicketReservation]:
+        ticket_id, price, flight, name, seat, user = self._snapshot.ticket_record(record)
+        if ticket_id in self._removed:
+            return None
+        ticket = self._live.get(ticket_id)
+        if ticket is None:
+            snapshot = self._snapshot
+            ticket = TicketReservation(snapshot.string(name), snapshot.flight(flight), price, snapshot.string(seat),
+                                       user if user >= 0 else None)
+            ticket.ticket_id = ticket_id
+            self._live[ticket_id] = ticket
+        return ticket
+
+    def __len__(self) -> int:
+        return self._mapped - len(self._removed) + len(self._added)
+
+    def __iter__(self) -> Iterator[TicketReservation]:
+        for position in range(self._mapped):
+            ticket = self._ticket(self._snapshot.by_id(position))
+            if ticket is not None:
+                yield ticket
+        yield from self._added
+
+    def __contains__(self, ticket: TicketReservation) -> bool:
+        ticket_id = ticket.ticket_id
+        return ticket_id is not None and self.get(ticket_id) is ticket
+
+    def add(self, ticket: TicketReservation) -> int:
+        with self._lock:
+            if ticket.ticket_id is None:
+                ticket.ticket_id = self._next_id
+            elif ticket.ticket_id <= self._max_id and self._find(ticket.ticket_id) is not None:
+                raise ValueError(f"Duplicate ticket id {ticket.ticket_id}")
+            self._added.add(ticket)
+            self._next_id = max(self._next_id, ticket.ticket_id + 1)
+        return ticket.ticket_id
+
+    def get(self, ticket_id: int) -> Optional[TicketReservation]:
+        ticket = self._added.get(ticket_id)
+        if ticket is None and ticket_id <= self._max_id:
+            record = self._find(ticket_id)
+            if record is not None:
+                ticket = self._ticket(record)
+        return ticket
+
+    def remove_by_id(self, ticket_id: int) -> TicketReservation:
+        with self._lock:
+            if self._added.get(ticket_id) is not None:
+                return self._added.remove_by_id(ticket_id)
+            ticket = self.get(ticket_id)
+            if ticket is None:
+                raise ValueError("Unknown ticket")
+            self._removed.add(ticket_id)
+            self._live.pop(ticket_id, None)
+            return ticket
+
+    def remove(self, ticket: TicketReservation):
+        if ticket not in self:
+            raise ValueError("Unknown ticket")
+        self.remove_by_id(ticket.ticket_id)
+
+    def at(self, idx: int) -> TicketReservation:
+        if idx < 0 or idx >= len(self):
+            raise ValueError("Wrong index")
+        return next(islice(self, idx, None))
+
+    def page(self, offset: int, limit: int) -> List[TicketReservation]:
+        return list(islice(self, offset, offset + limit))
+
+    def by_flight(self, flight: Flight) -> List[TicketReservation]:
+        tickets = []
+        number = self._snapshot.flight_numbers.get(flight)
+        if number is not None:
+            first, count = self._snapshot.flight_record(number)[6:]
+            tickets = [ticket for ticket in map(self._ticket, range(first, first + count)) if ticket is not None]
+        return tickets + self._added.by_flight(flight)
+
+    def by_name(self, name: str) -> List[TicketReservation]:
+        snapshot = self._snapshot
+        low, high = 0, self._mapped
+        while low < high:
+            middle = (low + high) // 2
+            if snapshot.string(snapshot.ticket_record(snapshot.by_name(middle))[3]) < name:
+                low = middle + 1
+            else:
+                high = middle
+        tickets = []
+        while low < self._mapped:
+            record = snapshot.by_name(low)
+            if snapshot.string(snapshot.ticket_record(record)[3]) != name:
+                break
+            ticket = self._ticket(record)
+            if ticket is not None:
+                tickets.append(ticket)
+            low += 1
+        return tickets + self._added.by_name(name)
+
+    def by_user(self, user_id: int) -> List[TicketReservation]:
+        snapshot = self._snapshot
+        count = snapshot.user_ticket_count if self._mapped else 0
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if snapshot.ticket_record(snapshot.by_user(middle))[5] < user_id:
+                low = middle + 1
+            else:
+                high = middle
+        tickets = []
+        while low < count:
+            record = snapshot.by_user(low)
+            if snapshot.ticket_record(record)[5] != user_id:
+                break
+            ticket = self._ticket(record)
+            if ticket is not None:
+                tickets.append(ticket)
+            low += 1
+        return tickets + self._added.by_user(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._mapped = 0
+            self._removed.clear()
+            self._added.clear()
+            self._live = weakref.WeakValueDictionary()
+
+
+# Loads a snapshot into the manager
+def load_snapshot(manager, file_name: str):
+    snapshot = MappedSnapshot(file_name)
+    manager.replace_state(snapshot.airlines(), store=snapshot.reservations(), users=snapshot.users())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a state file into a snapshot")
+    parser.add_argument("source", help="state file (any version)")
+    parser.add_argument("target", help="snapshot file to write")
+    args = parser.parse_args()
+    content = read_state(args.source)
+    if content is None:
+        raise SystemExit(f"{args.source} does not exist")
+    store = ReservationStore()
+    for ticket in content["tickets"]:
+        store.add(ticket)
+    write_snapshot(args.target, content["airlines"], store, content["users"])
+    print(f"Wrote {len(store)} tickets to {args.target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+import json
+import sqlite3
+import threading
+import weakref
+from typing import Dict, Iterator, List, Optional
+
+from airline import AirLine
+from flight import Flight
+from flight_factory import FlightFactory, flight_kind
+from seat_inventory import SeatInventory
+from storage import StorageBackend
+from ticket_reservation import TicketReservation
+from user import User
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS airlines (
+    name TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS flights (
+    id INTEGER PRIMARY KEY,
+    airline TEXT NOT NULL REFERENCES airlines(name),
+    kind TEXT NOT NULL,
+    flight_number TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    distance REAL NOT NULL,
+    price REAL NOT NULL,
+    seat_layout TEXT
+);
+CREATE TABLE IF NOT EXISTS reservations (
+    ticket_id INTEGER PRIMARY KEY,
+    flight_id INTEGER NOT NULL REFERENCES flights(id),
+    name TEXT NOT NULL,
+    price REAL NOT NULL,
+    seat TEXT,
+    user_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    user_name TEXT NOT NULL,
+    real_name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    expires REAL NOT NULL,
+    ticket_id INTEGER NOT NULL,
+    price REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS flights_airline ON flights(airline);
+CREATE INDEX IF NOT EXISTS flights_number ON flights(flight_number);
+CREATE INDEX IF NOT EXISTS flights_destination ON flights(destination);
+CREATE INDEX IF NOT EXISTS reservations_flight ON reservations(flight_id);
+CREATE INDEX IF NOT EXISTS reservations_name ON reservations(name);
+"""
+
+# Brings databases written before users existed up to _SCHEMA, then indexes what it added
+_UPGRADE = [
+    ("reservations", "user_id", "ALTER TABLE reservations ADD COLUMN user_id INTEGER"),
+]
+_UPGRADE_INDEXES = """
+CREATE INDEX IF NOT EXISTS reservations_user ON reservations(user_id);
+"""
+
+
+# Seat layout column value of a flight (JSON cabin list, NULL without a seat map)
+def _layout(flight: Flight) -> Optional[str]:
+    seats = flight.seats
+    return json.dumps(seats.layout) if seats is not None else None
+
+
+# Keeps the state in a local SQLite database. Every change is written as it happens,
+# grouped into transactions of BATCH_SIZE statements; save_state commits the open one.
+# Airlines and flights are loaded at startup, reservations stay in the database and are
+# read on demand through SQLiteReservationStore.
+class SQLiteStorage(StorageBackend):
+
+    BATCH_SIZE: int = 1000      # Statements per transaction
+
+    def __init__(self, path: str = "tickets.sqlite3"):
+        self.path: str = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pending: int = 0
+        self._loading: bool = False
+        # The connection is shared by all threads, every use of it goes through this lock
+        self.lock = threading.RLock()
+        # Database ids of the flights, in both directions
+        self._flight_ids: Dict[Flight, int] = {}
+        self._flights_by_id: Dict[int, Flight] = {}
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # Transactions are managed explicitly, see _write
+            self._conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            self._conn.executescript(_SCHEMA)
+            for table, column, statement in _UPGRADE:
+                if column not in {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}:
+                    self._conn.execute(statement)
+            self._conn.executescript(_UPGRADE_INDEXES)
+        return self._conn
+
+    def _write(self, sql: str, params=()) -> sqlite3.Cursor:
+        with self.lock:
+            conn = self.connection
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            cursor = conn.execute(sql, params)
+            self._pending += 1
+            if self._pending >= self.BATCH_SIZE:
+                self.commit()
+            return cursor
+
+    def commit(self):
+        with self.lock:
+            if self._conn is not None and self._conn.in_transaction:
+                self._conn.execute("COMMIT")
+            self._pending = 0
+
+    def files(self, manager) -> List[str]:
+        return [self.path]
+
+    def close(self):
+        with self.lock:
+            if self._conn is not None:
+                self.commit()
+                self._conn.close()
+                self._conn = None
+
+    # --- incremental writes ---
+
+    def _insert_flight(self, airline: AirLine, flight: Flight) -> int:
+        cursor = self._write("INSERT INTO flights (airline, kind, flight_number, destination, distance, price, "
+                             "seat_layout) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (airline.name, flight_kind(flight), flight.flight_number, flight.destination,
+                              flight.distance, flight.price, _layout(flight)))
+        flight_id = cursor.lastrowid
+        self._flight_ids[flight] = flight_id
+        self._flights_by_id[flight_id] = flight
+        return flight_id
+
+    def _flight_id(self, airline: AirLine, flight: Flight) -> int:
+        flight_id = self._flight_ids.get(flight)
+        if flight_id is None:
+            # The flight was added directly through AirLine.add_flight
+            flight_id = self._insert_flight(airline, flight)
+        return flight_id
+
+    def airline_added(self, airline: AirLine):
+        self._write("INSERT INTO airlines (name) VALUES (?)", (airline.name,))
+        for flight in airline.iter_flights():
+            self._insert_flight(airline, flight)
+
+    def airline_removed(self, airline: AirLine):
+        self._write("DELETE FROM airlines WHERE name = ?", (airline.name,))
+
+    def flight_added(self, airline: AirLine, flight: Flight):
+        self._insert_flight(airline, flight)
+
+    def flight_removed(self, airline: AirLine, flight: Flight):
+        flight_id = self._flight_ids.pop(flight, None)
+        if flight_id is not None:
+            del self._flights_by_id[flight_id]
+            self._write("DELETE FROM flights WHERE id = ?", (flight_id,))
+
+    def flight_price_changed(self, airline: AirLine, flight: Flight):
+        self._write("UPDATE flights SET price = ? WHERE id = ?", (flight.price, self._flight_id(airline, flight)))
+
+    def ticket_added(self, airline: AirLine, ticket: TicketReservation):
+        self._write("INSERT INTO reservations (ticket_id, flight_id, name, price, seat, user_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (ticket.ticket_id, self._flight_id(airline, ticket.flight), ticket.name, ticket.price,
+                     ticket.seat, ticket.user_id))
+
+    def ticket_removed(self, ticket: TicketReservation):
+        self._write("DELETE FROM reservations WHERE ticket_id = ?", (ticket.ticket_id,))
+
+    def tickets_removed(self, tickets: List[TicketReservation]):
+        with self.lock:
+            conn = self.connection
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            conn.executemany("DELETE FROM reservations WHERE ticket_id = ?", [(t.ticket_id,) for t in tickets])
+            self._pending += 1
+            if self._pending >= self.BATCH_SIZE:
+                self.commit()
+
+    # Expired keys are left in the table until the next reset, load skips them
+    def idempotency_key_added(self, key: str, ticket: TicketReservation, expires: float):
+        self._write("INSERT OR REPLACE INTO idempotency_keys (key, expires, ticket_id, price) VALUES (?, ?, ?, ?)",
+                    (key, expires, ticket.ticket_id, ticket.price))
+
+    def user_added(self, user: User):
+        self._write("INSERT INTO users (user_id, user_name, real_name) VALUES (?, ?, ?)",
+                    (user.user_id, user.user_name, user.real_name))
+
+    # A state loaded from elsewhere (e.g. the default file) replaces the database content
+    def state_replaced(self, manager):
+        if not self._loading:
+            self.reset(manager)
+
+    # --- StorageBackend ---
+
+    def exists(self) -> bool:
+        with self.lock:
+            return self.connection.execute("SELECT 1 FROM airlines LIMIT 1").fetchone() is not None
+
+    def save(self, manager):
+        self.commit()
+
+    # The manager keeps working without the database, so the lazy reservations are read into memory
+    def detach(self, manager):
+        if isinstance(manager.tickets, SQLiteReservationStore):
+            manager.replace_state(manager.airlines, list(manager.tickets), idempotency=manager.idempotency.entries(),
+                                  users=list(manager.users))
+
+    # Rewrites all tables from the manager's state in a single transaction
+    def reset(self, manager):
+        with self.lock:
+            self._reset(manager)
+
+    def _reset(self, manager):
+        self.commit()
+        conn = self.connection
+        flight_rows = []
+        self._flight_ids = {}
+        self._flights_by_id = {}
+        ticket_rows = [(t.ticket_id, t.flight, t.name, t.price, t.seat, t.user_id) for t in manager.tickets]
+        for airline in manager.airlines:
+            for flight in airline.iter_flights():
+                flight_id = len(flight_rows) + 1
+                self._flight_ids[flight] = flight_id
+                self._flights_by_id[flight_id] = flight
+                flight_rows.append((flight_id, airline.name, flight_kind(flight), flight.flight_number,
+                                    flight.destination, flight.distance, flight.price, _layout(flight)))
+        with conn:
+            conn.execute("BEGIN")
+            conn.execute("DELETE FROM idempotency_keys")
+            conn.execute("DELETE FROM reservations")
+            conn.execute("DELETE FROM users")
+            conn.execute("DELETE FROM flights")
+            conn.execute("DELETE FROM airlines")
+            conn.executemany("INSERT INTO airlines (name) VALUES (?)", [(a.name,) for a in manager.airlines])
+            conn.executemany("INSERT INTO flights (id, airline, kind, flight_number, destination, distance, price, "
+                             "seat_layout) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", flight_rows)
+            conn.executemany("INSERT INTO users (user_id, user_name, real_name) VALUES (?, ?, ?)",
+                             [(user.user_id, user.user_name, user.real_name) for user in manager.users])
+            conn.executemany("INSERT INTO reservations (ticket_id, flight_id, name, price, seat, user_id) "
+                             "VALUES (?, ?, ?, ?, ?, ?)",
+                             [(ticket_id, self._flight_ids[flight], name, price, seat, user_id)
+                              for ticket_id, flight, name, price, seat, user_id in ticket_rows])
+            conn.executemany("INSERT INTO idempotency_keys (key, expires, ticket_id, price) VALUES (?, ?, ?, ?)",
+                             manager.idempotency.entries())
+
+    # Loads airlines and flights; reservations are served lazily from the database
+    def load(self, manager) -> bool:
+        with self.lock:
+            return self._load(manager)
+
+    def _load(self, manager) -> bool:
+        self.commit()
+        conn = self.connection
+        airlines: Dict[str, AirLine] = {name: AirLine(name) for (name,) in
+                                        conn.execute("SELECT name FROM airlines ORDER BY rowid")}
+        if not airlines:
+            return False
+        factory = FlightFactory()
+        self._flight_ids = {}
+        self._flights_by_id = {}
+        for flight_id, airline_name, kind, number, destination, distance, price, layout in conn.execute(
+                "SELECT id, airline, kind, flight_number, destination, distance, price, seat_layout "
+                "FROM flights ORDER BY id"):
+            seats = SeatInventory(json.loads(layout)) if layout is not None else None
+            flight = factory.create_flight(kind, number, destination, distance, price, seats)
+            airlines[airline_name].add_flight(flight)
+            self._flight_ids[flight] = flight_id
+            self._flights_by_id[flight_id] = flight
+        # Seat maps are rebuilt from the booked seats
+        for flight_id, seat in conn.execute("SELECT flight_id, seat FROM reservations WHERE seat IS NOT NULL"):
+            self._flights_by_id[flight_id].seats.hold(seat)
+        keys = conn.execute("SELECT key, expires, ticket_id, price FROM idempotency_keys").fetchall()
+        users = [User(user_name, real_name, user_id) for user_id, user_name, real_name in
+                 conn.execute("SELECT user_id, user_name, real_name FROM users ORDER BY user_id")]
+        self._loading = True
+        try:
+            manager.replace_state(list(airlines.values()), store=SQLiteReservationStore(self), idempotency=keys,
+                                  users=users)
+        finally:
+            self._loading = False
+        return True
+
+    # --- indexed queries ---
+
+    def _flights_where(self, condition: str, value) -> List[Flight]:
+        with self.lock:
+            rows = self.connection.execute(f"SELECT id FROM flights WHERE {condition} = ? ORDER BY id", (value,))
+            return [self._flights_by_id[flight_id] for (flight_id,) in rows]
+
+    def find_flights_by_number(self, flight_number: str) -> List[Flight]:
+        return self._flights_where("flight_number", flight_number)
+
+    def find_flights_by_destination(self, destination: str) -> List[Flight]:
+        return self._flights_where("destination", destination)
+
+
+# Drop-in replacement of ReservationStore that reads the reservations table on demand.
+# Writes go through the SQLiteStorage listener hooks; this class only hands out ids and
+# keeps one TicketReservation object per ticket id while it is in use.
+class SQLiteReservationStore:
+    _COLUMNS = "SELECT ticket_id, flight_id, name, price, seat, user_id FROM reservations"
+
+    def __init__(self, storage: SQLiteStorage):
+        self._storage: SQLiteStorage = storage
+        self._conn: sqlite3.Connection = storage.connection
+        self._lock = storage.lock
+        self._live: "weakref.WeakValueDictionary[int, TicketReservation]" = weakref.WeakValueDictionary()
+        max_id = self._conn.execute("SELECT MAX(ticket_id) FROM reservations").fetchone()[0]
+        self._next_id: int = (max_id or 0) + 1
+
+    def _ticket(self, row) -> TicketReservation:
+        ticket_id, flight_id, name, price, seat, user_id = row
+        ticket = self._live.get(ticket_id)
+        if ticket is None:
+            ticket = TicketReservation(name, self._storage._flights_by_id[flight_id], price, seat, user_id)
+            ticket.ticket_id = ticket_id
+            self._live[ticket_id] = ticket
+        return ticket
+
+    def _select(self, where: str = "", params=()) -> List[TicketReservation]:
+        with self._lock:
+            return [self._ticket(row) for row in self._conn.execute(f"{self._COLUMNS} {where}", params)]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM reservations").fetchone()[0]
+
+    def __iter__(self) -> Iterator[TicketReservation]:
+        return iter(self._select("ORDER BY ticket_id"))
+
+    def __contains__(self, ticket: TicketReservation) -> bool:
+        ticket_id = ticket.ticket_id
+        return ticket_id is not None and self.get(ticket_id) is ticket
+
+    def add(self, ticket: TicketReservation) -> int:
+        with self._lock:
+            ticket_id = ticket.ticket_id
+            if ticket_id is None:
+                ticket_id = self._next_id
+                ticket.ticket_id = ticket_id
+            elif self.get(ticket_id) is not None:
+                raise ValueError(f"Duplicate ticket id {ticket_id}")
+            self._next_id = max(self._next_id, ticket_id + 1)
+            self._live[ticket_id] = ticket
+        return ticket_id
+
+    def get(self, ticket_id: int) -> Optional[TicketReservation]:
+        with self._lock:
+            ticket = self._live.get(ticket_id)
+            if ticket is None:
+                tickets = self._select("WHERE ticket_id = ?", (ticket_id,))
+                ticket = tickets[0] if tickets else None
+            return ticket
+
+    def remove_by_id(self, ticket_id: int) -> TicketReservation:
+        with self._lock:
+            ticket = self.get(ticket_id)
+            if ticket is None:
+                raise ValueError("Unknown ticket")
+            self._live.pop(ticket_id, None)
+            return ticket
+
+    def remove(self, ticket: TicketReservation):
+        if ticket not in self:
+            raise ValueError("Unknown ticket")
+        self.remove_by_id(ticket.ticket_id)
+
+    def at(self, idx: int) -> TicketReservation:
+        tickets = self._select("ORDER BY ticket_id LIMIT 1 OFFSET ?", (idx,)) if idx >= 0 else []
+        if not tickets:
+            raise ValueError("Wrong index")
+        return tickets[0]
+
+    def page(self, offset: int, limit: int) -> List[TicketReservation]:
+        return self._select("ORDER BY ticket_id LIMIT ? OFFSET ?", (limit, offset))
+
+    def by_flight(self, flight: Flight) -> List[TicketReservation]:
+        flight_id = self._storage._flight_ids.get(flight)
+        if flight_id is None:
+            return []
+        return self._select("WHERE flight_id = ? ORDER BY ticket_id", (flight_id,))
+
+    def by_name(self, name: str) -> List[TicketReservation]:
+        return self._select("WHERE name = ? ORDER BY ticket_id", (name,))
+
+    def by_user(self, user_id: int) -> List[TicketReservation]:
+        return self._select("WHERE user_id = ? ORDER BY ticket_id", (user_id,))
@@ -0,0 +1,338 @@
+# Versioned state file format used by save_state/load_state instead of raw pickle.
+#
+#   python state_format.py tickets.pickle tickets.state      (convert an old state file)
+#
+# A state file is a header followed by the payload:
+#   magic       b"TKTSTATE"
+#   version     u16, version of the document schema
+#   flags       u16, FLAG_ZLIB if the payload is zlib-compressed
+#   checksum    u32, crc32 of the payload as stored
+#   length      u64, length of the payload
+# The payload is a JSON document that stores the state column by column, so encoding and
+# decoding run in the json module's C code and no class of the program is ever named in
+# the file. Reading a file checks the magic, the length and the checksum, and documents
+# of older schema versions are brought to the current one by the MIGRATIONS steps. Every
+# problem raises StateFormatError instead of leaving the state half loaded.
+#
+# Version 2 document:
+#   airlines    names
+#   layouts     distinct seat layouts ([[cabin, rows, letters], ...])
+#   flights     columns airline (index, -1 for flights only referenced by tickets), kind,
+#               number, destination, distance, price, layout (index, -1 without seat map),
+#               taken (seat labels of the tickets, None without seat map; seats of
+#               open holds are left out, so a restart releases them)
+#   tickets     columns id, name, flight (index), price, seat, user (id, None without user)
+#   users       columns id, user_name, real_name of the registered users (see user_registry.py)
+#   meta        free-form values of the writer (e.g. the journal sequence number)
+#
+# Old pickle files are still read, with an unpickler that only creates the classes of a
+# state file, so a file from elsewhere cannot run code.
+import argparse
+import io
+import json
+import os
+import pickle
+import struct
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional
+
+from airline import AirLine
+from flight import Flight
+from flight_factory import FlightFactory, flight_kind
+from seat_inventory import SeatInventory
+from ticket_reservation import TicketReservation
+from user import User
+
+MAGIC = b"TKTSTATE"
+VERSION = 2
+FLAG_ZLIB = 1
+
+_HEADER = struct.Struct("<8sHHIQ")
+
+# Version n documents are turned into version n + 1 documents by MIGRATIONS[n]
+MIGRATIONS: Dict[int, Callable[[dict], dict]] = {}
+
+# The globals a pickled state may refer to
+_PICKLE_CLASSES = {
+    ("airline", "AirLine"),
+    ("domestic_flight", "DomesticFlight"),
+    ("international_flight", "InternationalFlight"),
+    ("seat_inventory", "SeatInventory"),
+    ("ticket_reservation", "TicketReservation"),
+    ("builtins", "bytearray"),
+    ("builtins", "object"),
+    ("copyreg", "_reconstructor"),
+}
+
+
+# The file is not a state file, is damaged or cannot be read by this version
+class StateFormatError(ValueError):
+    pass
+
+
+# Registers a migration from the given schema version to the next one
+def migration(version: int):
+    def register(step: Callable[[dict], dict]) -> Callable[[dict], dict]:
+        MIGRATIONS[version] = step
+        return step
+    return register
+
+
+def _migrate(document: dict, version: int) -> dict:
+    if version > VERSION:
+        raise StateFormatError(f"State format version {version} is newer than this program ({VERSION})")
+    while version < VERSION:
+        step = MIGRATIONS.get(version)
+        if step is None:
+            raise StateFormatError(f"No migration from state format version {version}")
+        document = step(document)
+        version += 1
+    return document
+
+
+# Version 1 had no users
+@migration(1)
+def _add_users(document: dict) -> dict:
+    tickets = document.get("tickets")
+    if isinstance(tickets, dict) and isinstance(tickets.get("id"), list):
+        tickets["user"] = [None] * len(tickets["id"])
+    document["users"] = {"id": [], "user_name": [], "real_name": []}
+    return document
+
+
+# Builds the document of the current schema version; prices overrides the flight prices
+def _document(airlines: Iterable[AirLine], tickets: Iterable[TicketReservation], meta: Optional[dict],
+              users: Iterable[User] = (), prices: Optional[Dict[Flight, float]] = None) -> dict:
+    airlines = list(airlines)
+    flights: List[Flight] = []
+    flight_airlines: List[int] = []
+    flight_numbers: Dict[Flight, int] = {}
+    for number, airline in enumerate(airlines):
+        for flight in airline.iter_flights():
+            flight_numbers[flight] = len(flights)
+            flights.append(flight)
+            flight_airlines.append(number)
+    ticket_columns = {"id": [], "name": [], "flight": [], "price": [], "seat": [], "user": []}
+    # Seats booked by tickets, by flight number
+    booked: Dict[int, List[str]] = {}
+    for ticket in tickets:
+        flight_number = flight_numbers.get(ticket.flight)
+        if flight_number is None:
+            flight_number = flight_numbers[ticket.flight] = len(flights)
+            flights.append(ticket.flight)
+            flight_airlines.append(-1)
+        ticket_columns["id"].append(ticket.ticket_id)
+        ticket_columns["name"].append(ticket.name)
+        ticket_columns["flight"].append(flight_number)
+        ticket_columns["price"].append(ticket.price)
+        ticket_columns["seat"].append(ticket.seat)
+        ticket_columns["user"].append(ticket.user_id)
+        if ticket.seat is not None:
+            booked.setdefault(flight_number, []).append(ticket.seat)
+    user_columns = {"id": [], "user_name": [], "real_name": []}
+    for user in users:
+        user_columns["id"].append(user.user_id)
+        user_columns["user_name"].append(user.user_name)
+        user_columns["real_name"].append(user.real_name)
+    layouts: Dict[str, int] = {}
+    layout_column = []
+    taken_column = []
+    for number, flight in enumerate(flights):
+        seats = flight.seats
+        if seats is None:
+            layout_column.append(-1)
+            taken_column.append(None)
+            continue
+        key = json.dumps(seats.layout)
+        layout_column.append(layouts.setdefault(key, len(layouts)))
+        taken_column.append(booked.get(number, []))
+    return {
+        "airlines": [airline.name for airline in airlines],
+        "layouts": [json.loads(key) for key in layouts],
+        "flights": {
+            "airline": flight_airlines,
+            "kind": [flight_kind(flight) for flight in flights],
+            "number": [flight.flight_number for flight in flights],
+            "destination": [flight.destination for flight in flights],
+            "distance": [flight.distance for flight in flights],
+            "price": [flight.price if prices is None else prices.get(flight, flight.price) for flight in flights],
+            "layout": layout_column,
+            "taken": taken_column,
+        },
+        "tickets": ticket_columns,
+        "users": user_columns,
+        "meta": meta if meta is not None else {},
+    }
+
+
+def _columns(table: dict, names: List[str]) -> List[list]:
+    columns = [table[name] for name in names]
+    if any(not isinstance(column, list) or len(column) != len(columns[0]) for column in columns):
+        raise StateFormatError("State file columns have different lengths")
+    return columns
+
+
+# Builds the objects of a current version document
+def _state(document: dict) -> dict:
+    try:
+        airlines = [AirLine(name) for name in document["airlines"]]
+        layouts = document["layouts"]
+        factory = FlightFactory()
+        flights = []
+        for airline, kind, number, destination, distance, price, layout, taken in zip(*_columns(
+                document["flights"],
+                ["airline", "kind", "number", "destination", "distance", "price", "layout", "taken"])):
+            seats = None
+            if layout >= 0:
+                seats = SeatInventory([tuple(cabin) for cabin in layouts[layout]])
+                for seat in taken:
+                    seats.hold(seat)
+            flight = factory.create_flight(kind, number, destination, distance, price, seats)
+            if airline >= 0:
+                airlines[airline].add_flight(flight)
+            flights.append(flight)
+        tickets = []
+        for ticket_id, name, flight, price, seat, user in zip(*_columns(
+                document["tickets"], ["id", "name", "flight", "price", "seat", "user"])):
+            ticket = TicketReservation(name, flights[flight], price, seat, user)
+            ticket.ticket_id = ticket_id
+            tickets.append(ticket)
+        users = [User(user_name, real_name, user_id) for user_id, user_name, real_name in zip(*_columns(
+                 document["users"], ["id", "user_name", "real_name"]))]
+        meta = document["meta"]
+    except (KeyError, IndexError, TypeError, AttributeError, ValueError) as err:
+        raise StateFormatError(f"Invalid state file content: {err!r}")
+    return {"airlines": airlines, "tickets": tickets, "users": users, "meta": meta}
+
+
+# Encodes a state into the bytes of a state file
+def encode_state(airlines: Iterable[AirLine], tickets: Iterable[TicketReservation],
+                 meta: Optional[dict] = None, compress: bool = True, users: Iterable[User] = ()) -> bytes:
+    return _encode(_document(airlines, tickets, meta, users), compress)
+
+
+# Copies what encode_state reads of a state and later changes could alter (the flights of
+# the airlines, their prices, the ticket and user lists) and returns a function that
+# encodes the copy. Copying costs little next to encoding, so the copy can be taken while
+# the state is locked and encoded after the locks are released (see FileStorage.save).
+def capture_state(airlines: Iterable[AirLine], tickets: Iterable[TicketReservation],
+                  meta: Optional[dict] = None, compress: bool = True,
+                  users: Iterable[User] = ()) -> Callable[[], bytes]:
+    copies = []
+    prices: Dict[Flight, float] = {}
+    for airline in airlines:
+        copy = AirLine(airline.name)
+        for flight in airline.iter_flights():
+            copy.add_flight(flight)
+            prices[flight] = flight.price
+        copies.append(copy)
+    tickets = list(tickets)
+    users = list(users)
+    return lambda: _encode(_document(copies, tickets, meta, users, prices), compress)
+
+
+def _encode(document: dict, compress: bool) -> bytes:
+    payload = json.dumps(document, separators=(",", ":")).encode("utf-8")
+    flags = 0
+    if compress:
+        payload = zlib.compress(payload, 1)
+        flags |= FLAG_ZLIB
+    return _HEADER.pack(MAGIC, VERSION, flags, zlib.crc32(payload), len(payload)) + payload
+
+
+# Decodes the bytes of a state file into {"airlines": [...], "tickets": [...], "users": [...], "meta": {...}}
+def decode_state(data: bytes) -> dict:
+    if len(data) < _HEADER.size or data[:len(MAGIC)] != MAGIC:
+        raise StateFormatError("Not a state file")
+    magic, version, flags, checksum, length = _HEADER.unpack_from(data)
+    payload = data[_HEADER.size:]
+    if len(payload) != length:
+        raise StateFormatError(f"State file is truncated ({len(payload)} of {length} bytes)")
+    if zlib.crc32(payload) != checksum:
+        raise StateFormatError("State file checksum mismatch")
+    if flags & ~FLAG_ZLIB:
+        raise StateFormatError(f"Unknown state file flags {flags:#x}")
+    try:
+        if flags & FLAG_ZLIB:
+            payload = zlib.decompress(payload)
+        document = json.loads(payload)
+    except (zlib.error, UnicodeDecodeError, json.JSONDecodeError) as err:
+        raise StateFormatError(f"Invalid state file content: {err}")
+    if not isinstance(document, dict):
+        raise StateFormatError("Invalid state file content: not a document")
+    return _state(_migrate(document, version))
+
+
+# Writes a state file through a temporary file, so a crash never leaves half a state behind
+def write_state_file(file_name: str, content: bytes):
+    tmp_path = file_name + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_name)
+
+
+class _StateUnpickler(pickle.Unpickler):
+    def find_class(self, module: str, name: str):
+        if (module, name) not in _PICKLE_CLASSES:
+            raise StateFormatError(f"Pickled state refers to {module}.{name}")
+        return super().find_class(module, name)
+
+
+# Reads a pickled {"airlines": [...], "tickets": [...]} state file of older versions
+def read_pickle_state(data: bytes) -> dict:
+    try:
+        content = _StateUnpickler(io.BytesIO(data)).load()
+    except StateFormatError:
+        raise
+    except Exception as err:
+        raise StateFormatError(f"Not a state file: {err!r}")
+    if not isinstance(content, dict):
+        raise StateFormatError(f"Pickled state is a {type(content).__name__}, not a dictionary")
+    content.setdefault("airlines", [])
+    content.setdefault("tickets", [])
+    content.setdefault("users", [])
+    content.setdefault("meta", {"journal_seq": content["journal_seq"]} if "journal_seq" in content else {})
+    return content
+
+
+# The file read_state reads for the given name: the file itself or, if a .state file does
+# not exist, the .pickle file of the same name that older versions wrote. None if neither exists.
+def state_file_path(file_name: str) -> Optional[str]:
+    if os.path.exists(file_name):
+        return file_name
+    root, extension = os.path.splitext(file_name)
+    if extension == ".state" and os.path.exists(root + ".pickle"):
+        return root + ".pickle"
+    return None
+
+
+# Reads a state file of any version (see state_file_path): {"airlines": [...],
+# "tickets": [...], "users": [...], "meta": {...}}, or None if the file does not exist
+def read_state(file_name: str) -> Optional[dict]:
+    path = state_file_path(file_name)
+    if path is None:
+        return None
+    with open(path, "rb") as f:
+        data = f.read()
+    if data.startswith(MAGIC):
+        return decode_state(data)
+    return read_pickle_state(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a state file into the current format")
+    parser.add_argument("source")
+    parser.add_argument("target")
+    args = parser.parse_args()
+    content = read_state(args.source)
+    if content is None:
+        raise SystemExit(f"{args.source} does not exist")
+    write_state_file(args.target, encode_state(content["airlines"], content["tickets"], content["meta"],
+                                                    users=content["users"]))
+    print(f"Wrote {len(content['airlines'])} airlines and {len(content['tickets'])} tickets to {args.target}")
+
+
+if __name__ == "__main__":
+    main()
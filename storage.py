@@ -0,0 +1,91 @@
+import threading
+from typing import Callable, List, Optional
+
+from mutation_listener import MutationListener
+from state_format import capture_state, read_state, state_file_path, write_state_file
+
+
+# Base class of the places TicketManager can persist its state to. A backend is also a
+# MutationListener, so backends that write incrementally get every change as it happens.
+class StorageBackend(MutationListener):
+    # Returns True if there is already saved state to load
+    def exists(self) -> bool:
+        raise NotImplementedError
+
+    # Loads the saved state into the manager, returns False if there is nothing to load
+    def load(self, manager) -> bool:
+        raise NotImplementedError
+
+    # Makes the manager's current state durable. The manager holds all its locks during the
+    # call, so a backend may capture the state here and return a function that does the slow
+    # encoding and disk I/O after the locks are released.
+    def save(self, manager) -> Optional[Callable[[], None]]:
+        raise NotImplementedError
+
+    # Overwrites the saved state with the manager's complete current state
+    def reset(self, manager):
+        finish = self.save(manager)
+        if finish is not None:
+            finish()
+
+    # Called before the manager switches to another backend
+    def detach(self, manager):
+        pass
+
+    def close(self):
+        pass
+
+    # Paths of the files the saved state is kept in (some may not exist yet)
+    def files(self, manager) -> List[str]:
+        return []
+
+
+# The original behaviour: save_state writes the whole state into one file (see state_format.py)
+class FileStorage(StorageBackend):
+    def __init__(self, file_name: Optional[str] = None):
+        # None means the manager's FILE_NAME
+        self.file_name: Optional[str] = file_name
+        # Saves finishing out of order must not overwrite a newer file with an older state
+        self._write_lock = threading.Lock()
+        self._generation: int = 0
+        self._written: int = 0
+
+    def _path(self, manager) -> str:
+        return self.file_name if self.file_name is not None else manager.FILE_NAME
+
+    def exists(self) -> bool:
+        return self.file_name is not None and state_file_path(self.file_name) is not None
+
+    def files(self, manager) -> List[str]:
+        path = state_file_path(self._path(manager))
+        return [path] if path is not None else []
+
+    # Raises StateFormatError (and keeps the current state) if the file cannot be read
+    def load(self, manager) -> bool:
+        content = read_state(self._path(manager))
+        if content is None:
+            return False
+        manager.replace_state(content["airlines"], content["tickets"],
+                              idempotency=content["meta"].get("idempotency", ()), users=content["users"])
+        return True
+
+    # State files are only written when the user saves
+    def reset(self, manager):
+        pass
+
+    # Copies the state (see capture_state); encoding and writing the file are left to the
+    # returned function
+    def save(self, manager) -> Callable[[], None]:
+        encode = capture_state(manager.airlines, manager.tickets, {"idempotency": manager.idempotency.entries()},
+                               users=manager.users)
+        path = self._path(manager)
+        self._generation += 1
+        generation = self._generation
+        return lambda: self._write(path, encode(), generation)
+
+    def _write(self, path: str, content: bytes, generation: int):
+        with self._write_lock:
+            if generation < self._written:
+                return
+            write_state_file(path, content)
+            self._written = generation
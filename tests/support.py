@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from airline import AirLine
+from flight_factory import FlightFactory
+from seat_inventory import SeatInventory
+from ticket_manager import BaseTicketManager
+
+
+# A test case with a temporary directory of its own
+class TempDirTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+
+# Fills the manager with two airlines, flights with and without seat map, users and tickets
+def build_schedule(manager: BaseTicketManager) -> BaseTicketManager:
+    factory = FlightFactory()
+    wizz = AirLine("Wizz")
+    manager.add_airline(wizz)
+    w1 = factory.create_flight("domestic", "W1", "Debrecen", 200, 100, SeatInventory([("economy", 2, "AB")]))
+    w2 = factory.create_flight("international", "W2", "London", 1500)
+    manager.add_flight(wizz, w1)
+    manager.add_flight(wizz, w2)
+    malev = AirLine("Malev")
+    manager.add_airline(malev)
+    m1 = factory.create_flight("domestic", "M1", "Szeged", 150, 80)
+    manager.add_flight(malev, m1)
+    alice = manager.register_user("alice", "Alice Able")
+    bob = manager.register_user("bob", "Bob Baker")
+    manager.create_reservation("Alice Able", w1, seat="1A", user_id=alice.user_id)
+    manager.create_reservation("Bob Baker", w1, user_id=bob.user_id)
+    manager.create_reservation("Carol Clark", w2, price=321.5)
+    manager.create_reservation("Alice Able", m1, user_id=alice.user_id, idempotency_key="alice-m1")
+    return manager
+
+
+# The state of a manager as plain values, to compare a state before and after a round trip
+def summary(manager: BaseTicketManager) -> dict:
+    airlines = {}
+    for airline in manager.airlines_view():
+        airlines[airline.name] = sorted(
+            (flight.flight_number, type(flight).__name__, flight.destination, flight.distance, flight.price,
+             sorted(flight.seats.taken_seats()) if flight.seats is not None else None)
+            for flight in airline.iter_flights())
+    tickets = sorted((ticket.ticket_id, ticket.name, ticket.flight.flight_number, ticket.price, ticket.seat,
+                      ticket.user_id) for ticket in manager.iter_tickets())
+    users = sorted((user.user_id, user.user_name, user.real_name) for user in manager.users)
+    return {"airlines": airlines, "tickets": tickets, "users": users}
@@ -0,0 +1,104 @@
+import http.client
+import json
+import threading
+import unittest
+
+from booking_server import BookingApi, make_server
+from ticket_manager import BaseTicketManager
+from tests.support import build_schedule
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.manager = build_schedule(BaseTicketManager())
+        self.api = BookingApi(self.manager)
+        self.addCleanup(self.api.quotes.close)
+
+    def test_items_run_on_their_own(self):
+        results = self.api.batch({"operations": [
+            {"op": "book", "airline": "Malev", "flight_number": "M1", "name": "Dan Dale"},
+            {"op": "cancel", "ticket_id": 3},
+            {"op": "cancel", "ticket_id": 3},
+        ]})
+        self.assertEqual(results[0]["result"]["ticket_id"], 5)
+        self.assertEqual(results[1], {"ok": True, "result": {"ticket_id": 3, "refund": 321.5}})
+        self.assertEqual(results[2], {"ok": False, "error": "Unknown ticket 3"})
+
+    def test_malformed_items_are_reported(self):
+        results = self.api.batch({"operations": [
+            "junk",
+            ["cancel", 1],
+            None,
+            {"ticket_id": 1},
+            {"op": "cancel"},
+            {"op": "cancel", "ticket_id": None},
+            {"op": "cancel", "ticket_id": "x"},
+            {"op": "refund"},
+            {"op": "book", "airline": "Malev", "flight_number": "M1", "name": "Dan Dale", "user_id": []},
+        ]})
+        self.assertEqual(len(results), 9)
+        self.assertTrue(all(not result["ok"] for result in results))
+        self.assertEqual(results[0]["error"], "An operation must be a JSON object")
+        self.assertEqual(results[3]["error"], "Missing field 'op'")
+        self.assertEqual(results[4]["error"], "Missing field 'ticket_id'")
+        self.assertEqual(results[7]["error"], "Unknown operation 'refund'")
+        self.assertEqual(self.manager.count_tickets(), 4)
+
+    def test_operations_must_be_a_list(self):
+        for body in ({"operations": "junk"}, {"operations": {"op": "cancel"}}):
+            with self.assertRaises(ValueError):
+                self.api.batch(body)
+        with self.assertRaises(KeyError):
+            self.api.batch({})
+
+
+class HttpTest(unittest.TestCase):
+    def setUp(self):
+        self.api = BookingApi(build_schedule(BaseTicketManager()))
+        self.addCleanup(self.api.quotes.close)
+        self.server = make_server(port=0, api=self.api)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.connection = http.client.HTTPConnection(*self.server.server_address, timeout=10)
+        self.addCleanup(self.connection.close)
+
+    def request(self, method: str, path: str, body=None, headers=None):
+        self.connection.request(method, path, body, headers or {})
+        response = self.connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_booking_with_idempotency_key(self):
+        body = json.dumps({"airline": "Malev", "flight_number": "M1", "name": "Dan Dale"})
+        status, first = self.request("POST", "/reservations", body, {"Idempotency-Key": "dan"})
+        self.assertEqual(status, 200)
+        status, retry = self.request("POST", "/reservations", body, {"Idempotency-Key": "dan"})
+        self.assertEqual((status, retry), (200, first))
+
+    def test_bodies_that_are_not_objects(self):
+        for path in ("/reservations", "/batch", "/airlines", "/holds", "/users"):
+            for body in ("[1, 2]", '"junk"', "3", "null"):
+                status, answer = self.request("POST", path, body, {"Idempotency-Key": "k"})
+                self.assertEqual(status, 400, (path, body))
+                self.assertEqual(answer, {"error": "The request body must be a JSON object"})
+
+    def test_invalid_json(self):
+        status, answer = self.request("POST", "/airlines", "{bad")
+        self.assertEqual(status, 400)
+        self.assertIn("error", answer)
+
+    def test_batch_with_malformed_items(self):
+        body = json.dumps({"operations": ["junk", {"op": "cancel", "ticket_id": 3}]})
+        status, results = self.request("POST", "/batch", body)
+        self.assertEqual(status, 200)
+        self.assertEqual(results, [{"ok": False, "error": "An operation must be a JSON object"},
+                                   {"ok": True, "result": {"ticket_id": 3, "refund": 321.5}}])
+
+    def test_unknown_ticket(self):
+        status, answer = self.request("DELETE", "/reservations/99")
+        self.assertEqual((status, answer), (404, {"error": "Unknown ticket 99"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
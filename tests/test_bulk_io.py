@@ -0,0 +1,113 @@
+import json
+import random
+import unittest
+
+import bulk_io
+from ticket_manager import BaseTicketManager
+from tests.support import TempDirTestCase, build_schedule
+
+HEADER = "airline,kind,flight_number,destination,distance,price,rows\n"
+
+
+class ImportFlightsTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = BaseTicketManager()
+
+    def write(self, name: str, content) -> str:
+        path = self.path(name)
+        with open(path, "wb") as f:
+            f.write(content if isinstance(content, bytes) else content.encode("utf-8"))
+        return path
+
+    def test_valid_rows(self):
+        path = self.write("flights.csv", HEADER + "Wizz,domestic,W1,Debrecen,200,,2\n"
+                                                  "Wizz,international,W2,London,1500,99.5,\n")
+        report = bulk_io.import_flights(self.manager, path)
+        self.assertEqual((report.rows, report.written, report.failed), (2, 2, 0))
+        w1, w2 = self.manager.get_airline("Wizz").get_flights()
+        self.assertEqual(w1.seats.capacity, 12)
+        self.assertEqual(w2.price, 99.5)
+
+    def test_invalid_rows_are_reported(self):
+        path = self.write("flights.csv", HEADER + "Wizz,domestic,W1,Debrecen,200,,\n"
+                                                  "Wizz,domestic,W1,Szeged,100,,\n"
+                                                  "Wizz,domestic,W3,Szeged,-1,,\n"
+                                                  "Wizz,domestic,W4,Szeged,abc,,\n"
+                                                  "Wizz,domestic,W5,,100,,\n"
+                                                  "Wizz,domestic,W6,Szeged,100,-5,\n")
+        report = bulk_io.import_flights(self.manager, path)
+        self.assertEqual((report.rows, report.written, report.failed), (6, 1, 5))
+        self.assertEqual([row for row, _ in report.errors], [3, 4, 5, 6, 7])
+
+    def test_non_finite_numbers_are_refused(self):
+        path = self.write("flights.csv", HEADER + "Wizz,domestic,W1,Debrecen,nan,,\n"
+                                                  "Wizz,domestic,W2,Debrecen,inf,,\n"
+                                                  "Wizz,domestic,W3,Debrecen,200,nan,\n"
+                                                  "Wizz,domestic,W4,Debrecen,200,inf,\n"
+                                                  "Wizz,domestic,W5,Debrecen,200,,\n")
+        report = bulk_io.import_flights(self.manager, path)
+        self.assertEqual((report.written, report.failed), (1, 4))
+        self.assertEqual({message for _, message in report.errors}, {"Distance and price must be finite numbers"})
+        self.assertEqual([flight.flight_number for flight in self.manager.search_flights(max_price=1e9)], ["W5"])
+
+    def test_non_finite_numbers_in_json_lines(self):
+        row = {"airline": "Wizz", "kind": "domestic", "flight_number": "W1", "destination": "Debrecen"}
+        path = self.write("flights.jsonl", json.dumps(dict(row, distance=float("nan"))) + "\n" +
+                          json.dumps(dict(row, distance=200, price=float("inf"))) + "\n")
+        report = bulk_io.import_flights(self.manager, path)
+        self.assertEqual((report.written, report.failed), (0, 2))
+
+    def test_undecodable_rows_are_reported(self):
+        path = self.write("flights.csv", HEADER.encode() + b"Wizz,domestic,W\xff1,Debrecen,200,,\n"
+                                                           b"Wizz,domestic,W2,Debrecen,200,,\n")
+        report = bulk_io.import_flights(self.manager, path)
+        self.assertEqual((report.written, report.failed), (1, 1))
+        self.assertEqual(report.errors, [(2, "Invalid text: byte 0xff is not UTF-8")])
+        path = self.write("flights.jsonl", b'{"airline": "Wizz", "kind": "domestic", "flight_number": "W3", '
+                                           b'"destination": "Debrecen", "distance": 200}\n\xfe\xfe\n')
+        report = bulk_io.import_flights(self.manager, path)
+        self.assertEqual((report.written, report.failed), (1, 1))
+
+    def test_random_bytes(self):
+        path = self.write("flights.csv", random.Random(1).randbytes(4096))
+        try:
+            report = bulk_io.import_flights(self.manager, path)
+        except ValueError:
+            pass
+        else:
+            self.assertEqual(report.written, 0)
+        self.assertEqual(list(self.manager.iter_flights()), [])
+
+    def test_undecodable_header_is_refused(self):
+        path = self.write("flights.csv", b"air\xffline,kind\nWizz,domestic\n")
+        with self.assertRaisesRegex(ValueError, "Invalid header"):
+            bulk_io.import_flights(self.manager, path)
+
+
+class ExportTest(TempDirTestCase):
+    def test_flights_round_trip(self):
+        source = build_schedule(BaseTicketManager())
+        for name in ("flights.csv", "flights.jsonl"):
+            path = self.path(name)
+            self.assertEqual(bulk_io.export_flights(source, path).rows, 3)
+            manager = BaseTicketManager()
+            report = bulk_io.import_flights(manager, path)
+            self.assertEqual((report.written, report.failed), (3, 0))
+            self.assertEqual(sorted((airline.name, flight.flight_number, flight.price)
+                                    for airline, flight in manager.iter_flights()),
+                             sorted((airline.name, flight.flight_number, flight.price)
+                                    for airline, flight in source.iter_flights()))
+
+    def test_tickets(self):
+        source = build_schedule(BaseTicketManager())
+        path = self.path("tickets.jsonl")
+        self.assertEqual(bulk_io.export_tickets(source, path).rows, 4)
+        with open(path) as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual([row["ticket_id"] for row in rows], [1, 2, 3, 4])
+        self.assertEqual(rows[0]["airline"], "Wizz")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+from fare_quotes import DynamicPricing, FareQuoter
+from ticket_manager import BaseTicketManager
+from tests.support import build_schedule
+
+
+class DynamicPricingTest(unittest.TestCase):
+    def test_price(self):
+        manager = build_schedule(BaseTicketManager())
+        w1, w2 = manager.get_airline("Wizz").get_flights()
+        pricing = DynamicPricing()
+        self.assertEqual(pricing.load_factor(w1), 0.5)
+        self.assertEqual(pricing.price(w1, 30), 125)
+        self.assertEqual(pricing.price(w1, 0), 175)
+        self.assertEqual(pricing.price(w2, 30, demand=10), w2.price * 3)
+        with self.assertRaises(ValueError):
+            pricing.price(w1, -1)
+        with self.assertRaises(ValueError):
+            pricing.price(w1, 30, demand=0)
+
+
+class FareQuoterTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.manager = build_schedule(BaseTicketManager())
+        self.wizz = self.manager.get_airline("Wizz")
+        self.w1, self.w2 = self.wizz.get_flights()
+        self.quoter = FareQuoter(self.manager, ttl=60, max_entries=3, clock=lambda: self.now)
+        self.addCleanup(self.quoter.close)
+
+    def test_cache(self):
+        self.assertEqual(self.quoter.quote(self.w1, 30), 125)
+        self.assertEqual(self.quoter.quote(self.w1, 30), 125)
+        self.assertEqual((self.quoter.hits, self.quoter.misses), (1, 1))
+        self.now += 61
+        self.quoter.quote(self.w1, 30)
+        self.assertEqual(self.quoter.misses, 2)
+
+    def test_hold_release_and_booking_invalidate(self):
+        self.assertEqual(self.quoter.quote(self.w1, 30), 125)
+        hold = self.manager.hold_seat("Dan Dale", self.w1)
+        self.assertEqual(self.quoter.quote(self.w1, 30), 156.25)
+        self.manager.release_hold(hold.hold_id)
+        self.assertEqual(self.quoter.quote(self.w1, 30), 125)
+        self.assertEqual(self.quoter.book("Dan Dale", self.w1, 30), 125)
+        self.assertEqual(self.quoter.quote(self.w1, 30), 156.25)
+        self.assertEqual(self.quoter.hits, 1)
+
+    def test_price_change_invalidates(self):
+        self.quoter.quote(self.w1, 30)
+        self.manager.change_flight_price(self.wizz, self.w1, 200)
+        self.assertEqual(self.quoter.quote(self.w1, 30), 250)
+
+    def test_least_recently_used_are_pushed_out(self):
+        for days in (30, 31, 32, 33):
+            self.quoter.quote(self.w1, days)
+        self.assertEqual(len(self.quoter), 3)
+        self.quoter.quote(self.w1, 30)
+        self.assertEqual(self.quoter.hits, 0)
+
+    def test_removed_flight_entries_are_dropped(self):
+        self.quoter.quote(self.w1, 30)
+        self.quoter.quote(self.w1, 31)
+        self.quoter.quote(self.w2, 30)
+        self.manager.remove_flight_cascade(self.wizz, self.w1)
+        self.assertEqual(len(self.quoter), 1)
+        self.assertEqual(list(self.quoter._keys), [self.w2])
+
+    def test_state_replaced_clears(self):
+        self.quoter.quote(self.w1, 30)
+        self.manager.replace_state(list(self.manager.airlines), list(self.manager.tickets))
+        self.assertEqual(len(self.quoter), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+from ticket_manager import BaseTicketManager
+from tests.support import build_schedule
+
+
+class HoldTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.manager = BaseTicketManager()
+        self.manager.holds.clock = lambda: self.now
+        build_schedule(self.manager)
+        self.w1 = self.manager.get_airline("Wizz").get_flights()[0]
+        self.manager.remove_ticket_by_id(2)
+
+    def test_confirm(self):
+        hold = self.manager.hold_seat("Dan Dale", self.w1, seat="2A", price=90, ttl=60)
+        self.assertEqual(self.w1.seats.available(), 2)
+        ticket = self.manager.confirm_hold(hold.hold_id)
+        self.assertEqual((ticket.name, ticket.seat, ticket.price), ("Dan Dale", "2A", 90))
+        self.assertIs(self.manager.get_ticket(ticket.ticket_id), ticket)
+        self.assertIsNone(self.manager.get_hold(hold.hold_id))
+        with self.assertRaises(ValueError):
+            self.manager.confirm_hold(hold.hold_id)
+
+    def test_release(self):
+        hold = self.manager.hold_seat("Dan Dale", self.w1, seat="2A")
+        self.manager.release_hold(hold.hold_id)
+        self.assertEqual(self.w1.seats.available(), 3)
+        with self.assertRaises(ValueError):
+            self.manager.confirm_hold(hold.hold_id)
+
+    def test_expiry(self):
+        hold = self.manager.hold_seat("Dan Dale", self.w1, ttl=60)
+        self.now += 61
+        self.assertEqual(self.manager.expire_holds(), 1)
+        self.assertEqual(self.w1.seats.available(), 3)
+        with self.assertRaises(ValueError):
+            self.manager.confirm_hold(hold.hold_id)
+
+    def test_held_seat_cannot_be_booked(self):
+        self.manager.hold_seat("Dan Dale", self.w1, seat="2A")
+        with self.assertRaises(ValueError):
+            self.manager.create_reservation("Eve Ellis", self.w1, seat="2A")
+
+    def test_confirm_with_used_key_returns_the_first_ticket(self):
+        first = self.manager.confirm_hold(self.manager.hold_seat("Dan Dale", self.w1).hold_id, "dan")
+        second = self.manager.confirm_hold(self.manager.hold_seat("Dan Dale", self.w1).hold_id, "dan")
+        self.assertIs(second, first)
+        self.assertEqual(self.manager.count_tickets(), 4)
+        self.assertEqual(self.w1.seats.available(), 2)
+
+    def test_confirm_with_key_of_cancelled_booking(self):
+        first = self.manager.confirm_hold(self.manager.hold_seat("Dan Dale", self.w1).hold_id, "dan")
+        self.manager.remove_ticket_by_id(first.ticket_id)
+        hold = self.manager.hold_seat("Dan Dale", self.w1)
+        with self.assertRaisesRegex(ValueError, "cancelled"):
+            self.manager.confirm_hold(hold.hold_id, "dan")
+        self.assertEqual(self.w1.seats.available(), 3)
+
+    def test_replace_state_releases_holds(self):
+        self.manager.hold_seat("Dan Dale", self.w1, seat="2A")
+        self.manager.replace_state(list(self.manager.airlines), list(self.manager.tickets))
+        self.assertEqual(len(self.manager.holds), 0)
+        self.assertEqual(self.w1.seats.available(), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
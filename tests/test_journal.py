@@ -0,0 +1,68 @@
+import os
+import unittest
+
+from journal import Journal
+from ticket_manager import BaseTicketManager
+from tests.support import TempDirTestCase, build_schedule, summary
+
+
+class JournalTest(TempDirTestCase):
+    def journal(self) -> Journal:
+        return Journal(self.path("tickets.journal"), self.path("tickets.state"), fsync=False)
+
+    def manager(self) -> BaseTicketManager:
+        manager = BaseTicketManager()
+        manager.use_storage(self.journal())
+        self.addCleanup(manager.storage.close)
+        return manager
+
+    def test_replay(self):
+        manager = build_schedule(self.manager())
+        wizz = manager.get_airline("Wizz")
+        w1, w2 = wizz.get_flights()
+        manager.change_flight_price(wizz, w1, 150)
+        manager.remove_ticket_by_id(2)
+        manager.remove_flight_cascade(wizz, w2)
+        manager.register_user("carol", "Carol Clark")
+        self.assertEqual(summary(self.manager()), summary(manager))
+
+    def test_replay_after_compaction(self):
+        manager = build_schedule(self.manager())
+        manager.storage.compact(manager)
+        self.assertEqual(os.path.getsize(self.path("tickets.journal")), 0)
+        malev = manager.get_airline("Malev")
+        manager.create_reservation("Dan Dale", malev.get_flights()[0])
+        manager.remove_airline_cascade(manager.get_airline("Wizz"))
+        loaded = self.manager()
+        self.assertEqual(summary(loaded), summary(manager))
+        self.assertEqual(loaded.get_ticket_by_key("alice-m1").ticket_id, 4)
+
+    def test_torn_tail_is_cut_off(self):
+        manager = build_schedule(self.manager())
+        manager.storage.close()
+        expected = summary(manager)
+        with open(self.path("tickets.journal"), "ab") as f:
+            f.write(b"\x10\x00\x00\x00partial")
+        self.assertEqual(summary(self.manager()), expected)
+        self.assertEqual(summary(self.manager()), expected)
+
+    # A hold confirmed after a compaction: the snapshot must not have its seat already
+    def test_hold_confirmed_after_compaction(self):
+        manager = build_schedule(self.manager())
+        w1 = manager.get_airline("Wizz").get_flights()[0]
+        manager.remove_ticket_by_id(2)
+        hold = manager.hold_seat("Dan Dale", w1, seat="2B")
+        manager.storage.compact(manager)
+        manager.confirm_hold(hold.hold_id)
+        loaded = self.manager()
+        self.assertEqual(summary(loaded), summary(manager))
+        self.assertEqual(sorted(loaded.get_airline("Wizz").get_flights()[0].seats.taken_seats()), ["1A", "2B"])
+
+    def test_empty(self):
+        self.assertFalse(self.journal().exists())
+        manager = self.manager()
+        self.assertEqual(manager.count_tickets(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
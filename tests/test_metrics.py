@@ -0,0 +1,75 @@
+import unittest
+
+import metrics
+from journal import Journal
+from ticket_manager import BaseTicketManager
+from tests.support import TempDirTestCase, build_schedule
+
+
+class MetricsTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.registry = metrics.enable_metrics()
+        self.addCleanup(metrics.disable_metrics)
+
+    def value(self, name: str):
+        return self.registry.values()[name]
+
+    def test_bookings_and_cancellations(self):
+        manager = build_schedule(BaseTicketManager())
+        manager.remove_ticket_by_id(1)
+        manager.remove_ticket_by_ticket_object(manager.get_ticket(2))
+        with self.assertRaises(ValueError):
+            manager.remove_ticket_by_id(99)
+        self.assertEqual(self.value("tickets_bookings_total"), 4)
+        self.assertEqual(self.value("tickets_cancellations_total"), 3)
+        self.assertEqual(self.value("tickets_cancellation_errors_total"), 1)
+        self.assertEqual(self.value("tickets_flights_created_total"), 3)
+
+    def test_searches(self):
+        manager = build_schedule(BaseTicketManager())
+        manager.search_flights(max_price=1000)
+        self.assertEqual(self.value("tickets_searches_total"), 1)
+        self.assertNotIn("tickets_searchs_total", self.registry.values())
+
+    def test_cascade(self):
+        manager = build_schedule(BaseTicketManager())
+        wizz = manager.get_airline("Wizz")
+        manager.remove_flight_cascade(wizz, wizz.get_flights()[1])
+        manager.remove_airline_cascade(wizz)
+        self.assertEqual(self.value("tickets_removals_total"), 2)
+        self.assertEqual(self.value("tickets_removed_with_flight_total"), 3)
+        self.assertEqual(self.value("tickets_cancellations_total"), 0)
+
+    def test_journal_replay_is_not_counted(self):
+        journal_path, snapshot_path = self.path("tickets.journal"), self.path("tickets.state")
+        manager = BaseTicketManager()
+        manager.use_storage(Journal(journal_path, snapshot_path, fsync=False))
+        self.addCleanup(manager.storage.close)
+        build_schedule(manager)
+        manager.remove_ticket_by_id(3)
+        bookings, cancellations = self.value("tickets_bookings_total"), self.value("tickets_cancellations_total")
+        loaded = BaseTicketManager()
+        loaded.use_storage(Journal(journal_path, snapshot_path, fsync=False))
+        self.addCleanup(loaded.storage.close)
+        self.assertEqual(loaded.count_tickets(), 3)
+        self.assertEqual(self.value("tickets_bookings_total"), bookings)
+        self.assertEqual(self.value("tickets_cancellations_total"), cancellations)
+
+    def test_prometheus_text(self):
+        build_schedule(BaseTicketManager())
+        text = self.registry.prometheus_text()
+        self.assertIn("tickets_bookings_total 4\n", text)
+        self.assertIn('tickets_booking_seconds_bucket{le="+Inf"} 4\n', text)
+
+    def test_disable_restores_the_methods(self):
+        wrapped = BaseTicketManager.create_reservation
+        metrics.disable_metrics()
+        self.assertIsNot(BaseTicketManager.create_reservation, wrapped)
+        self.assertIsNone(metrics.registry)
+        build_schedule(BaseTicketManager())
+        self.assertEqual(self.registry.values()["tickets_bookings_total"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
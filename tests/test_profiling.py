@@ -0,0 +1,77 @@
+import logging
+import time
+import types
+import unittest
+
+import profiling
+from ticket_manager import BaseTicketManager
+from tests.support import build_schedule
+
+
+# Keeps the records of the slow-operation log
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def _prompt():
+    with profiling.waiting():
+        time.sleep(0.2)
+    return "1"
+
+
+def _busy():
+    time.sleep(0.1)
+
+
+class ProfilingTest(unittest.TestCase):
+    def setUp(self):
+        self.log = ListHandler()
+        logger = logging.getLogger("tests.slow")
+        logger.addHandler(self.log)
+        self.addCleanup(logger.removeHandler, self.log)
+        self.console = types.ModuleType("console")
+        self.console.prompt, self.console.busy = _prompt, _busy
+        self.profiler = profiling.enable_profiling(0.05, 0.005, logger,
+                                                   extra_functions=[(self.console, "prompt"),
+                                                                    (self.console, "busy")])
+        self.addCleanup(profiling.disable_profiling)
+
+    def test_managers_are_measured(self):
+        build_schedule(BaseTicketManager())
+        stats = self.profiler.stats
+        self.assertEqual(stats["BaseTicketManager.create_reservation"].count, 4)
+        self.assertNotIn("BaseTicketManager._remove_ticket", stats)
+
+    def test_waiting_is_not_counted(self):
+        self.assertEqual(self.console.prompt(), "1")
+        stats = self.profiler.stats["console.prompt"]
+        self.assertEqual((stats.count, stats.slow), (1, 0))
+        self.assertLess(stats.total, 0.05)
+        self.assertEqual(self.log.messages, [])
+
+    def test_slow_calls_are_logged_and_sampled(self):
+        self.console.busy()
+        self.assertEqual(self.profiler.stats["console.busy"].slow, 1)
+        self.assertEqual(len(self.log.messages), 1)
+        self.assertTrue(self.log.messages[0].startswith("Slow console.busy: "))
+        self.assertIn("console.busy;", self.profiler.collapsed())
+        self.assertIn("console.busy", self.profiler.report())
+
+    def test_disable_restores_the_functions(self):
+        self.assertIsNot(self.console.busy, _busy)
+        self.assertIs(profiling.enable_profiling(extra_functions=[(self.console, "busy")]), self.profiler)
+        profiling.disable_profiling()
+        self.assertIs(self.console.prompt, _prompt)
+        self.assertIs(self.console.busy, _busy)
+        self.assertIsNone(profiling.profiler)
+        with profiling.waiting():
+            pass
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+from ticket_manager import BaseTicketManager
+from tests.support import build_schedule
+
+
+class CascadeTest(unittest.TestCase):
+    def setUp(self):
+        self.manager = build_schedule(BaseTicketManager())
+        self.wizz = self.manager.get_airline("Wizz")
+        self.w1, self.w2 = self.wizz.get_flights()
+
+    def test_flight(self):
+        report = self.manager.remove_flight_cascade(self.wizz, self.w1)
+        self.assertEqual((report.airlines, report.flights, report.refund), (0, 1, 200))
+        self.assertEqual(sorted(ticket.ticket_id for ticket in report.tickets), [1, 2])
+        self.assertEqual(self.wizz.get_flights(), [self.w2])
+        self.assertEqual(sorted(ticket.ticket_id for ticket in self.manager.iter_tickets()), [3, 4])
+        alice = self.manager.find_user("alice")
+        self.assertEqual([ticket.ticket_id for ticket in self.manager.get_tickets_for_user(alice.user_id)], [4])
+
+    def test_airline(self):
+        report = self.manager.remove_airline_cascade(self.wizz)
+        self.assertEqual((report.airlines, report.flights, len(report.tickets), report.refund), (1, 2, 3, 521.5))
+        self.assertIsNone(self.manager.get_airline("Wizz"))
+        self.assertEqual([ticket.ticket_id for ticket in self.manager.iter_tickets()], [4])
+        self.assertEqual(str(report), "Removed 1 airline(s), 2 flight(s) and 3 reservation(s), refund 521.5")
+
+    def test_unknown_flight(self):
+        malev = self.manager.get_airline("Malev")
+        with self.assertRaisesRegex(ValueError, "Unknown flight"):
+            self.manager.remove_flight_cascade(malev, self.w1)
+        self.manager.remove_flight_cascade(self.wizz, self.w1)
+        with self.assertRaisesRegex(ValueError, "Unknown flight"):
+            self.manager.remove_flight_cascade(self.wizz, self.w1)
+        self.assertEqual(self.manager.count_tickets(), 2)
+
+    def test_unknown_airline(self):
+        self.manager.remove_airline_cascade(self.wizz)
+        with self.assertRaisesRegex(ValueError, "Unknown airline"):
+            self.manager.remove_airline_cascade(self.wizz)
+
+
+if __name__ == "__main__":
+    unittest.main()
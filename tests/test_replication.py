@@ -0,0 +1,48 @@
+import unittest
+
+from replication import ReplicationFollower, ReplicationLeader
+from ticket_manager import BaseTicketManager
+from tests.support import build_schedule, summary
+
+TIMEOUT = 10.0
+
+
+class ReplicationTest(unittest.TestCase):
+    def setUp(self):
+        self.leader_manager = build_schedule(BaseTicketManager())
+        self.leader = ReplicationLeader(self.leader_manager)
+        self.addCleanup(self.leader.close)
+        self.follower_manager = BaseTicketManager()
+        self.follower = ReplicationFollower(self.follower_manager, self.leader.address)
+        self.addCleanup(self.follower.close)
+
+    def wait(self):
+        self.assertTrue(self.follower.wait_for(self.leader.seq, TIMEOUT))
+
+    def test_follower_gets_state_and_changes(self):
+        self.wait()
+        self.assertEqual(summary(self.follower_manager), summary(self.leader_manager))
+        wizz = self.leader_manager.get_airline("Wizz")
+        w1, w2 = wizz.get_flights()
+        self.leader_manager.change_flight_price(wizz, w1, 150)
+        self.leader_manager.remove_ticket_by_id(2)
+        self.leader_manager.remove_flight_cascade(wizz, w2)
+        self.leader_manager.register_user("carol", "Carol Clark")
+        self.wait()
+        self.assertEqual(summary(self.follower_manager), summary(self.leader_manager))
+
+    def test_follower_is_read_only(self):
+        self.wait()
+        malev = self.follower_manager.get_airline("Malev")
+        with self.assertRaisesRegex(ValueError, "read-only"):
+            self.follower_manager.create_reservation("Dan Dale", malev.get_flights()[0])
+
+    def test_follower_is_writable_after_close(self):
+        self.wait()
+        self.follower.close()
+        malev = self.follower_manager.get_airline("Malev")
+        self.assertEqual(self.follower_manager.create_reservation("Dan Dale", malev.get_flights()[0]), 80)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+
+from booking_server import ShardedBookingApi
+from sharding import ShardedTicketManager
+from state_format import encode_state, write_state_file
+from ticket_manager import BaseTicketManager
+from tests.support import TempDirTestCase, build_schedule
+
+
+class ShardedTestCase(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        source = build_schedule(BaseTicketManager())
+        self.state_file = self.path("default.state")
+        write_state_file(self.state_file, encode_state(source.airlines, source.tickets,
+                                                       {"idempotency": source.idempotency.entries()},
+                                                       users=source.users))
+        self.shard_files = self.path("shard{}.state")
+
+
+class ShardedTicketManagerTest(ShardedTestCase):
+    def manager(self) -> ShardedTicketManager:
+        manager = ShardedTicketManager(2, self.shard_files)
+        manager.load_state(self.state_file)
+        return manager
+
+    def test_state_is_split_by_airline(self):
+        manager = self.manager()
+        self.assertEqual(sorted(ticket.ticket_id for ticket in manager.iter_tickets()), [1, 2, 3, 4])
+        self.assertEqual(manager.get_ticket(3).name, "Carol Clark")
+        for shard in manager.shards:
+            self.assertEqual(sorted(user.user_name for user in shard.users), ["alice", "bob"])
+            for airline in shard.airlines:
+                self.assertIs(manager.shard_for(airline.name), shard)
+
+    def test_save_and_load(self):
+        manager = self.manager()
+        malev = manager.get_airline("Malev")
+        price = manager.create_reservation("Dan Dale", malev.get_flights()[0])
+        manager.remove_ticket_by_id(2)
+        manager.save_state()
+        loaded = ShardedTicketManager(2, self.shard_files)
+        self.assertEqual(sorted((ticket.ticket_id, ticket.name) for ticket in loaded.iter_tickets()),
+                         sorted((ticket.ticket_id, ticket.name) for ticket in manager.iter_tickets()))
+        self.assertEqual(price, 80)
+
+    def test_cascade(self):
+        manager = self.manager()
+        report = manager.remove_airline_cascade(manager.get_airline("Wizz"))
+        self.assertEqual((report.airlines, report.flights, report.refund), (1, 2, 521.5))
+        self.assertEqual(sorted(ticket.ticket_id for ticket in manager.iter_tickets()), [4])
+
+
+class ShardedBookingApiTest(ShardedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.api = ShardedBookingApi(2, self.shard_files, self.state_file)
+        self.addCleanup(self.api.close)
+
+    def test_malformed_items_are_reported(self):
+        results = self.api.batch({"operations": [
+            "junk",
+            {"op": "cancel", "ticket_id": 3},
+            None,
+            {"op": "cancel"},
+            {"op": "cancel", "ticket_id": 99},
+            {"op": "refund"},
+        ]})
+        self.assertEqual(results, [
+            {"ok": False, "error": "An operation must be a JSON object"},
+            {"ok": True, "result": {"ticket_id": 3, "refund": 321.5}},
+            {"ok": False, "error": "An operation must be a JSON object"},
+            {"ok": False, "error": "Missing field 'ticket_id'"},
+            {"ok": False, "error": "Unknown ticket 99"},
+            {"ok": False, "error": "Unknown operation 'refund'"},
+        ])
+
+    def test_every_ticket_can_be_cancelled(self):
+        results = self.api.batch({"operations": [{"op": "cancel", "ticket_id": ticket_id}
+                                                 for ticket_id in (1, 2, 3, 4)]})
+        self.assertTrue(all(result["ok"] for result in results), results)
+
+    def test_operations_must_be_a_list(self):
+        with self.assertRaises(ValueError):
+            self.api.batch({"operations": "junk"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+import snapshot
+from ticket_manager import BaseTicketManager
+from tests.support import TempDirTestCase, build_schedule, summary
+
+
+class SnapshotTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = build_schedule(BaseTicketManager())
+        self.file_name = self.path("tickets.snap")
+        snapshot.write_snapshot(self.file_name, self.manager.airlines, self.manager.tickets, self.manager.users)
+
+    def load(self) -> BaseTicketManager:
+        loaded = BaseTicketManager()
+        self.assertTrue(loaded.load_state(self.file_name))
+        return loaded
+
+    def test_round_trip(self):
+        self.assertTrue(snapshot.is_snapshot(self.file_name))
+        self.assertEqual(summary(self.load()), summary(self.manager))
+
+    def test_lookups(self):
+        loaded = self.load()
+        self.assertEqual(loaded.get_ticket(3).name, "Carol Clark")
+        self.assertIsNone(loaded.get_ticket(99))
+        self.assertEqual([ticket.ticket_id for ticket in loaded.get_tickets_for_passenger("Alice Able")], [1, 4])
+        alice = loaded.find_user("alice")
+        self.assertEqual([ticket.ticket_id for ticket in loaded.get_tickets_for_user(alice.user_id)], [1, 4])
+        self.assertEqual(loaded.get_tickets_for_user(99), [])
+
+    def test_changes_after_load(self):
+        loaded = self.load()
+        loaded.remove_ticket_by_id(1)
+        alice = loaded.find_user("alice")
+        malev = loaded.get_airline("Malev")
+        loaded.create_reservation("Alice Able", malev.get_flights()[0], user_id=alice.user_id)
+        self.assertEqual([ticket.ticket_id for ticket in loaded.get_tickets_for_user(alice.user_id)], [4, 5])
+        self.assertEqual(loaded.register_user("carol", "Carol Clark").user_id, 3)
+        w1 = loaded.get_airline("Wizz").get_flights()[0]
+        self.assertEqual(loaded.create_reservation("Dan Dale", w1, seat="1A"), 100)
+
+    def test_not_a_snapshot(self):
+        with open(self.path("other"), "wb") as f:
+            f.write(b"something else entirely")
+        self.assertFalse(snapshot.is_snapshot(self.path("other")))
+        with self.assertRaises(ValueError):
+            snapshot.MappedSnapshot(self.path("other"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from sqlite_storage import SQLiteStorage
+from ticket_manager import BaseTicketManager
+from tests.support import TempDirTestCase, build_schedule, summary
+
+
+class SQLiteStorageTest(TempDirTestCase):
+    def manager(self) -> BaseTicketManager:
+        manager = BaseTicketManager()
+        manager.use_storage(SQLiteStorage(self.path("tickets.sqlite3")))
+        self.addCleanup(manager.storage.close)
+        return manager
+
+    def test_changes_are_stored(self):
+        manager = build_schedule(self.manager())
+        wizz = manager.get_airline("Wizz")
+        w1, w2 = wizz.get_flights()
+        manager.change_flight_price(wizz, w1, 150)
+        manager.remove_ticket_by_id(2)
+        manager.remove_flight_cascade(wizz, w2)
+        manager.register_user("carol", "Carol Clark")
+        manager.save_state()
+        loaded = self.manager()
+        self.assertEqual(summary(loaded), summary(manager))
+        self.assertEqual(loaded.get_ticket_by_key("alice-m1").ticket_id, 4)
+
+    def test_existing_state_is_written_on_switch(self):
+        manager = build_schedule(BaseTicketManager())
+        manager.use_storage(SQLiteStorage(self.path("tickets.sqlite3")))
+        manager.storage.close()
+        self.assertEqual(summary(self.manager()), summary(manager))
+
+    def test_indexed_queries(self):
+        build_schedule(self.manager()).save_state()
+        loaded = self.manager()
+        alice = loaded.find_user("alice")
+        self.assertEqual([ticket.ticket_id for ticket in loaded.get_tickets_for_user(alice.user_id)], [1, 4])
+        self.assertEqual([ticket.ticket_id for ticket in loaded.get_tickets_for_passenger("Alice Able")], [1, 4])
+        w1 = loaded.get_airline("Wizz").get_flights()[0]
+        self.assertEqual([ticket.ticket_id for ticket in loaded.get_tickets_for_flight(w1)], [1, 2])
+        self.assertIsNone(loaded.get_ticket(99))
+
+    def test_booked_seats_are_taken_after_load(self):
+        build_schedule(self.manager()).save_state()
+        loaded = self.manager()
+        w1 = loaded.get_airline("Wizz").get_flights()[0]
+        with self.assertRaises(ValueError):
+            loaded.create_reservation("Dan Dale", w1, seat="1A")
+        self.assertEqual(loaded.create_reservation("Dan Dale", w1, seat="2A"), 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import json
+import pickle
+import struct
+import unittest
+import zlib
+
+import state_format
+from state_format import StateFormatError, decode_state, encode_state, read_pickle_state, read_state
+from storage import FileStorage
+from ticket_manager import BaseTicketManager
+from tests.support import TempDirTestCase, build_schedule, summary
+
+
+# A version 1 state file: tickets without user column, no users table
+def _version_1_file(manager: BaseTicketManager) -> bytes:
+    document = state_format._document(manager.airlines, manager.tickets, {"journal_seq": 7})
+    del document["tickets"]["user"]
+    del document["users"]
+    payload = zlib.compress(json.dumps(document).encode("utf-8"))
+    return state_format._HEADER.pack(state_format.MAGIC, 1, state_format.FLAG_ZLIB, zlib.crc32(payload),
+                                     len(payload)) + payload
+
+
+def _load(content: dict) -> BaseTicketManager:
+    manager = BaseTicketManager()
+    manager.replace_state(content["airlines"], content["tickets"],
+                          idempotency=content["meta"].get("idempotency", ()), users=content["users"])
+    return manager
+
+
+class EncodeDecodeTest(unittest.TestCase):
+    def test_round_trip(self):
+        manager = build_schedule(BaseTicketManager())
+        content = decode_state(encode_state(manager.airlines, manager.tickets, {"journal_seq": 3},
+                                            users=manager.users))
+        self.assertEqual(content["meta"], {"journal_seq": 3})
+        self.assertEqual(summary(_load(content)), summary(manager))
+
+    def test_uncompressed_round_trip(self):
+        manager = build_schedule(BaseTicketManager())
+        data = encode_state(manager.airlines, manager.tickets, compress=False, users=manager.users)
+        self.assertEqual(summary(_load(decode_state(data))), summary(manager))
+
+    def test_capture_is_not_changed_by_later_changes(self):
+        manager = build_schedule(BaseTicketManager())
+        expected = summary(manager)
+        encode = state_format.capture_state(manager.airlines, manager.tickets, users=manager.users)
+        wizz = manager.get_airline("Wizz")
+        manager.change_flight_price(wizz, wizz.get_flights()[0], 999)
+        manager.remove_ticket_by_id(3)
+        manager.register_user("carol", "Carol Clark")
+        self.assertEqual(summary(_load(decode_state(encode()))), expected)
+
+    def test_version_1_is_migrated(self):
+        manager = build_schedule(BaseTicketManager())
+        content = decode_state(_version_1_file(manager))
+        self.assertEqual(content["users"], [])
+        self.assertEqual(content["meta"], {"journal_seq": 7})
+        self.assertTrue(all(ticket.user_id is None for ticket in content["tickets"]))
+        loaded = _load(content)
+        expected = summary(manager)
+        expected["tickets"] = [ticket[:5] + (None,) for ticket in expected["tickets"]]
+        expected["users"] = []
+        self.assertEqual(summary(loaded), expected)
+
+    def test_newer_version_is_refused(self):
+        data = bytearray(encode_state([], []))
+        struct.pack_into("<H", data, 8, state_format.VERSION + 1)
+        with self.assertRaisesRegex(StateFormatError, "newer"):
+            decode_state(bytes(data))
+
+    def test_damaged_files_are_refused(self):
+        manager = build_schedule(BaseTicketManager())
+        data = encode_state(manager.airlines, manager.tickets, users=manager.users)
+        damaged = data[:-1] + bytes([data[-1] ^ 1])
+        for bad in (b"", b"TKTSTATE", data[:-5], damaged, b"not a state file at all"):
+            with self.assertRaises(StateFormatError):
+                decode_state(bad)
+
+    def test_pickle_with_foreign_classes_is_refused(self):
+        with self.assertRaises(StateFormatError):
+            read_pickle_state(pickle.dumps({"airlines": [], "tickets": [], "other": unittest.TestCase}))
+
+
+class FileStorageTest(TempDirTestCase):
+    def test_save_and_load(self):
+        path = self.path("tickets.state")
+        manager = build_schedule(BaseTicketManager())
+        manager.use_storage(FileStorage(path))
+        manager.save_state()
+        loaded = BaseTicketManager()
+        loaded.use_storage(FileStorage(path))
+        self.assertEqual(summary(loaded), summary(manager))
+        self.assertEqual(loaded.get_ticket_by_key("alice-m1").ticket_id, 4)
+        self.assertEqual(loaded.register_user("dave", "Dave Dean").user_id, 3)
+
+    def test_open_holds_are_not_saved(self):
+        path = self.path("tickets.state")
+        manager = BaseTicketManager()
+        build_schedule(manager)
+        wizz = manager.get_airline("Wizz")
+        w1 = wizz.get_flights()[0]
+        manager.remove_ticket_by_id(2)
+        manager.hold_seat("Dan Dale", w1, seat="2A")
+        manager.use_storage(FileStorage(path))
+        manager.save_state()
+        content = read_state(path)
+        flight = content["airlines"][0].get_flights()[0]
+        self.assertEqual(flight.seats.taken_seats(), ["1A"])
+
+    def test_old_pickle_file_is_read(self):
+        manager = build_schedule(BaseTicketManager())
+        with open(self.path("tickets.pickle"), "wb") as f:
+            pickle.dump({"airlines": list(manager.airlines), "tickets": list(manager.tickets)}, f)
+        content = read_state(self.path("tickets.state"))
+        self.assertEqual(len(content["tickets"]), 4)
+        self.assertEqual(content["users"], [])
+
+    def test_missing_file(self):
+        self.assertIsNone(read_state(self.path("missing.state")))
+        self.assertFalse(BaseTicketManager().load_state(self.path("missing.state")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,25 +1,143 @@
-from typing import List, Dict
-import pickle
+from contextlib import ExitStack, contextmanager
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+import threading
 
 import metaclasses
+import snapshot
 from airline import AirLine
+from compact_store import CompactReservationStore
 from flight import Flight
+from flight_search import FlightSearchIndex
+from holds import HoldTable, SeatHold
+from idempotency import IdempotencyTable
+from mutation_listener import MutationListener
+from reservation_store import ReservationStore
+from state_format import read_state
+from storage import StorageBackend, FileStorage
 from ticket_reservation import TicketReservation
+from user import User
+from user_registry import UserRegistry
+from views import ListView
 
 
-# The TicketManager handles all airlines, flights, and ticket reservations.
-# It uses the Singleton metaclass to ensure only one instance exists.
-class TicketManager(metaclass=metaclasses.Singleton):
+# What a cascading removal (remove_flight_cascade, remove_airline_cascade) took away:
+# the numbers of airlines and flights, the cancelled tickets and their total refund
+class RemovalReport:
+    def __init__(self):
+        self.airlines: int = 0
+        self.flights: int = 0
+        self.tickets: List[TicketReservation] = []
+        self.refund: float = 0.0
+
+    def __str__(self):
+        return (f"Removed {self.airlines} airline(s), {self.flights} flight(s) and {len(self.tickets)} "
+                f"reservation(s), refund {self.refund}")
 
-    FILE_NAME: str = "tickets.pickle"         # Default filename for saving state
+
+# Handles airlines, flights, and ticket reservations. The program uses the TicketManager
+# singleton below; independent instances of this class are the shards of a
+# ShardedTicketManager (see sharding.py).
+# Bookings and cancellations only lock the flight they touch, so requests for different
+# flights run in parallel; changes to the airline/flight structure take the schedule lock.
+class BaseTicketManager:
+
+    FILE_NAME: str = "tickets.state"          # Default filename for saving state
     DEFAULT_NAME: str = "default.pickle"      # Default file to load initial state from
+    HOLD_SECONDS: float = 15 * 60.0           # How long hold_seat keeps a seat by default
 
     def __init__(self):
         # List of airlines and ticket reservations in memory
         self.airlines: List[AirLine] = []
-        self.tickets: List[TicketReservation] = []
-        # Load initial data
-        self.load_default()
+        self.tickets: ReservationStore = ReservationStore()
+        # Type of store new ticket lists are put in (see use_compact_tickets)
+        self.store_factory = ReservationStore
+        # Owning airline of every known flight
+        self._flight_airlines: Dict[Flight, AirLine] = {}
+        # Objects notified about every change (see MutationListener)
+        self._listeners: List[MutationListener] = []
+        # Where save_state/load_state keep the state (state file, journal, SQLite...)
+        self.storage: StorageBackend = FileStorage()
+        self.add_listener(self.storage)
+        # Search indexes over all flights, kept up to date as a listener
+        self.search: FlightSearchIndex = FlightSearchIndex()
+        self.add_listener(self.search)
+        # One lock per flight around seat holds and reservation writes
+        self._flight_locks: Dict[Flight, threading.RLock] = {}
+        self._flight_locks_guard = threading.RLock()
+        # Guards airline/flight structure changes, loading and saving
+        self._schedule_lock = threading.RLock()
+        # A replication follower (see replication.py) is only changed by its replication
+        # thread; changes from any other thread raise ValueError
+        self.writer_thread: Optional[threading.Thread] = None
+        # Source of the ids of new tickets; None lets the ticket store number them
+        self.ticket_ids: Optional[Iterator[int]] = None
+        # Tickets booked by requests with an idempotency key, saved with the state
+        self.idempotency: IdempotencyTable = IdempotencyTable()
+        # Seats held by hold_seat and not confirmed yet. They are not saved: saved seat maps
+        # only record the seats of tickets (see state_format.py), so a restart releases them.
+        self.holds: HoldTable = HoldTable()
+        self._hold_reaper: Optional[threading.Thread] = None
+        # Registered users; tickets refer to them by id (TicketReservation.user_id)
+        self.users: UserRegistry = UserRegistry()
+
+    # Registers a listener that is notified about every change
+    def add_listener(self, listener: MutationListener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: MutationListener):
+        self._listeners.remove(listener)
+
+    def _notify(self, hook: str, *args):
+        for listener in self._listeners:
+            getattr(listener, hook)(*args)
+
+    # Returns the lock that serialises bookings on the given flight
+    def _flight_lock(self, flight: Flight) -> threading.RLock:
+        lock = self._flight_locks.get(flight)
+        if lock is None:
+            with self._flight_locks_guard:
+                lock = self._flight_locks.setdefault(flight, threading.RLock())
+        return lock
+
+    # Holds every lock, so no booking is half done while the whole state is saved or replaced
+    @contextmanager
+    def _exclusive(self):
+        with self._schedule_lock, self._flight_locks_guard:
+            locks = list(self._flight_locks.values())
+            for lock in locks:
+                lock.acquire()
+            try:
+                yield
+            finally:
+                for lock in locks:
+                    lock.release()
+
+    # Runs func while no change is in progress and returns its result, e.g. to copy the state
+    def run_exclusive(self, func):
+        with self._exclusive():
+            return func()
+
+    def _check_writable(self):
+        writer = self.writer_thread
+        if writer is not None and writer is not threading.current_thread():
+            raise ValueError("This is a read-only replica, changes must be made on the leader")
+
+    # Returns the airline operating the given flight, or None if the flight is unknown
+    def _airline_of(self, flight: Flight) -> Optional[AirLine]:
+        airline = self._flight_airlines.get(flight)
+        if airline is None:
+            # The flight may have been added directly through AirLine.add_flight, or the
+            # state was replaced and not mapped yet; every flight seen on the way is mapped
+            for candidate in self.airlines:
+                for known in candidate.iter_flights():
+                    self._flight_airlines.setdefault(known, candidate)
+                    if known is flight:
+                        return candidate
+        return airline
+
+    # Returns the airline operating the given flight, or None if the flight is unknown
+    def airline_of(self, flight: Flight) -> Optional[AirLine]:
+        return self._airline_of(flight)
 
     # Returns a dictionary of all airlines by name
     def get_all_airlines(self):
@@ -29,69 +147,510 @@ class TicketManager(metaclass=metaclasses.Singleton):
     def get_all_flights(self) -> Dict[str, List[Flight]]:
         return {airline.name: airline.get_flights() for airline in self.airlines}
 
+    # The getters above copy, so callers cannot change the manager's lists. The views and
+    # iterators below give the same protection without copying; they show live data, so
+    # take a copy when the data is changed while iterating over it.
+
+    # Returns the airline with the given name, or None
+    def get_airline(self, name: str) -> Optional[AirLine]:
+        for airline in self.airlines:
+            if airline.name == name:
+                return airline
+        return None
+
+    # Read-only view of the airlines
+    def airlines_view(self) -> ListView:
+        return ListView(self.airlines)
+
+    # Iterates over all flights as (airline, flight) pairs
+    def iter_flights(self) -> Iterator[Tuple[AirLine, Flight]]:
+        for airline in self.airlines:
+            for flight in airline.iter_flights():
+                yield airline, flight
+
+    # Iterates over all ticket reservations in booking order
+    def iter_tickets(self) -> Iterator[TicketReservation]:
+        return iter(self.tickets)
+
+    def count_tickets(self) -> int:
+        return len(self.tickets)
+
+    # Returns one page of the ticket reservations in booking order
+    def page_tickets(self, offset: int = 0, limit: int = 50) -> List[TicketReservation]:
+        if offset < 0 or limit < 0:
+            raise ValueError("Offset and limit must not be negative")
+        return self.tickets.page(offset, limit)
+
+    # Returns the flight with the given number of the named airline, or None
+    def get_flight(self, airline_name: str, flight_number: str) -> Optional[Flight]:
+        for flight in self.search.by_flight_number(flight_number):
+            if self.search.airline_of(flight).name == airline_name:
+                return flight
+        # Flights added directly through AirLine.add_flight are not indexed
+        airline = self.get_airline(airline_name)
+        if airline is not None:
+            for flight in airline.iter_flights():
+                if flight.flight_number == flight_number:
+                    return flight
+        return None
+
+    # Returns the flights matching every given filter, cheapest first (see FlightSearchIndex.search)
+    def search_flights(self, destination: Optional[str] = None, min_price: Optional[float] = None,
+                       max_price: Optional[float] = None, min_distance: Optional[float] = None,
+                       max_distance: Optional[float] = None, limit: Optional[int] = None) -> List[Flight]:
+        return self.search.search(destination, min_price, max_price, min_distance, max_distance, limit)
+
     # Returns a copy of all current ticket reservations
     def get_all_tickets(self) -> List[TicketReservation]:
-        return self.tickets.copy()
+        return list(self.tickets)
+
+    # Returns the ticket with the given id, or None if it does not exist
+    def get_ticket(self, ticket_id: int) -> Optional[TicketReservation]:
+        return self.tickets.get(ticket_id)
+
+    # Returns the ticket booked by the request with the given idempotency key, or None if
+    # the key is unknown or expired, or the ticket was cancelled since
+    def get_ticket_by_key(self, key: str) -> Optional[TicketReservation]:
+        original = self.idempotency.get(key)
+        return self.tickets.get(original[0]) if original is not None else None
+
+    # Returns all tickets booked on the given flight
+    def get_tickets_for_flight(self, flight: Flight) -> List[TicketReservation]:
+        return self.tickets.by_flight(flight)
+
+    # Returns all tickets booked for the given passenger name
+    def get_tickets_for_passenger(self, name: str) -> List[TicketReservation]:
+        return self.tickets.by_name(name)
+
+    # Returns all tickets booked by the registered user, in booking order
+    def get_tickets_for_user(self, user_id: int) -> List[TicketReservation]:
+        return self.tickets.by_user(user_id)
+
+    # Returns all tickets booked on any flight of the given airline.
+    # Tickets reference flights rather than airlines, so this goes through the flight index.
+    def get_tickets_for_airline(self, airline: AirLine) -> List[TicketReservation]:
+        return [ticket for flight in airline.iter_flights() for ticket in self.tickets.by_flight(flight)]
+
+    # Returns the registered user with the given id, or None
+    def get_user(self, user_id: int) -> Optional[User]:
+        return self.users.get(user_id)
+
+    # Returns the user with the given username (case does not matter), or None
+    def find_user(self, user_name: str) -> Optional[User]:
+        return self.users.by_user_name(user_name)
 
-    # Adds a ticket to the system
-    def add_ticket(self, ticket: TicketReservation) -> bool:
+    # Returns the users with the given real name (case, accents and spacing do not matter)
+    def find_users_by_name(self, real_name: str) -> List[User]:
+        return self.users.by_real_name(real_name)
+
+    # Registers a user and returns it; ValueError if the username is taken.
+    # The id is assigned by the registry unless one is given (e.g. by another shard).
+    def register_user(self, user_name: str, real_name: str, user_id: Optional[int] = None) -> User:
+        self._check_writable()
+        user = User(user_name, real_name, user_id)
+        self.users.add(user)
+        self._notify("user_added", user)
+        return user
+
+    # Adds a ticket to the system. On flights with a seat map the ticket's seat is held
+    # (any free seat if the ticket has none yet); ValueError if it is not available.
+    # With an idempotency key that was already used, nothing is booked and False is
+    # returned; get_ticket_by_key gives the ticket of the first request.
+    def add_ticket(self, ticket: TicketReservation, cabin: Optional[str] = None,
+                   idempotency_key: Optional[str] = None) -> bool:
         if ticket is None:
             return False
-        self.tickets.append(ticket)
-        return True
+        return self._add_ticket(ticket, cabin, idempotency_key) is None
+
+    # Returns (ticket id, price) of the first request if the idempotency key was used before
+    # seat_held: the ticket's seat is already held for it (a confirmed SeatHold)
+    def _add_ticket(self, ticket: TicketReservation, cabin: Optional[str],
+                    idempotency_key: Optional[str], seat_held: bool = False) -> Optional[Tuple[int, float]]:
+        self._check_writable()
+        seats = ticket.flight.seats
+        with self._flight_lock(ticket.flight):
+            # Retries of a request book the same flight, so its lock keeps them apart
+            if idempotency_key is not None:
+                original = self.idempotency.get(idempotency_key)
+                if original is not None:
+                    return original
+            # Looked up under the lock, so a flight removed meanwhile cannot be booked
+            airline = self._airline_of(ticket.flight)
+            if airline is None:
+                raise ValueError("Unknown flight")
+            if ticket.user_id is not None and self.users.get(ticket.user_id) is None:
+                raise ValueError("Unknown user")
+            if seats is not None and not seat_held:
+                ticket.seat = seats.hold(ticket.seat, cabin)
+            if ticket.ticket_id is None and self.ticket_ids is not None:
+                ticket.ticket_id = next(self.ticket_ids)
+            try:
+                self.tickets.add(ticket)
+            except ValueError:
+                if seats is not None:
+                    seats.release(ticket.seat)
+                raise
+            self._notify("ticket_added", airline, ticket)
+            if idempotency_key is not None:
+                expires = self.idempotency.put(idempotency_key, ticket.ticket_id, ticket.price)
+                self._notify("idempotency_key_added", idempotency_key, ticket, expires)
+        return None
+
+    # Gives the ticket's (or hold's) seat back to the flight's seat map
+    @staticmethod
+    def _release_seat(ticket):
+        seats = ticket.flight.seats
+        if seats is not None and ticket.seat is not None:
+            seats.release(ticket.seat)
 
     # Removes a ticket by its index in the list and returns the refunded price
     def remove_ticket_by_index(self, idx: int) -> float:
-        if idx < 0 or idx >= len(self.tickets):
-            raise ValueError("Wrong index")
-        ticket: TicketReservation = self.tickets[idx]
-        return self.remove_ticket_by_ticket_object(ticket)
+        ticket: TicketReservation = self.tickets.at(idx)
+        return self._remove_ticket(ticket)
+
+    # Removes a ticket by its id and returns the refunded price
+    def remove_ticket_by_id(self, ticket_id: int) -> float:
+        ticket = self.tickets.get(ticket_id)
+        if ticket is None:
+            raise ValueError("Unknown ticket")
+        return self._remove_ticket(ticket)
 
     # Removes a ticket by reference and returns the refunded price
     def remove_ticket_by_ticket_object(self, ticket: TicketReservation) -> float:
+        return self._remove_ticket(ticket)
+
+    # The removal behind the public methods, which metrics.py counts as cancellations;
+    # replayed journal records go through it directly (see journal.apply_record)
+    def _remove_ticket(self, ticket: TicketReservation) -> float:
+        self._check_writable()
         refund: float = ticket.price
-        self.tickets.remove(ticket)
+        with self._flight_lock(ticket.flight):
+            self.tickets.remove(ticket)
+            self._release_seat(ticket)
+            self._notify("ticket_removed", ticket)
         return refund
 
     # Adds a new airline to the system
     def add_airline(self, airline: AirLine):
-        self.airlines.append(airline)
+        self._check_writable()
+        with self._schedule_lock:
+            self.airlines.append(airline)
+            for flight in airline.iter_flights():
+                self._flight_airlines[flight] = airline
+            self._notify("airline_added", airline)
 
-    # Removes an airline, but only if it has no flights
+    # Removes an airline, but only if it has no flights (see remove_airline_cascade)
     def remove_airline_by_airline_object(self, airline):
-        if len(airline.get_flights()) > 0:
-            raise ValueError("Airline must be empty")
-        self.airlines.remove(airline)
+        self._check_writable()
+        with self._schedule_lock:
+            if airline.flight_count() > 0:
+                raise ValueError("Airline must be empty")
+            self.airlines.remove(airline)
+            self._notify("airline_removed", airline)
+
+    # Adds a flight to an airline
+    def add_flight(self, airline: AirLine, flight: Flight):
+        self._check_writable()
+        with self._schedule_lock:
+            airline.add_flight(flight)
+            self._flight_airlines[flight] = airline
+            self._notify("flight_added", airline, flight)
+
+    # Adds many flights, given as (airline, flight) pairs, in one step
+    def add_flights(self, flights: Iterable[Tuple[AirLine, Flight]]):
+        self._check_writable()
+        flights = list(flights)
+        with self._schedule_lock:
+            for airline, flight in flights:
+                airline.add_flight(flight)
+                self._flight_airlines[flight] = airline
+            if flights:
+                self._notify("flights_added", flights)
+
+    # Removes a flight from an airline. Reservations on the flight are left to the caller,
+    # remove_flight_cascade removes them too.
+    def remove_flight(self, airline: AirLine, flight: Flight):
+        self._check_writable()
+        with self._schedule_lock, self._flight_lock(flight):
+            airline.remove_flight_object(flight)
+            self._flight_airlines.pop(flight, None)
+            self._notify("flight_removed", airline, flight)
+        with self._flight_locks_guard:
+            self._flight_locks.pop(flight, None)
+
+    # Removes a flight together with its reservations and returns what was removed; no
+    # booking on the flight can slip in between. The tickets are found through the flight
+    # index and announced to the listeners in one batch (see MutationListener.tickets_removed).
+    def remove_flight_cascade(self, airline: AirLine, flight: Flight) -> RemovalReport:
+        return self._remove_cascade(airline, [flight])
+
+    # Removes an airline with all its flights and their reservations and returns what was removed
+    def remove_airline_cascade(self, airline: AirLine) -> RemovalReport:
+        return self._remove_cascade(airline, None)
+
+    # Without flights the whole airline goes; its flights are read under the schedule lock,
+    # so a flight added meanwhile is either removed too or added after the airline is gone
+    def _remove_cascade(self, airline: AirLine, flights: Optional[List[Flight]]) -> RemovalReport:
+        self._check_writable()
+        report = RemovalReport()
+        whole_airline = flights is None
+        with self._schedule_lock, ExitStack() as locks:
+            if whole_airline:
+                flights = airline.get_flights()
+            for flight in flights:
+                locks.enter_context(self._flight_lock(flight))
+            if whole_airline and airline not in self.airlines:
+                raise ValueError("Unknown airline")
+            for flight in flights:
+                if self._airline_of(flight) is not airline:
+                    raise ValueError("Unknown flight")
+            for flight in flights:
+                tickets = self.tickets.by_flight(flight)
+                # Newest first: the stores drop ids from the end of their indexes cheaply
+                for ticket in reversed(tickets):
+                    self.tickets.remove_by_id(ticket.ticket_id)
+                    self._release_seat(ticket)
+                if tickets:
+                    self._notify("tickets_removed", tickets)
+                airline.remove_flight_object(flight)
+                self._flight_airlines.pop(flight, None)
+                self._notify("flight_removed", airline, flight)
+                report.flights += 1
+                report.tickets += tickets
+            if whole_airline:
+                self.airlines.remove(airline)
+                self._notify("airline_removed", airline)
+                report.airlines = 1
+        with self._flight_locks_guard:
+            for flight in flights:
+                self._flight_locks.pop(flight, None)
+        report.refund = sum(ticket.price for ticket in report.tickets)
+        return report
+
+    # Sets a new ticket price for a flight
+    def change_flight_price(self, airline: AirLine, flight: Flight, price: float):
+        self._check_writable()
+        with self._flight_lock(flight):
+            flight.price = price
+            self._notify("flight_price_changed", airline, flight)
+
+    # Sets new prices for many flights at once (e.g. from the PricingEngine), without letting
+    # a booking see only part of the change. Returns the number of flights whose price changed.
+    def change_flight_prices(self, prices: Iterable[Tuple[Flight, float]]) -> int:
+        self._check_writable()
+        with self._exclusive():
+            changes = []
+            for flight, price in prices:
+                airline = self._airline_of(flight)
+                if airline is None:
+                    raise ValueError("Unknown flight")
+                if flight.price != price:
+                    changes.append((airline, flight, price))
+            for airline, flight, price in changes:
+                flight.price = price
+            if changes:
+                self._notify("flight_prices_changed", [(airline, flight) for airline, flight, _ in changes])
+        return len(changes)
+
+    # Creates and adds a new ticket reservation. On flights with a seat map the given seat,
+    # or any free seat (of the given cabin) is held; ValueError if the flight is full.
+    # The ticket costs the flight's price unless a price (e.g. a fare quote) is given.
+    # A retry with the idempotency key of an earlier call returns that call's price.
+    # With a user id the ticket goes to that registered user's bookings.
+    def create_reservation(self, real_name: str, flight: Flight, cabin: Optional[str] = None,
+                           seat: Optional[str] = None, price: Optional[float] = None,
+                           idempotency_key: Optional[str] = None, user_id: Optional[int] = None) -> float:
+        ticket = TicketReservation(real_name, flight, flight.price if price is None else price, seat, user_id)
+        original = self._add_ticket(ticket, cabin, idempotency_key)
+        return original[1] if original is not None else ticket.price
+
+    # Returns the open hold with the given id, or None
+    def get_hold(self, hold_id: str) -> Optional[SeatHold]:
+        return self.holds.get(hold_id)
 
-    # Creates and adds a new ticket reservation
-    def create_reservation(self, real_name: str, flight: Flight) -> float:
-        ticket = TicketReservation(real_name, flight, flight.price)
-        self.add_ticket(ticket)
-        return ticket.price
+    # Holds a seat (the given one, or any free seat of the cabin) for ttl seconds
+    # (HOLD_SECONDS by default) at the current price, or the given one. The hold is turned
+    # into a ticket by confirm_hold; if that does not happen in time the seat is released.
+    # ValueError if the flight is full or unknown.
+    def hold_seat(self, real_name: str, flight: Flight, cabin: Optional[str] = None, seat: Optional[str] = None,
+                  price: Optional[float] = None, ttl: Optional[float] = None,
+                  user_id: Optional[int] = None) -> SeatHold:
+        self._check_writable()
+        expires = self.holds.clock() + (self.HOLD_SECONDS if ttl is None else ttl)
+        seats = flight.seats
+        with self._flight_lock(flight):
+            if self._airline_of(flight) is None:
+                raise ValueError("Unknown flight")
+            if user_id is not None and self.users.get(user_id) is None:
+                raise ValueError("Unknown user")
+            if seats is not None:
+                seat = seats.hold(seat, cabin)
+            hold = SeatHold(real_name, flight, flight.price if price is None else price, seat, expires, user_id)
+            self.holds.add(hold)
+            self._notify("hold_added", hold)
+        if self._hold_reaper is None:
+            self._start_hold_reaper()
+        return hold
 
-    # Saves the current state (airlines and tickets) to a file
+    # Removes the open hold under its flight's lock; ValueError if it expired or is unknown
+    def _take_hold(self, hold_id: str) -> SeatHold:
+        hold = self.holds.get(hold_id)
+        if hold is not None and hold.expires > self.holds.clock():
+            with self._flight_lock(hold.flight):
+                if self.holds.pop(hold_id) is hold:
+                    return hold
+        raise ValueError("Unknown or expired hold")
+
+    # Books the held seat and returns the ticket, at the price of the hold
+    # With an idempotency key that was already used, nothing is booked: the held seat is
+    # released and the ticket of the first request returned (ValueError if it was cancelled).
+    def confirm_hold(self, hold_id: str, idempotency_key: Optional[str] = None) -> TicketReservation:
+        self._check_writable()
+        hold = self.holds.get(hold_id)
+        if hold is None:
+            raise ValueError("Unknown or expired hold")
+        with self._flight_lock(hold.flight):
+            hold = self._take_hold(hold_id)
+            ticket = TicketReservation(hold.name, hold.flight, hold.price, hold.seat, hold.user_id)
+            try:
+                original = self._add_ticket(ticket, None, idempotency_key, seat_held=True)
+            except ValueError:
+                self._release_seat(ticket)
+                self._notify("hold_released", hold)
+                raise
+            if original is not None:
+                self._release_seat(hold)
+                self._notify("hold_released", hold)
+                ticket = self.tickets.get(original[0])
+                if ticket is None:
+                    raise ValueError(f"The booking with idempotency key {idempotency_key!r} was cancelled")
+        return ticket
+
+    # Gives the held seat back before the hold expires
+    def release_hold(self, hold_id: str):
+        self._check_writable()
+        hold = self._take_hold(hold_id)
+        with self._flight_lock(hold.flight):
+            self._release_seat(hold)
+            self._notify("hold_released", hold)
+
+    # Releases the seats of the holds that expired and returns their number. Called by the
+    # reaper thread as the deadlines pass; callers may run it themselves (e.g. with a clock
+    # of their own).
+    def expire_holds(self) -> int:
+        now = self.holds.clock()
+        expired = 0
+        for hold in self.holds.due(now):
+            with self._flight_lock(hold.flight):
+                if self.holds.pop(hold.hold_id) is hold:
+                    self._release_seat(hold)
+                    self._notify("hold_released", hold)
+                    expired += 1
+        return expired
+
+    # Starts the thread that sleeps until the next hold deadline and expires the holds
+    def _start_hold_reaper(self):
+        with self._flight_locks_guard:
+            if self._hold_reaper is None:
+                self._hold_reaper = threading.Thread(target=self._reap_holds, name="hold-reaper", daemon=True)
+                self._hold_reaper.start()
+
+    def _reap_holds(self):
+        holds = self.holds
+        while True:
+            with holds.changed:
+                deadline = holds.next_deadline()
+                wait = None if deadline is None else deadline - holds.clock()
+                if wait is None or wait > 0:
+                    holds.changed.wait(wait)
+                    continue
+            self.expire_holds()
+
+    # Switches to another storage backend. If the backend already holds saved state it is
+    # loaded, otherwise the backend is initialised from the current state.
+    def use_storage(self, storage: StorageBackend):
+        with self._exclusive():
+            self.remove_listener(self.storage)
+            self.storage.detach(self)
+            self.storage.close()
+            self.storage = storage
+            if storage.exists():
+                storage.load(self)
+            else:
+                storage.reset(self)
+            self.add_listener(storage)
+
+    # Saves the current state (airlines and tickets) through the storage backend.
+    # The state is copied while all locks are held, encoding and disk I/O run after they are released.
     def save_state(self):
-        with open(self.FILE_NAME, 'wb') as f:
-            data = {
-                "airlines": self.airlines,
-                "tickets": self.tickets
-            }
-            pickle.dump(data, f)
-
-    # Loads the system state from a file
+        with self._exclusive():
+            finish = self.storage.save(self)
+        if finish is not None:
+            finish()
+
+    # Loads the system state. Without a file name the storage backend is used, otherwise
+    # the given state file (of any version, see state_format.py) or snapshot is loaded (the
+    # backend is notified like about any other change). Snapshots are read lazily, see
+    # snapshot.py. Returns False if the file does not exist; a file that cannot be read
+    # raises StateFormatError and the current state is kept.
     def load_state(self, file_name=None) -> bool:
         if file_name is None:
-            file_name = self.FILE_NAME
-        try:
-            with open(file_name, 'rb') as f:
-                pickle_content = pickle.load(f)
-            if isinstance(pickle_content, dict):
-                self.airlines = pickle_content.get("airlines", self.airlines)
-                self.tickets = pickle_content.get("tickets", self.tickets)
-                return True
-        except FileNotFoundError:
+            with self._exclusive():
+                return self.storage.load(self)
+        if snapshot.is_snapshot(file_name):
+            snapshot.load_snapshot(self, file_name)
+            return True
+        content = read_state(file_name)
+        if content is None:
             return False
+        self.replace_state(content["airlines"], content["tickets"], idempotency=content["meta"].get("idempotency", ()),
+                           users=content["users"])
+        return True
+
+    # Keeps the tickets in a CompactReservationStore (columns of numbers instead of one object
+    # per ticket) to save memory, or back in a ReservationStore. Ticket ids are kept. Tickets
+    # loaded later go to the same kind of store, unless the storage backend provides its own.
+    def use_compact_tickets(self, compact: bool = True):
+        with self._exclusive():
+            self.store_factory = CompactReservationStore if compact else ReservationStore
+            store = self.store_factory()
+            for ticket in self.tickets:
+                store.add(ticket)
+            self.tickets = store
+
+    # Replaces all airlines and tickets at once, keeping the ticket ids.
+    # A storage backend may pass a ready-made store instead of a ticket list.
+    # The idempotency keys are replaced by the given saved entries (see IdempotencyTable.entries)
+    # and the registered users by the given ones, open seat holds are released.
+    def replace_state(self, airlines: List[AirLine], tickets: List[TicketReservation] = (),
+                      store: Optional[ReservationStore] = None, idempotency: Iterable[list] = (),
+                      users: Iterable[User] = ()):
+        self._check_writable()
+        if store is None:
+            store = self.store_factory()
+            for ticket in tickets:
+                store.add(ticket)
+        with self._exclusive():
+            self.airlines = airlines
+            self.tickets = store
+            # Filled by _airline_of as flights are used, so a lazily loaded state
+            # (see snapshot.py) is not read in full here
+            self._flight_airlines = {}
+            self.idempotency.restore(idempotency)
+            self.users.restore(users)
+            for hold in self.holds.clear():
+                self._release_seat(hold)
+            self._notify("state_replaced", self)
 
     # Loads the default saved state from DEFAULT_NAME file
     def load_default(self):
         self.load_state(self.DEFAULT_NAME)
+
+
+# The TicketManager handles all airlines, flights, and ticket reservations.
+# It uses the Singleton metaclass to ensure only one instance exists.
+class TicketManager(BaseTicketManager, metaclass=metaclasses.Singleton):
+    def __init__(self):
+        super().__init__()
+        # Load initial data
+        self.load_default()
@@ -1,13 +1,34 @@
+import sys
+from typing import Optional
+
 from flight import Flight
 
 
-# Represents a ticket reservation made by a passenger for a specific flight
+# Represents a ticket reservation made by a passenger for a specific flight.
+# Reservations have no __dict__ and share equal passenger names, as there can be millions.
 class TicketReservation:
-    def __init__(self, name: str, flight: Flight, price: float):
-        self.name: str = name       # Name of the passenger
+    __slots__ = ("ticket_id", "name", "flight", "price", "seat", "user_id", "__weakref__")
+
+    def __init__(self, name: str, flight: Flight, price: float, seat: Optional[str] = None,
+                 user_id: Optional[int] = None):
+        self.ticket_id: Optional[int] = None    # Id assigned by the ReservationStore
+        self.name: str = sys.intern(name)       # Name of the passenger
         self.flight = flight        # Flight object the ticket is for
         self.price = price          # Final ticket price at the time of reservation
+        self.seat = seat            # Seat label, None if the flight has no seat map
+        self.user_id = user_id      # Id of the registered user who booked it (see UserRegistry), or None
+
+    # Reservations pickled before __slots__ store a __dict__, and older ones have no
+    # ticket_id, seat or user_id; both are accepted
+    def __setstate__(self, state):
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **state[1]}
+        self.ticket_id = None
+        self.seat = None
+        self.user_id = None
+        for key, value in state.items():
+            setattr(self, key, value)
 
     def __str__(self):
         # Returns a readable string representation of the reservation
-        return f"TicketReservation {self.name=} {self.flight=} {self.price=}"
+        return f"TicketReservation {self.ticket_id=} {self.name=} {self.flight=} {self.price=} {self.seat=} {self.user_id=}"
@@ -0,0 +1,81 @@
+import threading
+import unicodedata
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from user import User
+
+
+# Form of a real name used for lookups: accents dropped, case folded and whitespace
+# collapsed, so "  José  GARCÍA" finds "Jose Garcia"
+def normalize_name(name: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
+
+
+# Form of a username used for lookups; usernames are unique regardless of case
+def normalize_user_name(user_name: str) -> str:
+    return user_name.strip().casefold()
+
+
+# The registered users by id, with hash indexes by username and by normalised real name,
+# so every lookup is a dictionary access. Ids are assigned like ticket ids: users that
+# already carry one (e.g. loaded from a file) keep it.
+class UserRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_id: int = 1
+        self._users: Dict[int, User] = {}
+        self._by_user_name: Dict[str, User] = {}
+        self._by_name: Dict[str, Dict[int, User]] = {}
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    # Iterates over a snapshot of the users in registration order
+    def __iter__(self) -> Iterator[User]:
+        return iter(list(self._users.values()))
+
+    # Stores a user and returns its id; ValueError if the username or the id is taken
+    def add(self, user: User) -> int:
+        key = normalize_user_name(user.user_name)
+        if not key:
+            raise ValueError("The username must not be empty")
+        with self._lock:
+            if key in self._by_user_name:
+                raise ValueError(f"Username {user.user_name!r} is already taken")
+            user_id = user.user_id
+            if user_id is None:
+                user_id = user.user_id = self._next_id
+            elif user_id in self._users:
+                raise ValueError(f"Duplicate user id {user_id}")
+            self._next_id = max(self._next_id, user_id + 1)
+            self._users[user_id] = user
+            self._by_user_name[key] = user
+            self._by_name.setdefault(normalize_name(user.real_name), {})[user_id] = user
+        return user_id
+
+    # Returns the user with the given id, or None
+    def get(self, user_id: int) -> Optional[User]:
+        return self._users.get(user_id)
+
+    # Returns the user with the given username (in any case), or None
+    def by_user_name(self, user_name: str) -> Optional[User]:
+        return self._by_user_name.get(normalize_user_name(user_name))
+
+    # Returns the users whose real name matches the given one (see normalize_name)
+    def by_real_name(self, real_name: str) -> List[User]:
+        return list(self._by_name.get(normalize_name(real_name), {}).values())
+
+    # Replaces the content with the given users
+    def restore(self, users: Iterable[User]):
+        self.clear()
+        for user in users:
+            self.add(user)
+
+    def clear(self):
+        with self._lock:
+            self._next_id = 1
+            self._users.clear()
+            self._by_user_name.clear()
+            self._by_name.clear()
@@ -0,0 +1,33 @@
+from collections.abc import Sequence
+from typing import Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+
+# Read-only view of a list owned by someone else. Nothing is copied: the view always shows
+# the current content, but offers no way to change it. Use the copying getters instead when
+# the list may be changed while you iterate over it (e.g. deleting flights in a loop).
+class ListView(Sequence):
+    __slots__ = ("_items",)
+
+    def __init__(self, items: List[T]):
+        self._items = items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, idx):
+        # A slice is a new (small) list, a single index returns the item itself
+        return self._items[idx]
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self._items)
+
+    def __contains__(self, item) -> bool:
+        return item in self._items
+
+    def __reversed__(self) -> Iterator[T]:
+        return reversed(self._items)
+
+    def __repr__(self):
+        return f"ListView({self._items!r})"